@@ -0,0 +1,237 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from .item_index import get_item_index
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Months are YYYY-MM; segment files are <month>.ndjson.gz
+SEGMENT_SUFFIX = ".ndjson.gz"
+
+# Statuses of items that are done with and may be archived
+FINISHED_STATUSES = ("completed", "dismissed")
+
+def item_month(item: Dict[str, Any]) -> str:
+    """The archive segment (YYYY-MM) an item belongs to, from its creation time."""
+    created_at = str(item.get("created_at") or "")
+    if len(created_at) >= 7 and created_at[4] == "-":
+        return created_at[:7]
+    item_id = str(item.get("id") or "")
+    if len(item_id) >= 6 and item_id[:6].isdigit():
+        return f"{item_id[:4]}-{item_id[4:6]}"
+    return "undated"
+
+def item_last_change(item: Dict[str, Any]) -> Optional[datetime]:
+    """When an item was last updated (or created), whichever format it was stored in."""
+    for field_name in ("updated_at", "created_at"):
+        value = item.get(field_name)
+        if value is None or value == "":
+            continue
+        try:
+            if isinstance(value, (int, float)):
+                return datetime.fromtimestamp(value)
+            return datetime.fromisoformat(str(value))
+        except (TypeError, ValueError, OverflowError):
+            continue
+    return None
+
+class ArchiveStore:
+    """
+    Append-only cold storage for items that left the working set.
+
+    Items are grouped into one gzip'd NDJSON segment per month of creation.
+    Appending adds a gzip member to the segment, which gzip readers treat as
+    one stream, so existing data is never rewritten. An item archived twice
+    (e.g. after a crash between archiving and deleting it) is read back once.
+    """
+
+    def __init__(self, archive_dir: Path):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def segment_path(self, month: str) -> Path:
+        return self.archive_dir / f"{month}{SEGMENT_SUFFIX}"
+
+    def months(self) -> List[str]:
+        """Archived months, oldest first."""
+        return sorted(path.name[:-len(SEGMENT_SUFFIX)] for path in self.archive_dir.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def append(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Append items to their monthly segments and sync them to disk; returns the count."""
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            by_month.setdefault(item_month(item), []).append(item)
+        count = 0
+        with self._lock:
+            for month, month_items in by_month.items():
+                data = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in month_items)
+                with open(self.segment_path(month), "ab") as f:
+                    f.write(gzip.compress(data.encode("utf-8")))
+                    f.flush()
+                    os.fsync(f.fileno())
+                count += len(month_items)
+        return count
+
+    def iter_month(self, month: str) -> Iterator[Dict[str, Any]]:
+        """Items of one segment, without repeats, in archive order."""
+        path = self.segment_path(month)
+        if not path.exists():
+            return
+        items: Dict[str, Dict[str, Any]] = {}
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    items[item.get("id")] = item
+        except (OSError, EOFError) as e:
+            # A torn last member only loses the batch being written at the crash,
+            # which is still in the hot store
+            logger.error(f"Error reading archive segment {path}: {e}")
+        yield from items.values()
+
+    def query(
+        self,
+        item_type: Optional[str] = None,
+        status: Optional[str] = None,
+        month_from: Optional[str] = None,
+        month_to: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Archived items matching the filters, newest month first."""
+        results = []
+        skipped = 0
+        for month in reversed(self.months()):
+            if month_from and month < month_from:
+                continue
+            if month_to and month > month_to:
+                continue
+            month_items = [
+                item for item in self.iter_month(month)
+                if (not item_type or item.get("type") == item_type)
+                and (not status or item.get("status") == status)
+            ]
+            month_items.sort(key=lambda item: str(item.get("created_at") or ""), reverse=True)
+            for item in month_items:
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                results.append(item)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """An archived item by id; ids are timestamps, so its month is tried first."""
+        guess = item_month({"id": item_id})
+        months = self.months()
+        if guess in months:
+            months.remove(guess)
+            months.insert(0, guess)
+        for month in months:
+            for item in self.iter_month(month):
+                if item.get("id") == item_id:
+                    return item
+        return None
+
+class Archiver:
+    """
+    Background job moving finished items from the hot store into an ArchiveStore.
+
+    Completed or dismissed items that have not changed for `after_days`
+    days are appended to the archive, then deleted from the storage backend
+    in one batch (which leaves the usual tombstones for change feeds).
+    Candidates come from the status buckets of the shared ItemIndex, so
+    active items are never visited. Each is re-read before archiving and
+    only deleted while its change sequence is unchanged, so an item reopened
+    meanwhile stays in the hot store.
+    """
+
+    def __init__(self, storage: StorageBackend, archive: ArchiveStore, after_days: int = 30, interval: int = 3600):
+        self.storage = storage
+        self.archive = archive
+        self.after_days = after_days
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+    def _cutoff(self, now: Optional[datetime]) -> datetime:
+        return (now or datetime.now()) - timedelta(days=self.after_days)
+
+    @staticmethod
+    def _is_due(item: Dict[str, Any], cutoff: datetime) -> bool:
+        if item.get("status") not in FINISHED_STATUSES:
+            return False
+        changed = item_last_change(item)
+        if changed is not None and changed.tzinfo is not None:
+            changed = changed.astimezone().replace(tzinfo=None)
+        return changed is not None and changed < cutoff
+
+    def select(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Items due for archiving."""
+        cutoff = self._cutoff(now)
+        index = get_item_index(self.storage)
+        return [
+            item
+            for status in FINISHED_STATUSES
+            for item in index.items_with_status(status)
+            if self._is_due(item, cutoff)
+        ]
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Archive every item that is due; returns the number moved."""
+        with self._run_lock:
+            cutoff = self._cutoff(now)
+            items = []
+            expected_seqs = {}
+            for candidate in self.select(now):
+                # The index may lag behind the store; decide on the stored copy
+                stored = self.storage.load(candidate["id"])
+                if stored is not None and self._is_due(stored.item, cutoff):
+                    items.append(stored.item)
+                    expected_seqs[candidate["id"]] = stored.seq
+            if not items:
+                return 0
+            # Archive first: a crash before the deletes leaves a copy in both
+            # places, never in neither
+            self.archive.append(items)
+            deleted = self.storage.delete_many(
+                [(item["id"], None) for item in items], expected_seqs=expected_seqs
+            )
+            if len(deleted) < len(items):
+                # Changed since they were read; the hot copy stays current
+                logger.warning(f"{len(items) - len(deleted)} items changed while being archived and were kept")
+            logger.info(f"Archived {len(deleted)} items to {self.archive.archive_dir}")
+            return len(deleted)
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error archiving items: {e}")
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import weakref
+from typing import Awaitable, Optional, TypeVar
+
+import httpx
+import openai
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# One event loop on a daemon thread runs the async work of the Flask
+# handlers and automation threads, so their LLM calls overlap and share
+# pooled connections instead of each starting a loop with asyncio.run
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+# AsyncOpenAI clients hold connections bound to the loop that opened them
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """The shared background event loop, started on first use."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="async-runtime", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+def run_coroutine(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared loop and wait for its result from a
+    synchronous caller (a Flask handler or a worker thread).
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_coroutine cannot wait on the shared loop from the loop itself")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+def submit(coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+    """Schedule a coroutine on the shared loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def get_async_client() -> openai.AsyncOpenAI:
+    """
+    The AsyncOpenAI client of the running event loop, created once per loop.
+
+    Its HTTP connection pool is reused by every call made on that loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=Config.API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                # Retries are done by the resilience layer, under the call's deadline
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=Config.OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=Config.OPENAI_MAX_CONNECTIONS
+                    ),
+                    timeout=httpx.Timeout(Config.OPENAI_TIMEOUT, connect=10.0)
+                )
+            )
+            _clients[loop] = client
+        return client
+
+async def _close_clients():
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.close()
+
+def shutdown(timeout: float = 5.0):
+    """Close the shared loop's client and stop the loop."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        loop, thread = _loop, _loop_thread
+        _loop, _loop_thread = None, None
+    if loop is None or loop.is_closed():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_clients(), loop).result(timeout)
+    except Exception as e:
+        logger.error(f"Error closing OpenAI client: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(timeout)
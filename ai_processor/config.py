@@ -4,6 +4,7 @@ from pathlib import Path
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 from lib.prompt_manager import PromptManager
+from lib.prompt_template import CompiledTemplate, Keywords, compile_template, load_keywords
 
 class Config:
     """Configuration management for the AI processor."""
@@ -19,42 +20,146 @@ class Config:
     MODEL = os.getenv("GPT_MODEL", "gpt-4.1-mini")
     MAX_TOKENS = int(os.getenv("GPT_MAX_TOKENS", "5000"))
     TEMPERATURE = float(os.getenv("GPT_TEMPERATURE", "0.7"))
+    # Pooled connections of the shared async client, and its request timeout
+    OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "10"))
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "300"))
+    # Alternative API endpoint, e.g. a local fake server for testing
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
     
     # Processing configuration
     MAX_CONTEXT_MESSAGES = int(os.getenv("MAX_CONTEXT_MESSAGES", "50"))
     PROCESSING_INTERVAL = int(os.getenv("PROCESSING_INTERVAL", "300"))
     MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
     RETRY_DELAY = int(os.getenv("RETRY_DELAY", "5"))
+    MAX_RETRY_DELAY = float(os.getenv("MAX_RETRY_DELAY", "60"))
+    
+    # LLM call resilience: a second request once a call is slower than the
+    # recent p90, or than LLM_HEDGE_DELAY seconds if set (opt-in, it can
+    # double spend on slow calls), and a breaker failing calls fast for
+    # LLM_BREAKER_RESET seconds after repeated failures
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    
+    # Process-wide limits on LLM requests and estimated tokens (prompt plus
+    # GPT_MAX_TOKENS) per minute, matching the account's; 0 disables a limit
+    LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+    LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+    # Message batches process_batch runs at once
+    BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "4"))
+    
+    # Stream completions, saving each extracted item as soon as it is complete
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() == "true"
+    
+    # Deadline of a synchronous /api/process call, retries included
+    PROCESS_REQUEST_TIMEOUT = float(os.getenv("PROCESS_REQUEST_TIMEOUT", "120"))
+    
+    # Input token budget per prompt; messages and context items are trimmed
+    # to fit (MAX_CONTEXT_MESSAGES caps the number of messages sent)
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+    MAX_MESSAGE_TOKENS = int(os.getenv("MAX_MESSAGE_TOKENS", "800"))
+    CONTEXT_TOKEN_SHARE = float(os.getenv("CONTEXT_TOKEN_SHARE", "0.25"))
+    
+    # Active items of the prompt type sent as context (newest first); duplicates
+    # the model repeats anyway are caught when saving
+    MAX_CONTEXT_ITEMS = int(os.getenv("MAX_CONTEXT_ITEMS", "100"))
+    
+    # Persistent cache of completions, keyed on model, temperature and prompts
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "50"))
+    
+    # Archiving: finished items untouched for this many days move to the archive
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
     
     # File paths
     PROMPTS_DIR = PROJECT_ROOT / "data" / "prompts"
     METADATA_FILE = PROJECT_ROOT / "config" / "metadata.json"
+    KEYWORDS_FILE = PROJECT_ROOT / "prompts" / "_keywords.json"
+    
+    # Metadata keys filled in when a prompt is rendered, on top of the file's
+    RUNTIME_METADATA_KEYS = ("today", "class_info", "child_info", "parent_info")
     
     # Initialize prompt manager
     _prompt_manager = PromptManager(PROMPTS_DIR)
     
     # Loaded data
     _prompts = {}
+    _prompts_version = None
+    _compiled: Dict[str, CompiledTemplate] = {}
+    _keywords = None
     _metadata = None
     
     @classmethod
-    def load_prompts(cls) -> None:
-        """Load all prompt templates from the prompts directory."""
-        cls._prompts = {
-            prompt.name: prompt.to_dict()
-            for prompt in cls._prompt_manager.get_all_prompts()
-        }
+    def load_prompts(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Prompt templates keyed by name, re-read only when a prompt file changed.
+        
+        The prompt registry re-checks file metadata at most once per
+        PROMPT_RECHECK_INTERVAL and at once after edits made through a
+        PromptManager, so this is a dictionary lookup on the hot path.
+        """
+        version, prompts = cls._prompt_manager.registry.snapshot()
+        if version != cls._prompts_version:
+            cls._prompts = {
+                prompt.name: dict(prompt.to_dict(), version=prompt.version)
+                for prompt in prompts.values()
+            }
+            # Compiled templates are keyed by content hash, so unchanged
+            # prompts keep theirs
+            current = {config['version'] for config in cls._prompts.values()}
+            cls._compiled = {key: compiled for key, compiled in cls._compiled.items() if key in current}
+            cls._prompts_version = version
+        return cls._prompts
+    
+    @classmethod
+    def get_template_keywords(cls) -> Keywords:
+        """
+        Placeholders templates may use: those declared in _keywords.json, with
+        metadata limited to the keys it will have when rendered (those of the
+        metadata file plus RUNTIME_METADATA_KEYS), so a template naming a
+        missing key is rejected when saved rather than failing at render.
+        """
+        if cls._keywords is None:
+            allowed = {'metadata': list(cls.load_metadata().keys()) + list(cls.RUNTIME_METADATA_KEYS)}
+            cls._keywords = load_keywords(cls.KEYWORDS_FILE, allowed)
+        return cls._keywords
+    
+    @classmethod
+    def get_compiled_template(cls, prompt_type: str) -> Optional[CompiledTemplate]:
+        """
+        The compiled template of a prompt type, compiled once per prompt version.
+        
+        Raises TemplateError if the template uses undeclared placeholders.
+        """
+        prompt_config = cls.load_prompts().get(prompt_type)
+        if not prompt_config or not prompt_config.get('template'):
+            return None
+        compiled = cls._compiled.get(prompt_config['version'])
+        if compiled is None:
+            compiled = compile_template(
+                prompt_config['template'], cls.get_template_keywords(), version=prompt_config['version']
+            )
+            cls._compiled[prompt_config['version']] = compiled
+        return compiled
+    
+    @classmethod
+    def get_prompt_version(cls, prompt_type: str) -> Optional[str]:
+        """Content hash of the current version of a prompt type."""
+        return cls.load_prompts().get(prompt_type, {}).get('version')
     
     @classmethod
     def get_prompt_template(cls, prompt_type: str) -> str:
         """Get the template for a specific prompt type."""
-        cls.load_prompts()  # Always reload from disk
-        return cls._prompts.get(prompt_type, {}).get('template')
+        return cls.load_prompts().get(prompt_type, {}).get('template')
     
     @classmethod
     def get_prompt_output_format(cls, prompt_type: str) -> dict:
-        cls.load_prompts()  # Always reload from disk
-        return cls._prompts.get(prompt_type, {}).get('output_format')
+        return cls.load_prompts().get(prompt_type, {}).get('output_format')
     
     @classmethod
     def load_metadata(cls) -> dict:
@@ -67,8 +172,7 @@ class Config:
     @classmethod
     def get_prompt_description(cls, prompt_type: str) -> Optional[str]:
         """Get the description for a specific prompt type."""
-        cls.load_prompts()  # Always reload from disk
-        prompt_config = cls._prompts.get(prompt_type)
+        prompt_config = cls.load_prompts().get(prompt_type)
         if not prompt_config:
             return None
         return prompt_config.get('description')
@@ -76,8 +180,7 @@ class Config:
     @classmethod
     def list_available_prompts(cls) -> Dict[str, str]:
         """List all available prompt types and their descriptions."""
-        cls.load_prompts()  # Always reload from disk
         return {
             name: config.get('description', '')
-            for name, config in cls._prompts.items()
+            for name, config in cls.load_prompts().items()
         } 
\ No newline at end of file
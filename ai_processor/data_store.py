@@ -1,43 +1,150 @@
+import asyncio
 import json
 import logging
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, TypeVar
+from datetime import datetime, timedelta
 import os
 from pathlib import Path
+from .storage import StorageBackend, get_storage_backend
+from .item_index import ItemIndex, get_item_index
+from .dedup_index import DuplicateIndex, get_duplicate_index
 
 logger = logging.getLogger(__name__)
 
+# Last id handed out, shared by every DataStore in the process
+_id_lock = threading.Lock()
+_last_id_time: Optional[datetime] = None
+
+# Storage calls block on disk (or SQLite), so DataStore runs them on a small
+# thread pool shared by every instance instead of on the event loop
+IO_WORKERS = int(os.getenv("DATASTORE_IO_WORKERS", "4"))
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_lock = threading.Lock()
+
+# What save() does with an extracted item that near-duplicates a stored one:
+# "merge" fills the stored item's empty fields from it, "drop" discards it,
+# "off" saves it anyway
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "merge")
+
+T = TypeVar("T")
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """The bounded executor used for storage I/O, created on first use."""
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="datastore-io")
+        return _io_executor
+
 class DataStore:
-    def __init__(self, storage_dir: str = "data"):
+    def __init__(
+        self,
+        storage_dir: str = "data",
+        storage: Optional[StorageBackend] = None,
+        duplicate_policy: Optional[str] = None
+    ):
         self.storage_dir = Path(storage_dir)
         self.tasks_dir = self.storage_dir / "tasks"
         self._ensure_storage_dirs()
+        self.storage = storage or get_storage_backend(self.storage_dir)
+        self.duplicate_policy = duplicate_policy or DUPLICATE_POLICY
+    
+    async def _run_io(self, fn: Callable[..., T], *args) -> T:
+        """Run a blocking storage call on the I/O executor without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_io_executor(), fn, *args)
         
     def _ensure_storage_dirs(self):
         """Create necessary storage directories if they don't exist."""
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         self.tasks_dir.mkdir(parents=True, exist_ok=True)
     
-    def _get_storage_path(self, item_id: str) -> Path:
-        """Get the storage path for an item in the tasks folder."""
-        return self.tasks_dir / f"{item_id}.json"
-    
     def _generate_id(self) -> str:
-        """Generate a unique ID for an item."""
-        return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        """
+        Generate a unique ID for an item.
+        
+        IDs keep the timestamp format but are strictly increasing: when the
+        clock has not advanced (or went back) since the last ID, the next
+        microsecond is used instead.
+        """
+        global _last_id_time
+        with _id_lock:
+            now = datetime.now()
+            if _last_id_time is not None and now <= _last_id_time:
+                now = _last_id_time + timedelta(microseconds=1)
+            _last_id_time = now
+        return now.strftime("%Y%m%d_%H%M%S_%f")
+    
+    @property
+    def duplicate_index(self) -> DuplicateIndex:
+        """Near-duplicate title index over the stored items, built on first use."""
+        return get_duplicate_index(self.storage)
     
-    async def save(self, data: Dict[str, Any], prompt_type: str) -> Dict[str, Any]:
+    @staticmethod
+    def _merge_into(existing: Dict[str, Any], item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The stored item with its empty fields filled from a duplicate, or None if nothing changes."""
+        merged = None
+        for key, value in item.items():
+            if key in ("id", "type", "created_at", "status", "prompt_version") or value in (None, "", [], {}):
+                continue
+            if existing.get(key) in (None, "", [], {}):
+                if merged is None:
+                    merged = dict(existing)
+                merged[key] = value
+        if merged is not None:
+            merged["updated_at"] = datetime.now().isoformat()
+        return merged
+    
+    def _save_deduplicated(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Check items against the duplicate index and write the result as one batch."""
+        index = self.duplicate_index
+        # Held across check and write so concurrent saves see each other's items
+        with index.lock:
+            unique, duplicates = index.partition(items)
+            to_write = list(unique)
+            merged: Dict[str, Dict[str, Any]] = {}
+            if self.duplicate_policy == "merge":
+                for item, existing in duplicates:
+                    target = merged.get(existing["id"], existing)
+                    updated = self._merge_into(target, item)
+                    if updated is not None:
+                        merged[existing["id"]] = updated
+                # Duplicates of an item in this batch update that item in place
+                for item in unique:
+                    if item["id"] in merged:
+                        item.update(merged.pop(item["id"]))
+                to_write.extend(merged.values())
+            if to_write:
+                self.storage.put_many(to_write)
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} near-duplicate items ({self.duplicate_policy})")
+        return {
+            "items": [item["id"] for item in unique],
+            "duplicates": sorted({existing["id"] for _, existing in duplicates}),
+            "merged": sorted(merged),
+        }
+    
+    async def save(self, data: Dict[str, Any], prompt_type: str, prompt_version: Optional[str] = None) -> Dict[str, Any]:
         """
         Save processed data to storage using unified structure.
         
+        All items of one extraction are written as a single batch, so either
+        all of them are stored or, after a crash, none are. Items that
+        near-duplicate a stored item (or an earlier item of the same batch)
+        are merged or dropped according to the duplicate policy.
+        
         Args:
             data: Dictionary containing processed data
             prompt_type: Type of prompt used to generate the data
+            prompt_version: Content hash of the prompt, recorded on each item
             
         Returns:
-            Dictionary with saved item IDs
+            Dictionary with saved item IDs, and the IDs of stored items that
+            new items were found to duplicate
         """
-        saved_ids = []
+        items = []
         
         try:
             # Handle todos
@@ -49,8 +156,7 @@ class DataStore:
                     todo["type"] = prompt_type
                     todo["created_at"] = datetime.now().isoformat()
                     todo["status"] = "active"  # Set default status
-                    self._save_item(item_id, todo)
-                    saved_ids.append(item_id)
+                    items.append(todo)
             
             # Handle calendar events - convert to unified structure
             if "events" in data:
@@ -72,8 +178,7 @@ class DataStore:
                         "created_at": datetime.now().isoformat(),
                         "status": "active"
                     }
-                    self._save_item(item_id, unified_item)
-                    saved_ids.append(item_id)
+                    items.append(unified_item)
             
             # Handle general items - convert to unified structure
             if "items" in data:
@@ -93,34 +198,50 @@ class DataStore:
                         "created_at": datetime.now().isoformat(),
                         "status": "active"
                     }
-                    self._save_item(item_id, unified_item)
-                    saved_ids.append(item_id)
+                    items.append(unified_item)
             
-            return {"items": saved_ids}
+            if prompt_version:
+                for item in items:
+                    item["prompt_version"] = prompt_version
+            
+            if self.duplicate_policy == "off":
+                await self._run_io(self.storage.put_many, items)
+                return {"items": [item["id"] for item in items]}
+            return await self._run_io(self._save_deduplicated, items)
             
         except Exception as e:
             logger.error(f"Error saving data: {e}")
             raise
     
     def _save_item(self, item_id: str, item_data: Dict[str, Any]):
-        """Save a single item to storage in the tasks folder."""
-        file_path = self._get_storage_path(item_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(item_data, f, indent=2, ensure_ascii=False)
+        """Save a single item through the storage backend."""
+        self.storage.put(item_data)
     
     async def get(self, item_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a single item from storage."""
         try:
-            file_path = self._get_storage_path(item_id)
-            if not file_path.exists():
-                return None
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return await self._run_io(self.storage.get, item_id)
         except Exception as e:
             logger.error(f"Error retrieving item {item_id}: {e}")
             return None
     
+    async def get_many(self, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve several items in one storage round trip.
+        
+        Args:
+            item_ids: IDs of the items to retrieve
+            
+        Returns:
+            Dictionary of the items found, keyed by ID (missing IDs are left out)
+        """
+        try:
+            found = await self._run_io(self.storage.load_many, item_ids)
+            return {item_id: stored.item for item_id, stored in found.items()}
+        except Exception as e:
+            logger.error(f"Error retrieving items: {e}")
+            return {}
+    
     async def list_items(
         self,
         item_type: Optional[str] = None,
@@ -141,35 +262,36 @@ class DataStore:
             List of items matching the criteria
         """
         try:
-            items = []
-            
-            if not self.tasks_dir.exists():
-                return []
-            
-            # Get all JSON files in the tasks directory
-            files = sorted(self.tasks_dir.glob("*.json"), reverse=True)
-            
-            for file_path in files:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    item = json.load(f)
-                    
-                    # Apply filters
-                    if item_type and item.get("type") != item_type:
-                        continue
-                    if status and item.get("status") != status:
-                        continue
-                    
-                    items.append(item)
-            
-            # Apply pagination
-            start = offset
-            end = offset + limit
-            return items[start:end]
-            
+            return await self._run_io(self.item_index.list_items, item_type, status, limit, offset)
         except Exception as e:
             logger.error(f"Error listing items: {e}")
             return []
     
+    async def list_page(
+        self,
+        item_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        List items with keyset (cursor) pagination, newest first.
+        
+        Args:
+            item_type: Optional type filter ("todo", "calendar", "general", etc.)
+            status: Optional status filter ("active", "completed", "dismissed")
+            limit: Maximum number of items to return
+            cursor: next_cursor from the previous page, or None for the first page
+            
+        Returns:
+            Dictionary with the page "items" and the "next_cursor" (None on the last page)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        items, next_cursor = await self._run_io(self.item_index.page, item_type, status, limit, cursor)
+        return {"items": items, "next_cursor": next_cursor}
+    
     async def update_status(self, item_id: str, new_status: str) -> bool:
         """
         Update the status of an item.
@@ -190,7 +312,7 @@ class DataStore:
             item["updated_at"] = datetime.now().isoformat()
             
             # Save updated item
-            self._save_item(item_id, item)
+            await self._run_io(self._save_item, item_id, item)
             return True
             
         except Exception as e:
@@ -208,58 +330,59 @@ class DataStore:
             True if deletion was successful, False otherwise
         """
         try:
-            file_path = self._get_storage_path(item_id)
-            if file_path.exists():
-                file_path.unlink()
-                return True
-            return False
+            return await self._run_io(self.storage.delete, item_id)
         except Exception as e:
             logger.error(f"Error deleting item {item_id}: {e}")
             return False
     
-    async def get_active_items_for_context(self, prompt_type: str) -> List[Dict[str, Any]]:
+    @property
+    def item_index(self) -> ItemIndex:
+        """Secondary (type, status, date, order) index over the stored items, built on first use."""
+        return get_item_index(self.storage)
+    
+    async def get_active_items_for_context(self, prompt_type: str, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Get active items formatted for GPT context.
         Only returns items that are:
         - Have status "active" AND
         - Have a due_date/start_time that is today or in the future (if relevant)
+        Dates are parsed once when an item is indexed, so this costs time in
+        proportion to the number of results rather than the stored history.
         Args:
             prompt_type: Type of items to get ("todo", "calendar", "general", etc.)
+            limit: Maximum number of items to return (newest first)
         Returns:
             List of relevant active items formatted for context
         """
         try:
             today = datetime.now().date()
-            relevant_items = []
-            # Get all active items of the specified type
-            active_items = await self.list_items(item_type=prompt_type, status="active")
-            for item in active_items:
-                # For todos, check due_date
-                if prompt_type == "todo":
-                    if "due_date" in item and item["due_date"]:
-                        try:
-                            due_date = datetime.strptime(item["due_date"], "%Y-%m-%d").date()
-                            if due_date >= today:
-                                relevant_items.append(item)
-                        except ValueError as e:
-                            continue
-                    else:
-                        relevant_items.append(item)
-                # For calendar, check start_time
-                elif prompt_type == "calendar":
-                    if "start_time" in item and item["start_time"]:
-                        try:
-                            start_time = datetime.strptime(item["start_time"], "%Y-%m-%d %H:%M")
-                            if start_time.date() >= today:
-                                relevant_items.append(item)
-                        except ValueError as e:
-                            continue
-                    else:
-                        relevant_items.append(item)
-                # For all other types, include all active items
-                else:
-                    relevant_items.append(item)
-            return relevant_items
+            return await self._run_io(self.item_index.items_from, prompt_type, "active", today, limit)
+        except Exception as e:
+            logger.error(f"Error getting active items for context: {e}")
+            return []
+    
+    async def get_active_items_for_contexts(
+        self,
+        prompt_types: List[str],
+        limit: int = 100
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the context items of several prompt types in one executor call.
+        
+        Args:
+            prompt_types: Types of items to get
+            limit: Maximum number of items per type (newest first)
+        Returns:
+            Dictionary of relevant active items keyed by prompt type
+        """
+        def collect():
+            today = datetime.now().date()
+            return {
+                prompt_type: self.item_index.items_from(prompt_type, "active", today, limit)
+                for prompt_type in prompt_types
+            }
+        try:
+            return await self._run_io(collect)
         except Exception as e:
             logger.error(f"Error getting active items for context: {e}")
-            return [] 
\ No newline at end of file
+            return {prompt_type: [] for prompt_type in prompt_types}
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import random
+import threading
+import weakref
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from .item_index import DATE_FIELDS, get_item_index
+from .search_index import term_variants, tokenize
+from .storage import StorageBackend, StoredItem
+
+# MinHash signature of NUM_BANDS * ROWS_PER_BAND values; items sharing all rows
+# of any band are compared exactly
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+SHINGLE_SIZE = 3
+
+# Minimum Jaccard similarity of title shingles for two items to be duplicates
+DEFAULT_THRESHOLD = 0.7
+
+# Only active items created within this many days can absorb a new item;
+# anything older, finished or dismissed is a different occurrence (0: no limit)
+DUPLICATE_MAX_AGE_DAYS = int(os.getenv("DUPLICATE_MAX_AGE_DAYS", "60"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240501)  # Fixed seed: signatures are reproducible
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_BANDS * ROWS_PER_BAND)
+]
+
+def title_shingles(title: str) -> FrozenSet[str]:
+    """Character shingles of a title after Hebrew normalisation and prefix stripping."""
+    words = [term_variants(token)[-1] for token in tokenize(title or "")]
+    text = " ".join(words)
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+def item_date_key(item: Dict[str, Any]) -> Optional[str]:
+    """The calendar day an item is about (due date or start time), if any."""
+    date_field = DATE_FIELDS.get(item.get("type"))
+    value = item.get(date_field[0]) if date_field else item.get("due_date") or item.get("start_time")
+    return str(value)[:10] if value else None
+
+def minhash(shingles: FrozenSet[str]) -> Tuple[int, ...]:
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+class _Fingerprint:
+    __slots__ = ("item_type", "date", "shingles", "bands")
+
+    def __init__(self, item: Dict[str, Any]):
+        self.item_type = item.get("type")
+        self.date = item_date_key(item)
+        self.shingles = title_shingles(item.get("title", ""))
+        signature = minhash(self.shingles) if self.shingles else ()
+        self.bands = [
+            (self.item_type, band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            for band in range(NUM_BANDS)
+        ] if signature else []
+
+class DuplicateIndex:
+    """
+    Locality-sensitive index of item titles for near-duplicate detection.
+
+    Only active items are indexed, so a new item is never folded into a
+    completed or dismissed one. Titles are normalised like search text,
+    reduced to character shingles and MinHashed; LSH banding finds candidate
+    items of the same type, which are then checked exactly: title Jaccard
+    similarity at or above the threshold, the same date (or both undated),
+    and created within `max_age_days`. Kept current from storage
+    notifications like the other item indexes.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_age_days: int = DUPLICATE_MAX_AGE_DAYS
+    ):
+        self.storage = storage
+        self.threshold = threshold
+        self.max_age_days = max_age_days
+        # Held by callers that must check and write without another save interleaving
+        self.lock = threading.RLock()
+        self._built = False
+        self._fingerprints: Dict[str, _Fingerprint] = {}
+        self._buckets: Dict[tuple, Set[str]] = {}
+        self._items: Dict[str, Dict[str, Any]] = {}
+        storage.add_listener(self._on_storage_change)
+        storage.start_watching()
+
+    def _on_storage_change(self, event: str, item_id: str, stored: Optional[StoredItem]):
+        with self.lock:
+            if not self._built:
+                return  # Will see the change when first built
+            if event == "put":
+                self._add(stored.item)
+            elif event == "delete":
+                self._remove(item_id)
+            elif event == "reload":
+                self._built = False
+
+    def _ensure_built(self):
+        self.storage.check_external_changes()
+        with self.lock:
+            if self._built:
+                return
+            self._fingerprints = {}
+            self._buckets = {}
+            self._items = {}
+            # Shares the item index's scan and item dicts
+            for stored in get_item_index(self.storage).stored_items():
+                self._add(stored.item)
+            self._built = True
+
+    def build_in_background(self):
+        """Build the index on a daemon thread so the first save does not wait for it."""
+        thread = threading.Thread(target=self._ensure_built, name="duplicate-index-build", daemon=True)
+        thread.start()
+
+    def _add(self, item: Dict[str, Any]):
+        item_id = item.get("id")
+        if not item_id:
+            return
+        self._remove(item_id)
+        if item.get("status", "active") != "active":
+            return
+        fingerprint = _Fingerprint(item)
+        for band in fingerprint.bands:
+            self._buckets.setdefault(band, set()).add(item_id)
+        self._fingerprints[item_id] = fingerprint
+        self._items[item_id] = item
+
+    def _remove(self, item_id: str):
+        fingerprint = self._fingerprints.pop(item_id, None)
+        if fingerprint is None:
+            return
+        for band in fingerprint.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._buckets[band]
+        self._items.pop(item_id, None)
+
+    def _best_match(self, fingerprint: _Fingerprint, candidates: Iterable[Tuple[_Fingerprint, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """The most similar recent candidate above the threshold; ties go to the oldest id."""
+        best = None
+        best_key = None
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat() if self.max_age_days > 0 else None
+        for other, item in candidates:
+            if fingerprint.date != other.date:
+                continue
+            if cutoff is not None and str(item.get("created_at") or "") < cutoff:
+                continue
+            score = jaccard(fingerprint.shingles, other.shingles)
+            if score < self.threshold:
+                continue
+            key = (-score, str(item.get("id", "")))
+            if best_key is None or key < best_key:
+                best, best_key = item, key
+        return best
+
+    def _find(self, fingerprint: _Fingerprint, item_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        self._ensure_built()
+        with self.lock:
+            candidate_ids = set()
+            for band in fingerprint.bands:
+                candidate_ids.update(self._buckets.get(band, ()))
+            candidate_ids.discard(item_id)
+            candidates = [(self._fingerprints[i], self._items[i]) for i in candidate_ids]
+        return self._best_match(fingerprint, candidates)
+
+    def find_duplicate(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The stored item that `item` duplicates, or None."""
+        return self._find(_Fingerprint(item), item.get("id"))
+
+    def partition(self, items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+        """
+        Split new items into unique ones and (item, existing item) duplicates.
+
+        Items are also checked against earlier items of the same list, so a
+        batch repeating itself keeps only the first occurrence.
+        """
+        unique = []
+        duplicates = []
+        seen: List[Tuple[_Fingerprint, Dict[str, Any]]] = []
+        for item in items:
+            fingerprint = _Fingerprint(item)
+            existing = self._find(fingerprint, item.get("id"))
+            if existing is None:
+                existing = self._best_match(fingerprint, [
+                    entry for entry in seen if entry[0].item_type == fingerprint.item_type
+                ])
+            if existing is not None:
+                duplicates.append((item, existing))
+            else:
+                unique.append(item)
+                seen.append((fingerprint, item))
+        return unique, duplicates
+
+_shared_indexes: "weakref.WeakKeyDictionary[StorageBackend, DuplicateIndex]" = weakref.WeakKeyDictionary()
+_shared_lock = threading.Lock()
+
+def get_duplicate_index(storage: StorageBackend) -> DuplicateIndex:
+    """The shared DuplicateIndex of a storage backend, created on first use."""
+    with _shared_lock:
+        index = _shared_indexes.get(storage)
+        if index is None:
+            index = DuplicateIndex(storage)
+            _shared_indexes[storage] = index
+        return index
@@ -0,0 +1,260 @@
+import base64
+import bisect
+import json
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .storage import StorageBackend, StoredItem
+
+logger = logging.getLogger(__name__)
+
+# Date field, its format and the length of a formatted value, used to decide
+# whether an item is still relevant, per item type
+DATE_FIELDS = {
+    "todo": ("due_date", "%Y-%m-%d", 10),
+    "calendar": ("start_time", "%Y-%m-%d %H:%M", 16),
+}
+
+# Marks an item whose date field is set but cannot be parsed; such items are
+# never returned as context, matching the previous behaviour.
+_INVALID_DATE = object()
+
+# Position of an item in list order: (created_at, id), listed newest first
+SortKey = Tuple[str, str]
+
+@dataclass
+class _IndexedItem:
+    stored: StoredItem
+    key: Tuple[Optional[str], Optional[str]]
+    date: Any  # date, None (no date) or _INVALID_DATE
+    sort_key: SortKey
+
+@dataclass
+class _Bucket:
+    """Items sharing one (type, status) pair."""
+    dated: List[Tuple[date, str]] = field(default_factory=list)  # sorted by (date, id)
+    undated: Set[str] = field(default_factory=set)
+
+def parse_item_date(item: Dict[str, Any]):
+    """Parse the relevance date of an item once; returns a date, None or _INVALID_DATE."""
+    date_field = DATE_FIELDS.get(item.get("type"))
+    if not date_field:
+        return None
+    name, fmt, length = date_field
+    value = item.get(name)
+    if not value:
+        return None
+    try:
+        # fromisoformat is much faster than strptime; only trust it for values
+        # that already have the exact length of the expected format
+        if isinstance(value, str) and len(value) == length:
+            try:
+                return datetime.fromisoformat(value).date()
+            except ValueError:
+                pass
+        return datetime.strptime(value, fmt).date()
+    except (TypeError, ValueError):
+        return _INVALID_DATE
+
+def item_sort_key(item: Dict[str, Any]) -> SortKey:
+    created_at = item.get("created_at")
+    return (str(created_at) if created_at is not None else "", str(item.get("id", "")))
+
+def encode_cursor(sort_key: SortKey) -> str:
+    """Opaque pagination cursor for the position of an item."""
+    raw = json.dumps(list(sort_key), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> SortKey:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(created_at, str) or not isinstance(item_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return (created_at, item_id)
+
+def _order_keys(key: Tuple[Optional[str], Optional[str]]):
+    """The (type, status) filters an item is listed under; None means any."""
+    item_type, status = key
+    return [(item_type, status), (item_type, None), (None, status), (None, None)]
+
+class ItemIndex:
+    """
+    Secondary indexes over the items of a storage backend.
+
+    Items are bucketed by (type, status); within a bucket, dated items are kept
+    in a list sorted by their parsed date so "due today or later" is a bisect
+    plus a slice. For listing, every filter combination keeps its items sorted
+    by (created_at, id), so offset and cursor pages are slices too. The index is
+    built once from the backend and then maintained from its change
+    notifications. It is the only full scan of the backend: the other
+    in-memory views build from stored_items() and share its item dicts.
+    """
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self._lock = threading.RLock()
+        self._built = False
+        self._items: Dict[str, _IndexedItem] = {}
+        self._buckets: Dict[Tuple[Optional[str], Optional[str]], _Bucket] = {}
+        self._orders: Dict[Tuple[Optional[str], Optional[str]], List[SortKey]] = {}
+        storage.add_listener(self._on_storage_change)
+        storage.start_watching()
+
+    def _on_storage_change(self, event: str, item_id: str, stored: Optional[StoredItem]):
+        with self._lock:
+            if not self._built:
+                return  # Will see the change when first built
+            if event == "put":
+                self._add(stored)
+            elif event == "delete":
+                self._remove(item_id)
+            elif event == "reload":
+                self._built = False
+
+    def _ensure_built(self):
+        self.storage.check_external_changes()
+        with self._lock:
+            if self._built:
+                return
+            self._items = {}
+            self._buckets = {}
+            self._orders = {}
+            for stored in self.storage.scan():
+                self._add(stored)
+            self._built = True
+
+    def _add(self, stored: StoredItem):
+        item = stored.item
+        item_id = item.get("id")
+        if not item_id:
+            return
+        self._remove(item_id)
+        key = (item.get("type"), item.get("status"))
+        item_date = parse_item_date(item)
+        bucket = self._buckets.setdefault(key, _Bucket())
+        if item_date is None:
+            bucket.undated.add(item_id)
+        elif item_date is not _INVALID_DATE:
+            bisect.insort(bucket.dated, (item_date, item_id))
+        sort_key = item_sort_key(item)
+        for order_key in _order_keys(key):
+            bisect.insort(self._orders.setdefault(order_key, []), sort_key)
+        self._items[item_id] = _IndexedItem(stored=stored, key=key, date=item_date, sort_key=sort_key)
+
+    def _remove(self, item_id: str):
+        indexed = self._items.pop(item_id, None)
+        if indexed is None:
+            return
+        for order_key in _order_keys(indexed.key):
+            order = self._orders.get(order_key, [])
+            pos = bisect.bisect_left(order, indexed.sort_key)
+            if pos < len(order) and order[pos] == indexed.sort_key:
+                del order[pos]
+        bucket = self._buckets.get(indexed.key)
+        if bucket is None:
+            return
+        if indexed.date is None:
+            bucket.undated.discard(item_id)
+        elif indexed.date is not _INVALID_DATE:
+            entry = (indexed.date, item_id)
+            pos = bisect.bisect_left(bucket.dated, entry)
+            if pos < len(bucket.dated) and bucket.dated[pos] == entry:
+                del bucket.dated[pos]
+
+    def items_from(
+        self,
+        item_type: str,
+        status: str,
+        since: date,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Items of one type and status that are undated or dated on/after `since`.
+
+        Results are newest first, like list_items.
+        """
+        self._ensure_built()
+        with self._lock:
+            bucket = self._buckets.get((item_type, status))
+            if bucket is None:
+                return []
+            start = bisect.bisect_left(bucket.dated, (since, ""))
+            ids = [item_id for _, item_id in bucket.dated[start:]]
+            ids.extend(bucket.undated)
+            ids.sort(key=lambda item_id: self._items[item_id].sort_key, reverse=True)
+            if limit is not None:
+                ids = ids[:limit]
+            return [self._items[item_id].stored.item for item_id in ids]
+
+    def stored_items(self) -> List[StoredItem]:
+        """Every stored item, in no particular order; the objects are shared, not copied."""
+        self._ensure_built()
+        with self._lock:
+            return [indexed.stored for indexed in self._items.values()]
+
+    def items_with_status(self, status: str) -> List[Dict[str, Any]]:
+        """Every item with a status, of any type, newest first."""
+        self._ensure_built()
+        with self._lock:
+            order = self._orders.get((None, status), [])
+            return [self._items[key[1]].stored.item for key in reversed(order)]
+
+    def list_items(
+        self,
+        item_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Items matching the filters, newest first, skipping `offset` items."""
+        self._ensure_built()
+        with self._lock:
+            order = self._orders.get((item_type or None, status or None), [])
+            end = max(len(order) - offset, 0)
+            start = max(end - limit, 0)
+            return [self._items[key[1]].stored.item for key in reversed(order[start:end])]
+
+    def page(
+        self,
+        item_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Keyset page of items matching the filters, newest first.
+
+        `cursor` is the next_cursor of the previous page (None for the first
+        page). The position is found by bisecting, so earlier items are never
+        visited, and pages stay consistent when items change between calls.
+        Returns the items and the cursor for the next page (None at the end).
+        """
+        after = decode_cursor(cursor) if cursor else None
+        self._ensure_built()
+        with self._lock:
+            order = self._orders.get((item_type or None, status or None), [])
+            end = len(order) if after is None else bisect.bisect_left(order, after)
+            start = max(end - limit, 0)
+            keys = order[start:end][::-1]
+            items = [self._items[key[1]].stored.item for key in keys]
+        next_cursor = encode_cursor(keys[-1]) if keys and start > 0 else None
+        return items, next_cursor
+
+_shared_indexes: "weakref.WeakKeyDictionary[StorageBackend, ItemIndex]" = weakref.WeakKeyDictionary()
+_shared_lock = threading.Lock()
+
+def get_item_index(storage: StorageBackend) -> ItemIndex:
+    """The shared ItemIndex of a storage backend, created on first use."""
+    with _shared_lock:
+        index = _shared_indexes.get(storage)
+        if index is None:
+            index = ItemIndex(storage)
+            _shared_indexes[storage] = index
+        return index
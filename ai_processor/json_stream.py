@@ -0,0 +1,100 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (keys of the enclosing objects above the section, section key, item)
+StreamedItem = Tuple[Tuple[str, ...], str, Dict[str, Any]]
+
+class _Frame:
+    __slots__ = ("kind", "key", "expect_key")
+
+    def __init__(self, kind: str, key: Optional[str]):
+        self.kind = kind  # "{" or "["
+        self.key = key    # Current key of an object; the key an array is stored under
+        self.expect_key = kind == "{"
+
+class ItemStreamParser:
+    """
+    Incremental scanner for a JSON response arriving in chunks.
+
+    Emits every object in an array stored under one of the `sections` keys
+    (such as "todos") as soon as its closing brace arrives, at any nesting
+    depth: {"todos": [...]} yields path (), while the combined-mode
+    {"todo": {"todos": [...]}} yields path ("todo",). Objects nested inside
+    an emitted item are part of it, not emitted themselves.
+
+    The scanner only tracks strings, brackets and keys; each item is parsed
+    with json.loads once complete, and the whole text is kept for the final
+    parse and the response cache.
+    """
+
+    def __init__(self, sections: Iterable[str]):
+        self.sections = set(sections)
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._item_start: Optional[int] = None
+        self._item_depth = 0
+        self._item_path: Tuple[str, ...] = ()
+        self._item_section = ""
+
+    def feed(self, chunk: str) -> List[StreamedItem]:
+        """Add the next piece of the response; returns the items it completed."""
+        self.text += chunk
+        text = self.text
+        completed: List[StreamedItem] = []
+        stack = self._stack
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        stack[-1].key = json.loads(text[self._string_start:i + 1])
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = bool(stack) and stack[-1].kind == "{" and stack[-1].expect_key
+            elif char == "{" or char == "[":
+                parent = stack[-1] if stack else None
+                if (
+                    char == "{" and self._item_start is None and parent is not None
+                    and parent.kind == "[" and parent.key in self.sections
+                ):
+                    self._item_start = i
+                    self._item_depth = len(stack)
+                    object_keys = tuple(frame.key for frame in stack if frame.kind == "{")
+                    self._item_path = object_keys[:-1]
+                    self._item_section = parent.key
+                stack.append(_Frame(char, parent.key if char == "[" and parent is not None else None))
+            elif char == "}" or char == "]":
+                if stack:
+                    stack.pop()
+                if char == "}" and self._item_start is not None and len(stack) == self._item_depth:
+                    raw = text[self._item_start:i + 1]
+                    self._item_start = None
+                    try:
+                        item = json.loads(raw)
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping unparseable streamed item: {e}")
+                        continue
+                    completed.append((self._item_path, self._item_section, item))
+            elif char == ":":
+                if stack and stack[-1].kind == "{":
+                    stack[-1].expect_key = False
+            elif char == ",":
+                if stack and stack[-1].kind == "{":
+                    stack[-1].expect_key = True
+        self._pos = len(text)
+        return completed
@@ -1,10 +1,95 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
-import openai
+from .async_runtime import get_async_client
 from .config import Config
-from .data_store import DataStore
+from .data_store import DataStore, get_io_executor
+from .json_stream import ItemStreamParser
+from .rate_limit import get_rate_limiter
+from .resilience import PartialResponseError, get_llm_caller
+from .response_cache import ResponseCache, cache_key, get_response_cache
+from .token_budget import TokenBudgeter
+
+# Combined mode: the prompts of several types in one request, messages sent once
+COMBINED_INTRO = (
+    "Carry out each of the following extraction tasks on the same WhatsApp messages, "
+    "which are listed once at the end. Return a single JSON object with one key per "
+    "task name; the value of each key is the JSON object that task asks for."
+)
+COMBINED_MESSAGES_REFERENCE = "(the messages are listed once at the end of this request)"
+
+# Result keys DataStore.save stores items from
+RESULT_SECTIONS = ("todos", "events", "items")
+
+# The result key each built-in prompt answers with; other prompts may use any
+# of RESULT_SECTIONS
+PROMPT_RESULT_SECTIONS = {"todo": "todos", "calendar": "events", "general": "items"}
+
+SYSTEM_PROMPT = "You are a helpful assistant that extracts structured information from WhatsApp messages. Always return valid JSON by the set format. And use Hebrew for your responses."
+
+# Called with (prompt type, event) for each item saved while a response streams in
+ItemCallback = Callable[[str, Dict[str, Any]], None]
+
+@dataclass
+class StreamedItems:
+    """Items saved while a response streamed in, by prompt type and result section."""
+    items: Dict[str, Dict[str, List[Dict[str, Any]]]] = field(default_factory=dict)
+    saved: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)
+    # Seconds from sending the request to the first saved item, by prompt type
+    first_item_after: Dict[str, float] = field(default_factory=dict)
+    # Items that failed validation and were not saved, by prompt type
+    skipped: Dict[str, int] = field(default_factory=dict)
+    
+    def report(self, prompt_type: str) -> Dict[str, Any]:
+        return {
+            'items': sum(len(items) for items in self.items.get(prompt_type, {}).values()),
+            'skipped': self.skipped.get(prompt_type, 0),
+            'first_item_after': self.first_item_after.get(prompt_type)
+        }
+    
+    def apply(self, prompt_type: str, result: Dict[str, Any]):
+        """Replace the sections of a parsed result with the items saved from them."""
+        saved = self.items.get(prompt_type, {})
+        for section in RESULT_SECTIONS:
+            if section in result:
+                result[section] = saved.get(section, [])
+
+def _result_sections(prompt_type: str) -> Tuple[str, ...]:
+    """The result keys items of a prompt are taken from."""
+    section = PROMPT_RESULT_SECTIONS.get(prompt_type)
+    return (section,) if section else RESULT_SECTIONS
+
+def _saved_sections(prompt_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a validated result that is saved, as it is when streaming."""
+    return {name: result[name] for name in _result_sections(prompt_type) if name in result}
+
+def _invalid_result_reason(prompt_type: str, result: Any) -> Optional[str]:
+    """Why a parsed response cannot be used as the result of a prompt, or None if it can."""
+    if not isinstance(result, dict):
+        return f"expected a JSON object, got {type(result).__name__}"
+    names = _result_sections(prompt_type)
+    if not any(isinstance(result.get(name), list) for name in names):
+        return "response has no " + " or ".join(f"'{name}'" for name in names) + " list"
+    return None
+
+def _invalid_item_reason(item: Any) -> Optional[str]:
+    """Why an extracted item cannot be saved, or None if it can."""
+    if not isinstance(item, dict):
+        return f"expected an object, got {type(item).__name__}"
+    title = item.get("title")
+    if not isinstance(title, str) or not title.strip():
+        return "missing title"
+    return None
+
+@dataclass
+class PreparedMessages:
+    """The parts of a prompt that do not depend on the prompt type, computed once per batch."""
+    entries: List[Tuple[Any, str]]  # (timestamp, formatted message)
+    metadata: Dict[str, Any]
 
 class MessageProcessor:
     """Processes WhatsApp messages using GPT to extract structured information."""
@@ -13,22 +98,269 @@ class MessageProcessor:
         self.data_store = data_store
         self.logger = logging.getLogger(__name__)
         
-        # Initialize OpenAI client with API key
+        # The OpenAI client itself is shared, one per event loop
         if not Config.API_KEY:
             raise ValueError("OpenAI API key not found. Please set OPENAI_API_KEY in .env file")
-        openai.api_key = Config.API_KEY
         
         # Load prompts and metadata
         Config.load_prompts()
         Config.load_metadata()
+        
+        # Completions already paid for, shared by processors using the same data directory
+        self.response_cache: Optional[ResponseCache] = None
+        if Config.LLM_CACHE_ENABLED:
+            self.response_cache = get_response_cache(
+                self.data_store.storage_dir / "llm_cache.sqlite3",
+                max_bytes=Config.LLM_CACHE_MAX_MB * 1024 * 1024,
+                ttl=Config.LLM_CACHE_TTL
+            )
+        
+        # Keeps prompts within the input token budget
+        self.budgeter = TokenBudgeter(
+            budget=Config.PROMPT_TOKEN_BUDGET,
+            max_messages=Config.MAX_CONTEXT_MESSAGES,
+            max_message_tokens=Config.MAX_MESSAGE_TOKENS,
+            context_share=Config.CONTEXT_TOKEN_SHARE,
+            model=Config.MODEL
+        )
+    
+    def prepare_messages(self, messages: List[Dict[str, Any]]) -> PreparedMessages:
+        """Format messages and metadata once for several prompts over the same batch."""
+        return PreparedMessages(
+            entries=[(msg.get('timestamp'), self._format_message(msg)) for msg in messages],
+            metadata=self._prepare_metadata()
+        )
     
-    async def process_messages(self, messages: List[Dict[str, Any]], prompt_type: str = "general") -> Dict[str, Any]:
+    async def process_prompts(
+        self,
+        messages: List[Dict[str, Any]],
+        prompt_types: List[str],
+        max_concurrency: int = 3,
+        on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        combined: bool = False,
+        deadline: Optional[float] = None,
+        on_item: Optional[ItemCallback] = None,
+        stream: Optional[bool] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Process one batch of messages with several prompts concurrently.
+        
+        At most `max_concurrency` prompts run at a time. Each result is saved
+        by process_messages as soon as its prompt finishes, and passed to
+        `on_result` in completion order. With `combined`, all prompts go to
+        the model in a single request instead (see process_combined). All
+        prompts share the `deadline` (a time.monotonic() value); `on_item`
+        and `stream` are passed on to process_messages.
+        
+        Returns:
+            Results keyed by prompt type, in the order of `prompt_types`
+        """
+        prepared = self.prepare_messages(messages)
+        prompt_types = list(dict.fromkeys(prompt_types))
+        if combined and len(prompt_types) > 1:
+            results = await self.process_combined(
+                messages, prompt_types, prepared=prepared, deadline=deadline, on_item=on_item, stream=stream
+            )
+            if on_result is not None:
+                for prompt_type, result in results.items():
+                    on_result(prompt_type, result)
+            return results
+        
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        
+        async def run(prompt_type: str) -> Tuple[str, Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return prompt_type, await self.process_messages(
+                        messages, prompt_type, prepared=prepared, deadline=deadline, on_item=on_item, stream=stream
+                    )
+                except Exception as e:
+                    return prompt_type, {'error': str(e), 'metadata': {'prompt_type': prompt_type}}
+        
+        results = {}
+        for next_done in asyncio.as_completed([run(prompt_type) for prompt_type in prompt_types]):
+            prompt_type, result = await next_done
+            results[prompt_type] = result
+            if on_result is not None:
+                on_result(prompt_type, result)
+        return {prompt_type: results[prompt_type] for prompt_type in prompt_types}
+    
+    async def process_combined(
+        self,
+        messages: List[Dict[str, Any]],
+        prompt_types: List[str],
+        prepared: Optional[PreparedMessages] = None,
+        deadline: Optional[float] = None,
+        on_item: Optional[ItemCallback] = None,
+        stream: Optional[bool] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Process messages with several prompts in one model call.
+        
+        Each prompt's instructions and context items are included as a named
+        task, the messages only once; the response holds one section per
+        prompt type, which is saved as that type. The token budget covers
+        the whole request, trimming the oldest context items of any type.
+        When streaming, each section's items are saved as they arrive.
+        
+        Returns:
+            Results keyed by prompt type, shaped like process_messages results
+        """
+        requested = prompt_types = list(dict.fromkeys(prompt_types))
+        self.logger.debug(f"process_combined: prompt types {prompt_types}, {len(messages)} messages")
+        
+        def base_metadata(prompt_type: str) -> Dict[str, Any]:
+            return {
+                'processing_time': datetime.now().isoformat(),
+                'prompt_type': prompt_type,
+                'mode': 'combined',
+                'message_count': len(messages)
+            }
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        templates = {}
+        for prompt_type in prompt_types:
+            try:
+                template = Config.get_compiled_template(prompt_type)
+                if not template:
+                    raise ValueError(f"Invalid prompt type: {prompt_type}")
+                templates[prompt_type] = template
+            except Exception as e:
+                # Other prompts still run
+                results[prompt_type] = {'error': str(e), 'metadata': base_metadata(prompt_type)}
+        if not templates:
+            return {prompt_type: results[prompt_type] for prompt_type in requested}
+        prompt_types = [prompt_type for prompt_type in prompt_types if prompt_type in templates]
+        if stream is None:
+            stream = Config.LLM_STREAMING
+        streamed = StreamedItems() if stream else None
+        
+        try:
+            active_items = await self.data_store.get_active_items_for_contexts(prompt_types, limit=Config.MAX_CONTEXT_ITEMS)
+            if prepared is None:
+                prepared = self.prepare_messages(messages)
+            metadata = prepared.metadata
+            
+            def render(context_by_type: Dict[str, List[str]], formatted_messages: str) -> str:
+                parts = [COMBINED_INTRO]
+                for prompt_type, template in templates.items():
+                    parts.append(f"\n### Task \"{prompt_type}\"\n" + template.render({
+                        'messages': COMBINED_MESSAGES_REFERENCE,
+                        'context_items': self._join_context_items(
+                            context_by_type.get(prompt_type, []), bool(active_items[prompt_type])
+                        ),
+                        'metadata': metadata
+                    }))
+                parts.append("\n### Messages\n" + formatted_messages)
+                return "\n".join(parts)
+            
+            # Context items of all types compete for one budget, newest first
+            context_entries = sorted(
+                (
+                    (item.get('id'), prompt_type, self._format_context_item(item))
+                    for prompt_type, items in active_items.items()
+                    for item in items if "title" in item
+                ),
+                key=lambda entry: str(entry[0]),
+                reverse=True
+            )
+            budget = self.budgeter.fit(
+                SYSTEM_PROMPT + render({}, ""),
+                prepared.entries,
+                [(item_id, text) for item_id, _, text in context_entries]
+            )
+            dropped = set(budget.report["dropped_context_items"])
+            context_by_type: Dict[str, List[str]] = {}
+            for item_id, prompt_type, text in context_entries:
+                if item_id not in dropped:
+                    context_by_type.setdefault(prompt_type, []).append(text)
+            prompt = render(context_by_type, "\n".join(budget.messages))
+            
+            self.logger.debug(f"Combined prompt:\n{prompt}")
+            
+            if streamed is not None:
+                targets = {(prompt_type,): (prompt_type, templates[prompt_type].version) for prompt_type in prompt_types}
+                raw_content, key, cache_status = await self._fetch_streamed(prompt, deadline, targets, streamed, on_item)
+            else:
+                raw_content, key, cache_status = await self._fetch_completion(prompt, deadline)
+            self.logger.debug(f"Combined raw response:\n{raw_content}")
+            
+            try:
+                response = json.loads(raw_content.strip())
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON response from GPT: {str(e)}")
+            if not isinstance(response, dict):
+                raise ValueError(f"Expected JSON object, got {type(response)}")
+        except Exception as e:
+            self.logger.error(f"Error processing combined prompts {prompt_types}: {e}")
+            for prompt_type in prompt_types:
+                results[prompt_type] = {'error': str(e), 'metadata': base_metadata(prompt_type)}
+                if streamed is not None and prompt_type in streamed.saved:
+                    # Items that streamed in before the failure are stored
+                    results[prompt_type]['metadata']['saved_ids'] = streamed.saved[prompt_type]
+            return {prompt_type: results[prompt_type] for prompt_type in requested}
+        
+        any_saved = False
+        for prompt_type in prompt_types:
+            section = response.get(prompt_type)
+            reason = _invalid_result_reason(prompt_type, section)
+            if reason is not None:
+                results[prompt_type] = {
+                    'error': f"Invalid result for '{prompt_type}': {reason}",
+                    'metadata': base_metadata(prompt_type)
+                }
+                continue
+            if streamed is not None:
+                # Saved as they streamed in; the result lists the saved copies
+                streamed.apply(prompt_type, section)
+                saved_ids = streamed.saved.get(prompt_type, {'items': []})
+                any_saved = True
+            else:
+                try:
+                    saved_ids = await self.data_store.save(
+                        _saved_sections(prompt_type, section), prompt_type, prompt_version=templates[prompt_type].version
+                    )
+                    any_saved = True
+                except Exception as e:
+                    results[prompt_type] = {'error': str(e), 'metadata': base_metadata(prompt_type)}
+                    continue
+            section['metadata'] = dict(
+                base_metadata(prompt_type),
+                prompt_version=templates[prompt_type].version,
+                context_items_count=len(active_items[prompt_type]),
+                token_budget=budget.report,
+                cache=cache_status if self.response_cache is not None else "disabled",
+                saved_ids=saved_ids
+            )
+            if streamed is not None:
+                section['metadata']['streaming'] = streamed.report(prompt_type)
+            results[prompt_type] = section
+        
+        # Cache the response only if at least one section was usable
+        if any_saved and cache_status == "miss":
+            await self._cache_put(key, raw_content)
+        return {prompt_type: results[prompt_type] for prompt_type in requested}
+    
+    async def process_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        prompt_type: str = "general",
+        prepared: Optional[PreparedMessages] = None,
+        deadline: Optional[float] = None,
+        on_item: Optional[ItemCallback] = None,
+        stream: Optional[bool] = None
+    ) -> Dict[str, Any]:
         """
         Process a list of messages using GPT to extract structured information.
         
         Args:
             messages: List of message dictionaries with 'text' and 'timestamp' keys
             prompt_type: Type of prompt to use (todo, calendar, general)
+            prepared: Result of prepare_messages for these messages, if already computed
+            deadline: time.monotonic() value by which the model must have answered
+            on_item: Called with each item saved while the response streams in
+            stream: Stream the completion, saving each todo, event or item as
+                soon as it is complete (defaults to Config.LLM_STREAMING)
             
         Returns:
             Dictionary containing the processed results and metadata
@@ -38,24 +370,42 @@ class MessageProcessor:
         print(f"Number of messages: {len(messages)}")
         print("First message preview:", messages[0] if messages else "No messages")
         
+        if stream is None:
+            stream = Config.LLM_STREAMING
+        streamed = StreamedItems() if stream else None
+        
         try:
-            # Get the prompt template
-            template = Config.get_prompt_template(prompt_type)
+            # Get the prompt template, compiled once per prompt version
+            template = Config.get_compiled_template(prompt_type)
             if not template:
                 raise ValueError(f"Invalid prompt type: {prompt_type}")
-            
-            # Format messages for the prompt
-            formatted_messages = self._format_messages(messages)
+            prompt_version = template.version
             
             # Get active items for context
-            active_items = await self.data_store.get_active_items_for_context(prompt_type)
-            context_items = self._format_context_items(active_items)
+            active_items = await self.data_store.get_active_items_for_context(prompt_type, limit=Config.MAX_CONTEXT_ITEMS)
             
-            # Prepare metadata
-            metadata = self._prepare_metadata()
+            # Format messages and prepare metadata, unless shared with other prompts
+            if prepared is None:
+                prepared = self.prepare_messages(messages)
+            metadata = prepared.metadata
             
             # Format the prompt with context items
             try:
+                # Fit messages and context items into the token budget; the
+                # rest of the prompt is always sent
+                fixed_text = SYSTEM_PROMPT + template.render({
+                    'messages': '',
+                    'context_items': self._join_context_items([], bool(active_items)),
+                    'metadata': metadata
+                })
+                budget = self.budgeter.fit(
+                    fixed_text,
+                    prepared.entries,
+                    [(item.get('id'), self._format_context_item(item)) for item in active_items if "title" in item]
+                )
+                formatted_messages = "\n".join(budget.messages)
+                context_items = self._join_context_items(budget.context, bool(active_items))
+                
                 # First, prepare the metadata for formatting
                 format_kwargs = {
                     'messages': formatted_messages,
@@ -67,15 +417,8 @@ class MessageProcessor:
                 print("\nFormat arguments:")
                 print(json.dumps(format_kwargs, indent=2, ensure_ascii=False))
                 
-                # Escape the JSON example in the template
-                template = template.replace("{", "{{").replace("}", "}}")
-                # Then restore the actual format placeholders
-                template = template.replace("{{metadata[", "{metadata[").replace("]}}", "]}")
-                template = template.replace("{{context_items}}", "{context_items}")
-                template = template.replace("{{messages}}", "{messages}")
-                
-                # Format the template
-                prompt = template.format(**format_kwargs)
+                # Fill the placeholders; braces elsewhere are literal text
+                prompt = template.render(format_kwargs)
                 
                 # Debug print the formatted prompt
                 print("\nFormatted Prompt:")
@@ -89,34 +432,16 @@ class MessageProcessor:
                 raise
             except Exception as e:
                 print(f"\nTemplate Format Error: {str(e)}")
-                print("Template:", template)
+                print("Template:", template.template)
                 raise
             
-            print("\nSending request to GPT API...")
-            print("Model:", Config.MODEL)
-            print("Temperature:", Config.TEMPERATURE)
-            print("Max tokens:", Config.MAX_TOKENS)
-            
-            try:
-                # Call GPT API
-                response = openai.chat.completions.create(
-                    model=Config.MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that extracts structured information from WhatsApp messages. Always return valid JSON by the set format. And use Hebrew for your responses."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=Config.TEMPERATURE,
-                    max_tokens=Config.MAX_TOKENS,
-                    response_format={"type": "json_object"}
+            if streamed is not None:
+                raw_content, key, cache_status = await self._fetch_streamed(
+                    prompt, deadline, {(): (prompt_type, prompt_version)}, streamed, on_item
                 )
-                print("Successfully received response from GPT API")
-            except Exception as api_error:
-                print(f"\nError calling GPT API: {str(api_error)}")
-                print("API Error Type:", type(api_error).__name__)
-                raise
+            else:
+                raw_content, key, cache_status = await self._fetch_completion(prompt, deadline)
             
-            # Get the raw response content
-            raw_content = response.choices[0].message.content
             print("\nRaw GPT Response:")
             print("=" * 80)
             print(raw_content)
@@ -131,14 +456,11 @@ class MessageProcessor:
                 print("\nParsed JSON structure:")
                 print(json.dumps(result, indent=2, ensure_ascii=False))
                 
-                # Validate that the result has the expected structure
-                if not isinstance(result, dict):
-                    raise ValueError(f"Expected JSON object, got {type(result)}")
-                if "todos" not in result:
-                    print("\nResponse is missing 'todos' field. Available fields:", list(result.keys()))
-                    raise ValueError("Response missing 'todos' field")
-                if not isinstance(result["todos"], list):
-                    raise ValueError(f"Expected 'todos' to be a list, got {type(result['todos'])}")
+                # Validate that the result has the prompt's section, whether
+                # or not its items were already saved while streaming
+                reason = _invalid_result_reason(prompt_type, result)
+                if reason is not None:
+                    raise ValueError(f"Invalid result for '{prompt_type}': {reason}")
                 
             except json.JSONDecodeError as e:
                 print(f"\nError parsing JSON response: {str(e)}")
@@ -148,17 +470,31 @@ class MessageProcessor:
                 print("Response length:", len(raw_content))
                 raise ValueError(f"Invalid JSON response from GPT: {str(e)}")
             
-            # Save the processed data
-            saved_ids = await self.data_store.save(result, prompt_type)
+            # Only responses that parsed and validated are worth repeating
+            if cache_status == "miss":
+                await self._cache_put(key, raw_content)
+            
+            if streamed is not None:
+                # Saved as they streamed in; the result lists the saved copies
+                streamed.apply(prompt_type, result)
+                saved_ids = streamed.saved.get(prompt_type, {'items': []})
+            else:
+                # Save the processed data
+                saved_ids = await self.data_store.save(_saved_sections(prompt_type, result), prompt_type, prompt_version=prompt_version)
             
             # Add metadata to the result
             result['metadata'] = {
                 'processing_time': datetime.now().isoformat(),
                 'prompt_type': prompt_type,
+                'prompt_version': prompt_version,
                 'message_count': len(messages),
                 'context_items_count': len(active_items),
+                'token_budget': budget.report,
+                'cache': cache_status if self.response_cache is not None else "disabled",
                 'saved_ids': saved_ids
             }
+            if streamed is not None:
+                result['metadata']['streaming'] = streamed.report(prompt_type)
             
             return result
             
@@ -185,7 +521,7 @@ class MessageProcessor:
     ]
 }
                 ''')
-            return {
+            error_result = {
                 'error': error_msg,
                 'metadata': {
                     'processing_time': datetime.now().isoformat(),
@@ -193,33 +529,207 @@ class MessageProcessor:
                     'message_count': len(messages)
                 }
             }
+            if streamed is not None and prompt_type in streamed.saved:
+                # Items that streamed in before the failure are stored
+                error_result['metadata']['saved_ids'] = streamed.saved[prompt_type]
+            return error_result
+    
+    async def _fetch_completion(self, prompt: str, deadline: Optional[float] = None) -> Tuple[str, str, str]:
+        """
+        The model's response to a prompt, from the response cache if possible.
+        
+        API calls go through the shared ResilientCaller: transient failures
+        are retried until the deadline, and fail fast while the circuit is open.
+        Every request (retries and hedges included) first waits for the
+        process-wide rate limits.
+        
+        Returns:
+            (response text, cache key, "hit" or "miss")
+        """
+        # Identical requests are answered from the cache
+        key = self._completion_key(prompt)
+        raw_content = await self._cache_get(key)
+        if raw_content is not None:
+            self.logger.debug("Using cached GPT response")
+            return raw_content, key, "hit"
+        
+        self.logger.debug(
+            f"Sending request to {Config.MODEL} (temperature {Config.TEMPERATURE}, max tokens {Config.MAX_TOKENS})"
+        )
+        
+        estimated_tokens = self._estimate_request_tokens(prompt)
+        
+        async def request():
+            await get_rate_limiter().acquire(estimated_tokens)
+            return await get_async_client().chat.completions.create(
+                model=Config.MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=Config.TEMPERATURE,
+                max_tokens=Config.MAX_TOKENS,
+                response_format={"type": "json_object"}
+            )
+        
+        try:
+            # Call GPT API
+            response = await get_llm_caller().call(request, deadline)
+            self.logger.debug("Received response from GPT API")
+        except Exception as api_error:
+            self.logger.error(f"Error calling GPT API ({type(api_error).__name__}): {api_error}")
+            raise
+        return response.choices[0].message.content, key, "miss"
+    
+    async def _fetch_streamed(
+        self,
+        prompt: str,
+        deadline: Optional[float],
+        targets: Dict[Tuple[str, ...], Tuple[str, Optional[str]]],
+        streamed: StreamedItems,
+        on_item: Optional[ItemCallback] = None
+    ) -> Tuple[str, str, str]:
+        """
+        Stream the model's response, saving each item the moment it is complete.
+        
+        `targets` maps the path of a result section in the response (() for
+        a single prompt, (prompt_type,) in combined mode) to the prompt type
+        and version its items are saved as. Saved items are recorded in
+        `streamed` and passed to `on_item`. A cached response is replayed
+        through the same parser. Once part of a stream has been used, a
+        failure is not retried (its items are already stored).
+        
+        Returns:
+            (response text, cache key, "hit" or "miss")
+        """
+        key = self._completion_key(prompt)
+        started = time.monotonic()
+        parser = ItemStreamParser(RESULT_SECTIONS)
+        
+        async def consume(text: str):
+            for path, section, item in parser.feed(text):
+                target = targets.get(path)
+                if target is None:
+                    continue
+                prompt_type, prompt_version = target
+                if section not in _result_sections(prompt_type):
+                    continue  # Not part of this prompt's result, so never saved
+                reason = _invalid_item_reason(item)
+                if reason is not None:
+                    self.logger.warning(f"Skipping streamed {section} item for {prompt_type}: {reason}")
+                    streamed.skipped[prompt_type] = streamed.skipped.get(prompt_type, 0) + 1
+                    continue
+                saved = await self.data_store.save({section: [item]}, prompt_type, prompt_version=prompt_version)
+                streamed.first_item_after.setdefault(prompt_type, round(time.monotonic() - started, 3))
+                streamed.items.setdefault(prompt_type, {}).setdefault(section, []).append(item)
+                totals = streamed.saved.setdefault(prompt_type, {})
+                for name, ids in saved.items():
+                    totals[name] = totals.get(name, []) + [item_id for item_id in ids if item_id not in totals.get(name, [])]
+                if on_item is not None:
+                    on_item(prompt_type, {'prompt_type': prompt_type, 'section': section, 'item': item, 'saved': saved})
+        
+        raw_content = await self._cache_get(key)
+        if raw_content is not None:
+            self.logger.debug("Replaying cached response through the stream parser")
+            await consume(raw_content)
+            return raw_content, key, "hit"
+        
+        self.logger.debug(f"Streaming request to {Config.MODEL}")
+        
+        estimated_tokens = self._estimate_request_tokens(prompt)
+        
+        async def request() -> str:
+            await get_rate_limiter().acquire(estimated_tokens)
+            response = await get_async_client().chat.completions.create(
+                model=Config.MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=Config.TEMPERATURE,
+                max_tokens=Config.MAX_TOKENS,
+                response_format={"type": "json_object"},
+                stream=True
+            )
+            try:
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        await consume(chunk.choices[0].delta.content)
+            except Exception as e:
+                if parser.text:
+                    raise PartialResponseError(f"Response stream failed after {len(parser.text)} characters: {e}") from e
+                raise
+            finally:
+                await response.close()
+            return parser.text
+        
+        try:
+            # A consumed stream must not be duplicated by a hedged request
+            raw_content = await get_llm_caller().call(request, deadline, hedge=False)
+        except Exception as api_error:
+            self.logger.error(f"Error streaming from GPT API ({type(api_error).__name__}): {api_error}")
+            raise
+        return raw_content, key, "miss"
+    
+    def _completion_key(self, prompt: str) -> str:
+        return cache_key(Config.MODEL, Config.TEMPERATURE, SYSTEM_PROMPT, prompt, max_tokens=Config.MAX_TOKENS)
+    
+    def _estimate_request_tokens(self, prompt: str) -> int:
+        """Tokens a request counts against the TPM limit: its input plus the completion allowance."""
+        return self.budgeter.count(SYSTEM_PROMPT) + self.budgeter.count(prompt) + Config.MAX_TOKENS
+    
+    async def _cache_get(self, key: str) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_io_executor(), self.response_cache.get, key)
+        except Exception as e:
+            self.logger.error(f"Error reading response cache: {e}")
+            return None
+    
+    async def _cache_put(self, key: str, content: str):
+        if self.response_cache is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(get_io_executor(), self.response_cache.put, key, content)
+        except Exception as e:
+            self.logger.error(f"Error writing response cache: {e}")
+    
+    def _format_message(self, msg: Dict[str, Any]) -> str:
+        """Format one message for the prompt."""
+        timestamp = datetime.fromtimestamp(msg['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        return f"[{timestamp}] {msg['text']}"
     
     def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
         """Format messages for the prompt."""
-        formatted = []
-        for msg in messages:
-            timestamp = datetime.fromtimestamp(msg['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-            formatted.append(f"[{timestamp}] {msg['text']}")
+        return "\n".join(self._format_message(msg) for msg in messages)
+    
+    def _format_context_item(self, item: Dict[str, Any]) -> str:
+        """Format one active item (which has a title) for context in the prompt."""
+        formatted = [f"- {item['title']}"]
+        if "description" in item:
+            formatted.append(f"  Description: {item['description']}")
+        if "due_date" in item:
+            formatted.append(f"  Due: {item['due_date']}")
+        if "priority" in item:
+            formatted.append(f"  Priority: {item['priority']}")
+        formatted.append("")  # Add blank line between items
         return "\n".join(formatted)
     
+    def _join_context_items(self, formatted_items: List[str], has_items: bool) -> str:
+        """The context section from formatted items; has_items is False if there were none at all."""
+        if not has_items:
+            return "No active items found."
+        return "\n".join(["Active items for context:"] + formatted_items)
+    
     def _format_context_items(self, items: List[Dict[str, Any]]) -> str:
         """Format active items for context in the prompt."""
-        if not items:
-            return "No active items found."
-            
-        formatted = ["Active items for context:"]
-        for item in items:
-            if "title" in item:
-                formatted.append(f"- {item['title']}")
-                if "description" in item:
-                    formatted.append(f"  Description: {item['description']}")
-                if "due_date" in item:
-                    formatted.append(f"  Due: {item['due_date']}")
-                if "priority" in item:
-                    formatted.append(f"  Priority: {item['priority']}")
-                formatted.append("")  # Add blank line between items
-                
-        return "\n".join(formatted)
+        return self._join_context_items(
+            [self._format_context_item(item) for item in items if "title" in item],
+            bool(items)
+        )
     
     def _prepare_metadata(self) -> Dict[str, Any]:
         """Prepare metadata for the prompt."""
@@ -250,25 +760,52 @@ class MessageProcessor:
         self,
         message_batches: List[List[Dict[str, Any]]],
         metadata: Optional[Dict[str, Any]] = None,
-        prompt_type: str = 'general'
+        prompt_type: str = 'general',
+        max_in_flight: Optional[int] = None,
+        deadline: Optional[float] = None
     ) -> List[Dict[str, Any]]:
         """
-        Process multiple batches of messages.
+        Process multiple batches of messages concurrently.
+        
+        At most `max_in_flight` batches (default Config.BATCH_MAX_IN_FLIGHT)
+        are processed at a time; their LLM calls also wait for the
+        process-wide request and token rate limits, which every other caller
+        shares.
         
         Args:
             message_batches: List of message batches to process
             metadata: Optional metadata about the messages
             prompt_type: Type of processing to perform
+            max_in_flight: Batches processed at once
+            deadline: time.monotonic() value all batches must finish by
             
         Returns:
-            List of results for each batch
+            List of results for each batch, in input order, each with a
+            metadata 'batch' entry giving its index, the seconds it queued
+            for a slot and the seconds it took
         """
-        results = []
-        for batch in message_batches:
-            try:
-                batch_result = await self.process_messages(batch, prompt_type)
-                results.append(batch_result)
-            except Exception as e:
-                self.logger.error(f"Error processing batch: {e}")
-                results.append({"error": str(e)})
-        return results 
\ No newline at end of file
+        limit = max(max_in_flight or Config.BATCH_MAX_IN_FLIGHT, 1)
+        semaphore = asyncio.Semaphore(limit)
+        started = time.monotonic()
+        
+        async def run(index: int, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+            async with semaphore:
+                began = time.monotonic()
+                try:
+                    result = await self.process_messages(batch, prompt_type, deadline=deadline)
+                except Exception as e:
+                    self.logger.error(f"Error processing batch {index}: {e}")
+                    result = {"error": str(e), "metadata": {}}
+                result.setdefault("metadata", {})["batch"] = {
+                    "index": index,
+                    "queued": round(began - started, 3),
+                    "duration": round(time.monotonic() - began, 3)
+                }
+                return result
+        
+        results = await asyncio.gather(*(run(index, batch) for index, batch in enumerate(message_batches)))
+        self.logger.info(
+            f"Processed {len(message_batches)} batches in {time.monotonic() - started:.1f}s "
+            f"({limit} in flight, {sum(1 for result in results if 'error' in result)} failed)"
+        )
+        return list(results) 
\ No newline at end of file
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Import the existing data/tasks/*.json files into the SQLite storage backend.
+
+Usage:
+    python -m ai_processor.migrate_storage [--storage-dir data] [--db data/tasks.db]
+
+The JSON files are left in place; switch to the new store by setting
+STORAGE_BACKEND=sqlite once the import has finished.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from .storage import FileStorageBackend, SQLiteStorageBackend
+
+BATCH_SIZE = 500
+
+def migrate(storage_dir: Path, db_path: Path) -> int:
+    """Copy every item file into the SQLite database; returns the number of items imported."""
+    source = FileStorageBackend(storage_dir / "tasks")
+    target = SQLiteStorageBackend(db_path)
+    try:
+        return target.bulk_load(source.iter_items(), batch_size=BATCH_SIZE)
+    finally:
+        target.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Import task JSON files into the SQLite storage backend')
+    parser.add_argument('--storage-dir', default='data', help='Data directory containing the tasks folder')
+    parser.add_argument('--db', help='SQLite database path (default: <storage-dir>/tasks.db)')
+    args = parser.parse_args(argv)
+
+    storage_dir = Path(args.storage_dir)
+    db_path = Path(args.db) if args.db else storage_dir / "tasks.db"
+    if not (storage_dir / "tasks").exists():
+        print(f"Error: no tasks folder found in {storage_dir}")
+        return 1
+
+    count = migrate(storage_dir, db_path)
+    print(f"Imported {count} items from {storage_dir / 'tasks'} into {db_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
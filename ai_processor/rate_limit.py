@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at `per_minute` tokens a minute,
+    holding at most `capacity` (one minute's worth by default).
+
+    The bucket is guarded by a thread lock rather than an asyncio primitive,
+    so callers on any thread or event loop draw from the same budget.
+    Requests larger than the capacity wait for a full bucket and then
+    overdraw it, so they are delayed rather than refused.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Take `amount` tokens if available and return 0, else the seconds to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            needed = min(amount, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Wait until `amount` tokens are taken; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(amount)
+            if delay <= 0:
+                if waited:
+                    with self._lock:
+                        self.waited += waited
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+class RateLimiter:
+    """
+    Request-per-minute and token-per-minute limits for LLM calls.
+
+    A limit of 0 disables that bucket. Token counts are estimates made
+    before the call (prompt tokens plus the completion allowance), which is
+    how the provider counts requests against its own limit.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.acquired = 0
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait for one request and `tokens` tokens of budget; returns the seconds waited."""
+        waited = 0.0
+        if self.requests is not None:
+            waited += await self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += await self.tokens.acquire(tokens)
+        self.acquired += 1
+        if waited >= 1:
+            logger.info(f"LLM call waited {waited:.1f}s for rate limits")
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        def bucket(b: Optional[TokenBucket]) -> Optional[Dict[str, Any]]:
+            if b is None:
+                return None
+            with b._lock:
+                b._refill(time.monotonic())
+                return {"per_minute": b.rate * 60, "available": round(b.tokens, 1), "waited": round(b.waited, 3)}
+        return {"calls": self.acquired, "requests": bucket(self.requests), "tokens": bucket(self.tokens)}
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide RateLimiter, shared by every processor and caller."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(Config.LLM_RPM_LIMIT, Config.LLM_TPM_LIMIT)
+        return _limiter
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import openai
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class DeadlineExceeded(TimeoutError):
+    """The deadline of an LLM call passed before it produced a response."""
+
+class CircuitOpenError(RuntimeError):
+    """The provider has been failing; calls fail fast until the breaker resets."""
+
+class PartialResponseError(RuntimeError):
+    """A streamed response failed after part of it was used, so it is not retried."""
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """A deadline `seconds` from now on the time.monotonic() clock, or None for no deadline."""
+    if seconds is None:
+        return None
+    return time.monotonic() + seconds
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a deadline (never negative), or None if there is none."""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures: timeouts, lost connections, rate limits and server errors."""
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """The delay a rate-limited response asked for, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the provider is degraded.
+
+    After `failure_threshold` consecutive transient failures the breaker
+    opens and rejects calls for `reset_timeout` seconds. It then lets a
+    single probe through (half-open): success closes it, failure opens it
+    for another period.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if now - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the provider now."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            retry_in = max(self.reset_timeout - (now - self.opened_at), 0.0)
+            raise CircuitOpenError(f"LLM provider circuit is open; retrying in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """End a half-open probe that neither succeeded nor failed (e.g. it was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls, for hedging thresholds."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float, min_samples: int = 1) -> Optional[float]:
+        """The p-th percentile latency, or None with fewer than `min_samples` samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * p / 100), len(samples) - 1)
+        return samples[index]
+
+class ResilientCaller:
+    """
+    Runs LLM requests under a deadline with retries, hedging and a circuit breaker.
+
+    Transient failures are retried up to `max_retries` times with full-jitter
+    exponential backoff (a random delay up to retry_delay * 2**attempt, capped
+    at max_retry_delay), never sleeping past the deadline. With hedging on,
+    a second identical request is sent once the first has taken longer than
+    `hedge_delay` seconds or, if that is 0, the `hedge_percentile` latency of
+    recent calls; whichever answers first wins and the other is cancelled.
+    The percentile must sit below the share of slow calls: with the stalls
+    themselves in the latency history, a p95 threshold against 5% stalled
+    calls lands inside the stall and the hedge comes too late to help.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 60.0,
+        hedge: bool = False,
+        hedge_percentile: float = 90.0,
+        hedge_min_samples: int = 20,
+        hedge_delay: float = 0.0,
+        breaker: Optional[CircuitBreaker] = None,
+        latencies: Optional[LatencyTracker] = None
+    ):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = latencies or LatencyTracker()
+        self.counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0, "failures": 0}
+
+    def hedge_threshold(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while there is too little latency history."""
+        if self.hedge_delay > 0:
+            return self.hedge_delay
+        return self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_retry_delay, self.retry_delay * (2 ** attempt)))
+
+    async def call(
+        self,
+        request: Callable[[], Awaitable[T]],
+        deadline: Optional[float] = None,
+        hedge: Optional[bool] = None
+    ) -> T:
+        """
+        The result of `request()`, a coroutine factory called once per attempt.
+        
+        `hedge` overrides the caller's hedging setting for this call (requests
+        with side effects, such as consumed streams, must not be hedged).
+
+        Raises DeadlineExceeded when the deadline passes, CircuitOpenError
+        while the breaker is open, or the last error once retries run out
+        (errors that are not transient are raised at once).
+        """
+        self.counters["calls"] += 1
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            left = remaining(deadline)
+            if left is not None and left <= 0:
+                self.breaker.release_probe()
+                self.counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded("LLM call deadline passed before the request was sent")
+            try:
+                result = await asyncio.wait_for(self._attempt(request, self.hedge if hedge is None else hedge), left)
+            except asyncio.TimeoutError as e:
+                if left is None:
+                    error = e  # The client's own timeout
+                else:
+                    self.breaker.record_failure()
+                    self.counters["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"No LLM response within the {left:.0f}s left before the deadline") from e
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+
+            if isinstance(error, PartialResponseError):
+                self.breaker.record_failure()
+                self.counters["failures"] += 1
+                raise error
+            if not is_retryable(error):
+                self.breaker.release_probe()
+                raise error
+            self.breaker.record_failure()
+            if attempt >= self.max_retries:
+                self.counters["failures"] += 1
+                raise error
+            delay = _retry_after(error) or self.backoff(attempt)
+            left = remaining(deadline)
+            if left is not None and delay >= left:
+                self.counters["failures"] += 1
+                raise error
+            attempt += 1
+            self.counters["retries"] += 1
+            logger.warning(f"LLM call failed ({type(error).__name__}: {error}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, request: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        started = time.monotonic()
+        threshold = self.hedge_threshold() if hedge else None
+        primary = asyncio.ensure_future(request())
+        tasks = [primary]
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                if not done:
+                    self.counters["hedges"] += 1
+                    logger.info(f"LLM call slower than {threshold:.2f}s; sending hedged request")
+                    tasks.append(asyncio.ensure_future(request()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        self.latencies.record(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            circuit=self.breaker.state,
+            consecutive_failures=self.breaker.failures,
+            rejected=self.breaker.rejected,
+            latency_samples=len(self.latencies),
+            p50=self.latencies.percentile(50),
+            p95=self.latencies.percentile(95),
+            hedging=self.hedge,
+            hedge_threshold=self.hedge_threshold() if self.hedge else None
+        )
+
+_caller: Optional[ResilientCaller] = None
+_caller_lock = threading.Lock()
+
+def get_llm_caller() -> ResilientCaller:
+    """The process-wide ResilientCaller, so every processor shares one breaker and latency history."""
+    global _caller
+    with _caller_lock:
+        if _caller is None:
+            _caller = ResilientCaller(
+                max_retries=Config.MAX_RETRIES,
+                retry_delay=Config.RETRY_DELAY,
+                max_retry_delay=Config.MAX_RETRY_DELAY,
+                hedge=Config.LLM_HEDGE_ENABLED,
+                hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
+                hedge_min_samples=Config.LLM_HEDGE_MIN_SAMPLES,
+                hedge_delay=Config.LLM_HEDGE_DELAY,
+                breaker=CircuitBreaker(Config.LLM_BREAKER_THRESHOLD, Config.LLM_BREAKER_RESET)
+            )
+        return _caller
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def cache_key(model: str, temperature: float, system_prompt: str, prompt: str, **params: Any) -> str:
+    """Content address of a completion request; any change to its inputs changes the key."""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "system": system_prompt, "prompt": prompt, "params": params},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent cache of LLM completions in a SQLite file.
+
+    Entries expire `ttl` seconds after they were stored; when the stored
+    responses exceed `max_bytes`, the least recently used are evicted.
+    Hit, miss and eviction counters cover the life of the process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """
+    INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)",
+        "CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at)",
+    )
+
+    def __init__(self, db_path: Path, max_bytes: int, ttl: float):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(self.SCHEMA)
+        for statement in self.INDEXES:
+            self._conn.execute(statement)
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached response for a key, or None if absent or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str):
+        """Store a response, then drop expired entries and evict down to the size cap."""
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        evicted = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            evicted += len(doomed)
+        self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_caches: Dict[Path, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_response_cache(db_path: Path, max_bytes: int, ttl: float) -> ResponseCache:
+    """The shared ResponseCache of a cache file, so every processor counts into one set of stats."""
+    key = Path(db_path).resolve()
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResponseCache(db_path, max_bytes, ttl)
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,279 @@
+import heapq
+import math
+import re
+import threading
+import weakref
+from collections import Counter
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+from .item_index import get_item_index
+from .storage import StorageBackend, StoredItem
+
+# Fields searched, with the number of times their terms are counted
+SEARCH_FIELDS = (("title", 2), ("description", 1), ("source_message", 1))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Weight of a match found only after stripping prefix letters
+PREFIX_MATCH_WEIGHT = 0.6
+
+# Cached per-term scores are recomputed once the average item length drifts
+# by more than this fraction from the one they were computed with
+AVERAGE_LENGTH_TOLERANCE = 0.1
+
+# Niqqud and cantillation marks, plus the geresh/gershayim and quote marks
+# used inside Hebrew abbreviations (e.g. בי"ס); all are dropped
+_DROP_MARKS = re.compile("[\u0591-\u05BD\u05BF-\u05C7\u05F3\u05F4\"'`\u2019\u201D]")
+_FINAL_LETTERS = (("ך", "כ"), ("ם", "מ"), ("ן", "נ"), ("ף", "פ"), ("ץ", "צ"))
+_TOKEN = re.compile(r"\w+")
+_HEBREW_LETTER = re.compile("[\u05D0-\u05EA]")
+
+# One-letter prefixes (and, the, in, to, like, from, that) written attached to
+# Hebrew words; up to two are stripped, keeping at least three letters
+HEBREW_PREFIXES = "והבלכמש"
+MIN_STEM_LENGTH = 3
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop niqqud and abbreviation marks, and replace final letters."""
+    text = _DROP_MARKS.sub("", text)
+    # Chained replace is several times faster than str.translate here
+    for final, regular in _FINAL_LETTERS:
+        text = text.replace(final, regular)
+    return text.lower()
+
+def tokenize(text: str) -> List[str]:
+    """Normalised word tokens of a text."""
+    if not text:
+        return []
+    # Maqaf (Hebrew hyphen) separates words like a space does
+    return _TOKEN.findall(normalize_text(str(text).replace("\u05BE", " ")))
+
+@lru_cache(maxsize=65536)
+def term_variants(token: str) -> Tuple[str, ...]:
+    """The token followed by the forms left after stripping its Hebrew prefixes."""
+    variants = [token]
+    if _HEBREW_LETTER.match(token):
+        stem = token
+        for _ in range(2):
+            if len(stem) - 1 < MIN_STEM_LENGTH or stem[0] not in HEBREW_PREFIXES:
+                break
+            stem = stem[1:]
+            variants.append(stem)
+    return tuple(variants)
+
+def item_terms(item: Dict[str, Any]) -> Dict[str, int]:
+    """Term frequencies of an item, including prefix-stripped forms."""
+    occurrences = []
+    for field_name, weight in SEARCH_FIELDS:
+        field_terms = [term for token in tokenize(item.get(field_name) or "") for term in term_variants(token)]
+        occurrences.extend(field_terms * weight)
+    return Counter(occurrences)
+
+class SearchIndex:
+    """
+    Inverted index with BM25 ranking over the items of a storage backend.
+
+    Built once from the backend, then kept current from its change
+    notifications, so writes from DataStore, TasksManager and (for the file
+    backend) the watcher are searchable immediately.
+    """
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self._lock = threading.RLock()
+        self._built = False
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # term -> {item id: BM25 term-frequency component}, filled on demand
+        self._impacts: Dict[str, Tuple[Dict[str, float], float]] = {}
+        self._impacts_average = 0.0
+        storage.add_listener(self._on_storage_change)
+        storage.start_watching()
+
+    def _on_storage_change(self, event: str, item_id: str, stored: Optional[StoredItem]):
+        with self._lock:
+            if not self._built:
+                return  # Will see the change when first built
+            if event == "put":
+                self._add(stored.item)
+            elif event == "delete":
+                self._remove(item_id)
+            elif event == "reload":
+                self._built = False
+
+    def _ensure_built(self):
+        self.storage.check_external_changes()
+        with self._lock:
+            if self._built:
+                return
+            self._items = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._postings = {}
+            self._total_length = 0
+            self._impacts = {}
+            # Shares the item index's scan and item dicts
+            for stored in get_item_index(self.storage).stored_items():
+                self._add(stored.item)
+            self._built = True
+
+    def build_in_background(self):
+        """Build the index on a daemon thread so the first search does not wait for it."""
+        thread = threading.Thread(target=self._ensure_built, name="search-index-build", daemon=True)
+        thread.start()
+
+    def _add(self, item: Dict[str, Any]):
+        item_id = item.get("id")
+        if not item_id:
+            return
+        self._remove(item_id)
+        terms = item_terms(item)
+        postings = self._postings
+        impacts = self._impacts
+        for term, frequency in terms.items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                postings[term] = {item_id: frequency}
+            else:
+                term_postings[item_id] = frequency
+            if impacts:
+                impacts.pop(term, None)
+        length = sum(terms.values())
+        self._items[item_id] = item
+        self._doc_terms[item_id] = terms
+        self._doc_lengths[item_id] = length
+        self._total_length += length
+
+    def _remove(self, item_id: str):
+        terms = self._doc_terms.pop(item_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            self._impacts.pop(term, None)
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(item_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(item_id, 0)
+        self._items.pop(item_id, None)
+
+    def _term_impacts(self, term: str, postings: Dict[str, int]) -> Tuple[Dict[str, float], float]:
+        """
+        The length-normalised term frequency part of BM25 for every item
+        containing a term, and its maximum.
+        """
+        cached = self._impacts.get(term)
+        if cached is None:
+            scale = BM25_K1 * BM25_B / self._impacts_average
+            base = BM25_K1 * (1 - BM25_B)
+            lengths = self._doc_lengths
+            impacts = {
+                item_id: frequency * (BM25_K1 + 1) / (frequency + base + scale * lengths[item_id])
+                for item_id, frequency in postings.items()
+            }
+            cached = (impacts, max(impacts.values()))
+            self._impacts[term] = cached
+        return cached
+
+    def search(
+        self,
+        query: str,
+        item_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Items matching any query word, best BM25 score first.
+
+        A query word also matches words carrying extra Hebrew prefixes, and
+        the prefix-stripped query word at a lower weight. Returns
+        (score, item) pairs.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_built()
+        with self._lock:
+            count = len(self._items)
+            if count == 0:
+                return []
+            average_length = self._total_length / count
+            if abs(average_length - self._impacts_average) > AVERAGE_LENGTH_TOLERANCE * self._impacts_average:
+                self._impacts = {}
+                self._impacts_average = average_length
+
+            # (upper bound of the term's score, idf * weight, impacts) per query term
+            query_terms = []
+            for token in dict.fromkeys(tokens):
+                for position, term in enumerate(term_variants(token)):
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    weight = 1.0 if position == 0 else PREFIX_MATCH_WEIGHT
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    impacts, max_impact = self._term_impacts(term, postings)
+                    query_terms.append((weight * idf * max_impact, weight * idf, impacts))
+            if not query_terms:
+                return []
+
+            if item_type or status:
+                accept = lambda item_id: (
+                    (not item_type or self._items[item_id].get("type") == item_type)
+                    and (not status or self._items[item_id].get("status") == status)
+                )
+            else:
+                accept = None
+
+            best = self._top_scores(query_terms, limit, accept)
+            return [(score, self._items[item_id]) for item_id, score in best]
+
+    @staticmethod
+    def _top_scores(query_terms, limit: int, accept=None) -> List[Tuple[str, float]]:
+        """
+        Top `limit` (item id, score) pairs for the summed term scores.
+
+        Terms are scored in decreasing order of their best possible score
+        (MaxScore): once the remaining terms together cannot lift an unseen
+        item above the current limit-th score, they only add to the items
+        already found instead of walking their whole posting lists.
+        """
+        by_score = itemgetter(1)
+        if len(query_terms) == 1 and accept is None:
+            _, factor, impacts = query_terms[0]
+            return [(item_id, factor * impact) for item_id, impact in heapq.nlargest(limit, impacts.items(), key=by_score)]
+
+        query_terms.sort(key=itemgetter(0), reverse=True)
+        remaining_bound = sum(bound for bound, _, _ in query_terms)
+        scores: Dict[str, float] = {}
+        for bound, factor, impacts in query_terms:
+            if len(scores) >= limit and heapq.nlargest(limit, scores.values())[-1] > remaining_bound:
+                for item_id in scores:
+                    impact = impacts.get(item_id)
+                    if impact is not None:
+                        scores[item_id] += factor * impact
+            else:
+                get = scores.get
+                for item_id, impact in impacts.items():
+                    if accept is None or item_id in scores or accept(item_id):
+                        scores[item_id] = get(item_id, 0.0) + factor * impact
+            remaining_bound -= bound
+        return heapq.nlargest(limit, scores.items(), key=by_score)
+
+_shared_indexes: "weakref.WeakKeyDictionary[StorageBackend, SearchIndex]" = weakref.WeakKeyDictionary()
+_shared_lock = threading.Lock()
+
+def get_search_index(storage: StorageBackend) -> SearchIndex:
+    """The shared SearchIndex of a storage backend, created on first use."""
+    with _shared_lock:
+        index = _shared_indexes.get(storage)
+        if index is None:
+            index = SearchIndex(storage)
+            _shared_indexes[storage] = index
+        return index
@@ -0,0 +1,902 @@
+import bisect
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from watchdog.events import (
+    FileClosedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent,
+    FileMovedEvent, FileSystemEventHandler
+)
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+# Item field holding the change sequence number of its latest write
+CHANGE_SEQ_FIELD = "change_seq"
+
+# Ids become file names, so only word characters and dashes are accepted
+ITEM_ID_PATTERN = re.compile(r"[\w-]+")
+
+def is_valid_item_id(item_id: Any) -> bool:
+    """Whether an id from outside (a request, an import) is safe to store or look up."""
+    return isinstance(item_id, str) and ITEM_ID_PATTERN.fullmatch(item_id) is not None
+
+@dataclass
+class StoredItem:
+    """An item as held by a storage backend."""
+    item: Dict[str, Any]
+    mtime: float
+    path: Optional[Path] = None
+    seq: int = 0
+
+@dataclass
+class Tombstone:
+    """Record of a deleted item, kept so change feeds can report the deletion."""
+    seq: int
+    id: str
+    type: Optional[str]
+    deleted_at: float
+
+def _item_seq(item: Dict[str, Any]) -> int:
+    try:
+        return int(item.get(CHANGE_SEQ_FIELD) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+# Listener signature: (event, item_id, stored_item). event is "put", "delete"
+# or "reload" (the store changed in ways we cannot describe item by item, so
+# in-memory views must be rebuilt); stored_item is only set for puts.
+StorageListener = Callable[[str, str, Optional[StoredItem]], None]
+
+class StorageBackend:
+    """
+    Base class for task storage engines.
+
+    Backends persist the unified item dictionaries produced by DataStore and
+    edited by TasksManager. Every write is reported to registered listeners so
+    in-memory views in the same process stay current without rescanning.
+
+    Every create, update and delete is also assigned the next number of a
+    monotonically increasing change sequence. Items carry it in their
+    "change_seq" field and deletes leave a Tombstone, so clients can ask for
+    everything that changed after a sequence number they have seen.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._listeners: List[StorageListener] = []
+        self._listeners_lock = threading.Lock()
+        # Set while a thread runs bulk_load, whose writes are reported as one reload
+        self._quiet = threading.local()
+
+    # Listeners
+
+    def add_listener(self, listener: StorageListener):
+        with self._listeners_lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: StorageListener):
+        with self._listeners_lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, event: str, item_id: str, stored: Optional[StoredItem] = None):
+        if getattr(self._quiet, "active", False):
+            return
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event, item_id, stored)
+            except Exception as e:
+                logger.error(f"Storage listener failed for {event} {item_id}: {e}")
+
+    # Engine interface
+
+    @property
+    def watch_dir(self) -> Optional[Path]:
+        """Directory holding one file per item, if the backend has one."""
+        return None
+
+    def load(self, item_id: str) -> Optional[StoredItem]:
+        raise NotImplementedError
+
+    def load_many(self, item_ids: Iterable[str]) -> Dict[str, StoredItem]:
+        """The stored items among `item_ids`, keyed by id; missing ids are left out."""
+        found = {}
+        for item_id in item_ids:
+            stored = self.load(item_id)
+            if stored is not None:
+                found[item_id] = stored
+        return found
+
+    def load_path(self, path: Path) -> Optional[StoredItem]:
+        raise NotImplementedError(f"{self.name} storage has no item files")
+
+    def scan(self) -> Iterator[StoredItem]:
+        raise NotImplementedError
+
+    def put(self, item: Dict[str, Any], path: Optional[Path] = None) -> StoredItem:
+        raise NotImplementedError
+
+    def put_many(self, items: Iterable[Dict[str, Any]], paths: Optional[List[Optional[Path]]] = None) -> List[StoredItem]:
+        """Store several items as one batch; `paths` optionally gives each item's current location."""
+        items = list(items)
+        paths = paths or [None] * len(items)
+        return [self.put(item, path) for item, path in zip(items, paths)]
+
+    def delete(self, item_id: str, path: Optional[Path] = None) -> bool:
+        raise NotImplementedError
+
+    def delete_many(
+        self,
+        targets: Iterable[Tuple[str, Optional[Path]]],
+        expected_seqs: Optional[Dict[str, int]] = None
+    ) -> List[str]:
+        """
+        Delete several (item id, path) targets as one batch; returns the ids deleted.
+
+        With `expected_seqs`, an item listed there is only deleted while its
+        change sequence still has that value, so a write made since it was
+        read keeps it.
+        """
+        deleted = []
+        for item_id, path in targets:
+            if expected_seqs is not None and item_id in expected_seqs:
+                stored = self.load(item_id)
+                if stored is None or stored.seq != expected_seqs[item_id]:
+                    continue
+            if self.delete(item_id, path):
+                deleted.append(item_id)
+        return deleted
+
+    def current_seq(self) -> int:
+        """The sequence number of the latest change."""
+        raise NotImplementedError
+
+    def tombstones_since(self, seq: int) -> List[Tombstone]:
+        """Deletions with a sequence number greater than `seq`, oldest first."""
+        raise NotImplementedError
+
+    def check_external_changes(self) -> bool:
+        """Notify listeners with "reload" if another process changed the store."""
+        return False
+
+    def start_watching(self):
+        """Start reporting changes made outside this process, where supported."""
+        pass
+
+    def stop_watching(self):
+        pass
+
+    def close(self):
+        self.stop_watching()
+
+    # Convenience
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        stored = self.load(item_id)
+        return stored.item if stored else None
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        for stored in self.scan():
+            yield stored.item
+
+    def bulk_load(self, items: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        Store a large number of items in batches of `batch_size`.
+
+        Listeners are not told about each item; they get a single "reload"
+        once everything is written. Returns the number of items stored.
+        """
+        count = 0
+        batch = []
+        self._quiet.active = True
+        try:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self.put_many(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.put_many(batch)
+                count += len(batch)
+        finally:
+            self._quiet.active = False
+            if count:
+                self._notify("reload", "")
+        return count
+
+class FileStorageBackend(StorageBackend):
+    """
+    One pretty-printed JSON file per item under data/tasks (the original layout).
+
+    Writes are batched and crash safe: a batch is first appended to a journal
+    that is fsynced once, then every item file is written to a temporary file
+    and renamed over its target, so a reader never sees a truncated file.
+    Batches the journal holds that did not reach their files before a crash
+    are replayed on startup. The journal is cleared after flushing the
+    filesystem once it grows past JOURNAL_CHECKPOINT_BYTES.
+    """
+
+    name = "file"
+
+    # Watcher events are collected for this long before being applied, so a
+    # burst of writes to the same file costs a single parse.
+    EVENT_COALESCE_DELAY = 0.2
+
+    JOURNAL_CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, tasks_dir: Path):
+        super().__init__()
+        self.tasks_dir = Path(tasks_dir)
+        self.tasks_dir.mkdir(parents=True, exist_ok=True)
+        self._resolved_dir = self.tasks_dir.resolve()
+        # path -> (item id, mtime) of every file we have read or written, used
+        # to skip watcher events for our own writes and to name deleted items
+        self._known: Dict[Path, Tuple[str, float]] = {}
+        self._known_lock = threading.Lock()
+        self._observer = None
+        self._pending_paths: Set[Path] = set()
+        self._pending_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # Change sequence; the current value is found on the first full scan
+        self._seq: Optional[int] = None
+        self._seq_lock = threading.RLock()
+        # Deletions are appended here; the name does not match the *.json item glob
+        self.tombstones_path = self.tasks_dir / "_tombstones.ndjson"
+        self._tombstones: Optional[List[Tombstone]] = None
+        # Highest sequence number handed out to an edit made outside the app,
+        # which is not written into the item file itself; not matched by the
+        # *.json item glob
+        self.seq_mark_path = self.tasks_dir / "_seq_mark.txt"
+        # Write-ahead journal of put batches; not matched by the *.json item glob
+        self.journal_path = self.tasks_dir / "_journal.ndjson"
+        self._write_lock = threading.Lock()
+        self._recover()
+
+    def _remember(self, stored: StoredItem):
+        with self._known_lock:
+            self._known[stored.path] = (stored.item.get('id'), stored.mtime)
+
+    def _forget(self, path: Path) -> Optional[str]:
+        with self._known_lock:
+            known = self._known.pop(path, None)
+        return known[0] if known else None
+
+    def _load_tombstones(self) -> List[Tombstone]:
+        with self._seq_lock:
+            if self._tombstones is None:
+                tombstones = []
+                if self.tombstones_path.exists():
+                    with open(self.tombstones_path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                tombstones.append(Tombstone(**json.loads(line)))
+                            except (ValueError, TypeError):
+                                continue  # Torn last line after a crash
+                tombstones.sort(key=lambda tombstone: tombstone.seq)
+                self._tombstones = tombstones
+            return self._tombstones
+
+    def _next_seq(self) -> int:
+        with self._seq_lock:
+            if self._seq is None:
+                for _ in self.scan():
+                    pass
+            self._seq += 1
+            return self._seq
+
+    def _add_tombstone(self, item_id: str, item_type: Optional[str]):
+        self._add_tombstones([(item_id, item_type)])
+
+    def _add_tombstones(self, deleted: List[Tuple[str, Optional[str]]]):
+        with self._seq_lock:
+            tombstones = self._load_tombstones()
+            deleted_at = time.time()
+            new_tombstones = [
+                Tombstone(seq=self._next_seq(), id=item_id, type=item_type, deleted_at=deleted_at)
+                for item_id, item_type in deleted
+            ]
+            # Synced like a journaled put batch: until the next checkpoint,
+            # replay would otherwise bring a deleted item back after a crash
+            with open(self.tombstones_path, 'a', encoding='utf-8') as f:
+                f.write("".join(
+                    json.dumps(tombstone.__dict__, ensure_ascii=False) + "\n" for tombstone in new_tombstones
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            tombstones.extend(new_tombstones)
+
+    def _load_seq_mark(self) -> int:
+        try:
+            return int(self.seq_mark_path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return 0
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable sequence mark {self.seq_mark_path}: {e}")
+            return 0
+
+    def _save_seq_mark(self, seq: int):
+        tmp_path = self.seq_mark_path.with_name(self.seq_mark_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.seq_mark_path)
+
+    def current_seq(self) -> int:
+        with self._seq_lock:
+            if self._seq is None:
+                for _ in self.scan():
+                    pass
+            return self._seq
+
+    def tombstones_since(self, seq: int) -> List[Tombstone]:
+        with self._seq_lock:
+            tombstones = self._load_tombstones()
+            start = bisect.bisect_right([tombstone.seq for tombstone in tombstones], seq)
+            return tombstones[start:]
+
+    @property
+    def watch_dir(self) -> Optional[Path]:
+        return self.tasks_dir
+
+    def path_for(self, item_id: str) -> Path:
+        """The file of an item; raises ValueError for ids that would escape tasks_dir."""
+        path = self.tasks_dir / f"{item_id}.json"
+        if path.parent.resolve() != self._resolved_dir:
+            raise ValueError(f"Invalid item id: {item_id!r}")
+        return path
+
+    def load(self, item_id: str) -> Optional[StoredItem]:
+        return self.load_path(self.path_for(item_id))
+
+    def load_path(self, path: Path) -> Optional[StoredItem]:
+        try:
+            mtime = path.stat().st_mtime
+            with open(path, 'r', encoding='utf-8') as f:
+                item = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading item file {path}: {e}")
+            return None
+        if not isinstance(item, dict):
+            return None
+        stored = StoredItem(item=item, mtime=mtime, path=path, seq=_item_seq(item))
+        if item.get('id'):
+            self._remember(stored)
+        return stored
+
+    def scan(self) -> Iterator[StoredItem]:
+        max_seq = 0
+        if self.tasks_dir.exists():
+            for path in self.tasks_dir.glob("*.json"):
+                stored = self.load_path(path)
+                if stored is not None and stored.item.get('id'):
+                    max_seq = max(max_seq, stored.seq)
+                    yield stored
+        # A completed scan has seen every persisted sequence number
+        with self._seq_lock:
+            tombstones = self._load_tombstones()
+            if tombstones:
+                max_seq = max(max_seq, tombstones[-1].seq)
+            max_seq = max(max_seq, self._load_seq_mark())
+            if self._seq is None or self._seq < max_seq:
+                self._seq = max_seq
+
+    def put(self, item: Dict[str, Any], path: Optional[Path] = None) -> StoredItem:
+        return self._write_batch([(item, path or self.path_for(item['id']))])[0]
+
+    def put_many(self, items: Iterable[Dict[str, Any]], paths: Optional[List[Optional[Path]]] = None) -> List[StoredItem]:
+        items = list(items)
+        paths = paths or [None] * len(items)
+        entries = [(item, path or self.path_for(item['id'])) for item, path in zip(items, paths)]
+        if not entries:
+            return []
+        return self._write_batch(entries)
+
+    # Crash-safe batch writes
+
+    @staticmethod
+    def _write_file(path: Path, item: Dict[str, Any]):
+        """Replace an item file atomically through a temporary file beside it"""
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(item, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _write_batch(self, entries: List[Tuple[Dict[str, Any], Path]]) -> List[StoredItem]:
+        with self._write_lock:
+            for item, _ in entries:
+                item[CHANGE_SEQ_FIELD] = self._next_seq()
+            # The journal is the only file synced to disk; the item files can
+            # be rebuilt from it until the next checkpoint
+            with open(self.journal_path, 'a', encoding='utf-8') as journal:
+                for item, path in entries:
+                    journal.write(json.dumps({"path": path.name, "item": item}, ensure_ascii=False) + "\n")
+                journal.write(json.dumps({"commit": len(entries)}) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+                journal_size = journal.tell()
+
+            stored_items = []
+            for item, path in entries:
+                self._write_file(path, item)
+                stored = StoredItem(item=item, mtime=path.stat().st_mtime, path=path, seq=item[CHANGE_SEQ_FIELD])
+                self._remember(stored)
+                stored_items.append(stored)
+
+            if journal_size >= self.JOURNAL_CHECKPOINT_BYTES:
+                self._checkpoint()
+
+        for stored in stored_items:
+            self._notify("put", stored.item['id'], stored)
+        return stored_items
+
+    def _checkpoint(self):
+        """Flush written item files to disk, then drop the journal that covered them"""
+        if hasattr(os, 'sync'):
+            os.sync()
+        else:
+            for path in self.tasks_dir.glob("*.json"):
+                with open(path, 'rb') as f:
+                    os.fsync(f.fileno())
+        try:
+            self.journal_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _recover(self):
+        """Finish batches interrupted by a crash and remove leftover temporary files"""
+        for tmp_path in self.tasks_dir.glob(".*.json.tmp"):
+            tmp_path.unlink()
+        if not self.journal_path.exists():
+            return
+
+        batches = []
+        batch = []
+        with open(self.journal_path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn write: the batch never committed
+                if "commit" in record:
+                    batches.append(batch)
+                    batch = []
+                else:
+                    batch.append(record)
+
+        deleted = {}
+        for tombstone in self._load_tombstones():
+            deleted[tombstone.id] = max(deleted.get(tombstone.id, 0), tombstone.seq)
+        replayed = 0
+        for batch in batches:
+            for record in batch:
+                item = record["item"]
+                seq = _item_seq(item)
+                if deleted.get(item.get('id'), 0) > seq:
+                    continue
+                path = self.tasks_dir / record["path"]
+                current = self.load_path(path)
+                if current is not None and current.seq >= seq:
+                    continue
+                self._write_file(path, item)
+                replayed += 1
+        if replayed:
+            logger.warning(f"Replayed {replayed} interrupted item writes from {self.journal_path}")
+        self._checkpoint()
+
+    def delete(self, item_id: str, path: Optional[Path] = None) -> bool:
+        return bool(self.delete_many([(item_id, path)]))
+
+    def delete_many(
+        self,
+        targets: Iterable[Tuple[str, Optional[Path]]],
+        expected_seqs: Optional[Dict[str, int]] = None
+    ) -> List[str]:
+        deleted = []
+        # Under the write lock, so no put lands between the check and the unlink
+        with self._write_lock:
+            for item_id, path in targets:
+                path = path or self.path_for(item_id)
+                stored = self.load_path(path)
+                if expected_seqs is not None and item_id in expected_seqs:
+                    if stored is None or stored.seq != expected_seqs[item_id]:
+                        continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                self._forget(path)
+                deleted.append((item_id, stored.item.get('type') if stored else None))
+            if not deleted:
+                return []
+            # One append to the tombstone log for the whole batch
+            self._add_tombstones(deleted)
+        for item_id, _ in deleted:
+            self._notify("delete", item_id)
+        return [item_id for item_id, _ in deleted]
+
+    # Watching for changes made outside this process
+
+    def start_watching(self):
+        with self._pending_lock:
+            if self._observer is None:
+                self._start_observer()
+
+    def _start_observer(self):
+        class ItemFileEventHandler(FileSystemEventHandler):
+            def __init__(self, backend):
+                self.backend = backend
+
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type in ('opened', 'closed_no_write'):
+                    return
+                paths = [event.src_path]
+                if event.event_type == 'moved':
+                    paths.append(event.dest_path)
+                self.backend._queue_paths(
+                    Path(path) for path in paths if path.endswith('.json')
+                )
+
+        self._observer = Observer()
+        handler = ItemFileEventHandler(self)
+        try:
+            # Reading item files must not wake the watcher, so only subscribe to
+            # write events where watchdog supports filtering (4.0+)
+            self._observer.schedule(
+                handler,
+                str(self.tasks_dir),
+                recursive=False,  # Only watch the tasks directory, not subdirectories
+                event_filter=[
+                    FileCreatedEvent, FileModifiedEvent, FileDeletedEvent,
+                    FileMovedEvent, FileClosedEvent
+                ]
+            )
+        except TypeError:
+            self._observer.schedule(handler, str(self.tasks_dir), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop_watching(self):
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=1)
+            except Exception as e:
+                logger.error(f"Error stopping observer: {e}")
+            finally:
+                self._observer = None
+
+    def _queue_paths(self, paths: Iterable[Path]):
+        """Queue changed files and schedule a single flush for the whole burst"""
+        with self._pending_lock:
+            self._pending_paths.update(paths)
+            if self._pending_paths and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.EVENT_COALESCE_DELAY, self._flush_pending)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_pending(self):
+        with self._pending_lock:
+            paths = self._pending_paths
+            self._pending_paths = set()
+            self._flush_timer = None
+        for path in paths:
+            try:
+                self._apply_file_change(path)
+            except Exception as e:
+                logger.error(f"Error applying change to {path}: {e}")
+
+    def _apply_file_change(self, path: Path):
+        """Report a changed, created or removed item file to listeners"""
+        with self._known_lock:
+            known = self._known.get(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if known is not None:
+                self._forget(path)
+                self._add_tombstone(known[0], None)
+                self._notify("delete", known[0])
+            return
+        if stat.st_size == 0:
+            return  # Still being written; a later event will pick it up
+        if known is not None and known[1] == stat.st_mtime:
+            return  # Already seen (e.g. our own write)
+        stored = self.load_path(path)
+        if stored is None or not stored.item.get('id'):
+            return
+        if known is not None and known[0] != stored.item['id']:
+            self._add_tombstone(known[0], None)
+            self._notify("delete", known[0])
+        # Edits made outside the app get a sequence number in memory only;
+        # the file is not rewritten behind the editor's back. The number is
+        # recorded as a high-water mark so it is not handed out again after
+        # a restart.
+        with self._seq_lock:
+            stored.seq = self._next_seq()
+            self._save_seq_mark(stored.seq)
+        stored.item[CHANGE_SEQ_FIELD] = stored.seq
+        self._notify("put", stored.item['id'], stored)
+
+class SQLiteStorageBackend(StorageBackend):
+    """All items in a single SQLite database (WAL mode), one JSON row per item."""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            type TEXT,
+            status TEXT,
+            due_date TEXT,
+            start_time TEXT,
+            created_at TEXT,
+            modified_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tombstones (
+            change_seq INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            type TEXT,
+            deleted_at REAL NOT NULL
+        );
+    """
+
+    # Columns added after the first release of the schema: (name, definition)
+    MIGRATIONS = [
+        ("change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ]
+
+    # Listing, paging and context queries are served by the in-memory
+    # ItemIndex, so the only index is the one behind MAX(change_seq). Indexes
+    # that earlier versions created for SQL listing are dropped.
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_items_change_seq ON items (change_seq);
+        DROP INDEX IF EXISTS idx_items_type_status;
+        DROP INDEX IF EXISTS idx_items_due_date;
+        DROP INDEX IF EXISTS idx_items_start_time;
+        DROP INDEX IF EXISTS idx_items_created_at;
+    """
+
+    def __init__(self, db_path: Path):
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+        for name, definition in self.MIGRATIONS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE items ADD COLUMN {name} {definition}")
+        self._conn.executescript(self.INDEXES)
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @staticmethod
+    def _row_values(item: Dict[str, Any], modified_at: float) -> tuple:
+        created_at = item.get('created_at')
+        return (
+            item['id'],
+            item.get('type'),
+            item.get('status'),
+            item.get('due_date'),
+            item.get('start_time'),
+            str(created_at) if created_at is not None else '',
+            modified_at,
+            item[CHANGE_SEQ_FIELD],
+            json.dumps(item, ensure_ascii=False)
+        )
+
+    def _current_seq_locked(self) -> int:
+        """Latest sequence number; inside a write transaction this is safe across processes."""
+        row = self._conn.execute(
+            "SELECT MAX(seq) FROM ("
+            "SELECT MAX(change_seq) AS seq FROM items "
+            "UNION ALL SELECT MAX(change_seq) FROM tombstones)"
+        ).fetchone()
+        return row[0] or 0
+
+    def _write_rows(self, items: List[Dict[str, Any]]) -> List[StoredItem]:
+        modified_at = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._current_seq_locked()
+                for item in items:
+                    seq += 1
+                    item[CHANGE_SEQ_FIELD] = seq
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO items "
+                    "(id, type, status, due_date, start_time, created_at, modified_at, change_seq, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._row_values(item, modified_at) for item in items]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        stored_items = [StoredItem(item=item, mtime=modified_at, seq=item[CHANGE_SEQ_FIELD]) for item in items]
+        for stored in stored_items:
+            self._notify("put", stored.item['id'], stored)
+        return stored_items
+
+    def load(self, item_id: str) -> Optional[StoredItem]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, modified_at, change_seq FROM items WHERE id = ?", (item_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return StoredItem(item=json.loads(row[0]), mtime=row[1], seq=row[2])
+
+    def load_many(self, item_ids: Iterable[str]) -> Dict[str, StoredItem]:
+        item_ids = list(dict.fromkeys(item_ids))
+        found = {}
+        for start in range(0, len(item_ids), self.SCAN_BATCH_SIZE):
+            chunk = item_ids[start:start + self.SCAN_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, data, modified_at, change_seq FROM items WHERE id IN ({placeholders})",
+                    chunk
+                ).fetchall()
+            for item_id, data, modified_at, change_seq in rows:
+                found[item_id] = StoredItem(item=json.loads(data), mtime=modified_at, seq=change_seq)
+        return found
+
+    # Rows fetched per query by scan; memory use does not grow with the table
+    SCAN_BATCH_SIZE = 500
+
+    def scan(self) -> Iterator[StoredItem]:
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data, modified_at, change_seq FROM items "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.SCAN_BATCH_SIZE)
+                ).fetchall()
+            for _, data, modified_at, change_seq in rows:
+                yield StoredItem(item=json.loads(data), mtime=modified_at, seq=change_seq)
+            if len(rows) < self.SCAN_BATCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def put(self, item: Dict[str, Any], path: Optional[Path] = None) -> StoredItem:
+        return self._write_rows([item])[0]
+
+    def put_many(self, items: Iterable[Dict[str, Any]], paths: Optional[List[Optional[Path]]] = None) -> List[StoredItem]:
+        items = list(items)
+        if not items:
+            return []
+        return self._write_rows(items)
+
+    def delete(self, item_id: str, path: Optional[Path] = None) -> bool:
+        return bool(self.delete_many([(item_id, path)]))
+
+    def delete_many(
+        self,
+        targets: Iterable[Tuple[str, Optional[Path]]],
+        expected_seqs: Optional[Dict[str, int]] = None
+    ) -> List[str]:
+        deleted = []
+        deleted_at = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._current_seq_locked()
+                for item_id, _ in targets:
+                    row = self._conn.execute("SELECT type, change_seq FROM items WHERE id = ?", (item_id,)).fetchone()
+                    if row is None:
+                        continue
+                    if expected_seqs is not None and item_id in expected_seqs and row[1] != expected_seqs[item_id]:
+                        continue
+                    seq += 1
+                    self._conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+                    self._conn.execute(
+                        "INSERT INTO tombstones (change_seq, id, type, deleted_at) VALUES (?, ?, ?, ?)",
+                        (seq, item_id, row[0], deleted_at)
+                    )
+                    deleted.append(item_id)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        for item_id in deleted:
+            self._notify("delete", item_id)
+        return deleted
+
+    def current_seq(self) -> int:
+        with self._lock:
+            return self._current_seq_locked()
+
+    def tombstones_since(self, seq: int) -> List[Tombstone]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT change_seq, id, type, deleted_at FROM tombstones "
+                "WHERE change_seq > ? ORDER BY change_seq",
+                (seq,)
+            ).fetchall()
+        return [Tombstone(seq=row[0], id=row[1], type=row[2], deleted_at=row[3]) for row in rows]
+
+    def check_external_changes(self) -> bool:
+        with self._lock:
+            version = self._read_data_version()
+            changed = version != self._data_version
+            self._data_version = version
+        if changed:
+            self._notify("reload", "")
+        return changed
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+_backends: Dict[tuple, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+def create_storage_backend(storage_dir: Path, backend: Optional[str] = None) -> StorageBackend:
+    """Create a new backend for a storage directory (see get_storage_backend)."""
+    storage_dir = Path(storage_dir)
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'file')).lower()
+    if backend == 'file':
+        return FileStorageBackend(storage_dir / "tasks")
+    if backend == 'sqlite':
+        return SQLiteStorageBackend(Path(os.getenv('SQLITE_DB_PATH', str(storage_dir / "tasks.db"))))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def get_storage_backend(storage_dir: Path, backend: Optional[str] = None) -> StorageBackend:
+    """
+    Get the shared backend for a storage directory.
+
+    DataStore and TasksManager instances pointing at the same directory share
+    one backend, so writes made through one are seen by the other's listeners.
+    The engine is chosen by the STORAGE_BACKEND environment variable
+    ("file" or "sqlite") unless given explicitly.
+    """
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'file')).lower()
+    key = (str(Path(storage_dir).resolve()), backend)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = create_storage_backend(storage_dir, backend)
+        return _backends[key]
+
+def close_storage_backends():
+    """
+    Stop the watchers and close the shared backends, at application exit.
+
+    The backends are shared, so their users only remove their listeners;
+    the process that created them closes them here.
+    """
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        try:
+            backend.close()
+        except Exception as e:
+            logger.error(f"Error closing {backend.name} storage: {e}")
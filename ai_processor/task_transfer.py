@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Export the task store to NDJSON (one item per line) and import it back.
+
+Usage:
+    python -m ai_processor.task_transfer export [--storage-dir data] [--archive] [-o tasks.ndjson]
+    python -m ai_processor.task_transfer import [--storage-dir data] tasks.ndjson
+
+Both directions stream, so memory use does not depend on the size of the
+store. Items keep their ids; importing an id that already exists replaces it.
+While the web app is running, prefer POST /api/tasks/import, which refreshes
+its task list once instead of letting the watcher pick up every file.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from .archive import ArchiveStore
+from .storage import StorageBackend, get_storage_backend, is_valid_item_id
+
+IMPORT_BATCH_SIZE = 1000
+
+def export_lines(storage: StorageBackend, archive: Optional[ArchiveStore] = None) -> Iterator[str]:
+    """
+    NDJSON lines for every stored item, followed by archived items if `archive` is given.
+
+    An archived copy of an item that is still in the store (left by a crash,
+    or by an item changed while it was archived) is outdated and skipped.
+    """
+    stored_ids = set()
+    for item in storage.iter_items():
+        stored_ids.add(item.get("id"))
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+    if archive is not None:
+        for month in archive.months():
+            for item in archive.iter_month(month):
+                if item.get("id") not in stored_ids:
+                    yield json.dumps(item, ensure_ascii=False) + "\n"
+
+def parse_lines(lines: Iterable[str], errors: List[str]) -> Iterator[Dict[str, Any]]:
+    """Items from NDJSON lines; unusable lines are described in `errors` and skipped."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            errors.append(f"line {number}: {e}")
+            continue
+        if not isinstance(item, dict) or not item.get("id"):
+            errors.append(f"line {number}: item has no id")
+            continue
+        if not is_valid_item_id(item["id"]):
+            errors.append(f"line {number}: invalid id {item['id']!r}")
+            continue
+        yield item
+
+def import_lines(storage: StorageBackend, lines: Iterable[str], batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Store the items of an NDJSON stream in large batches.
+
+    Listeners such as TasksManager are refreshed once at the end rather than
+    per item. Returns the number of items imported and the skipped lines.
+    """
+    errors: List[str] = []
+    imported = storage.bulk_load(parse_lines(lines, errors), batch_size=batch_size)
+    return {"imported": imported, "errors": errors}
+
+def _write_export(storage: StorageBackend, archive: Optional[ArchiveStore], out: TextIO) -> int:
+    count = 0
+    for line in export_lines(storage, archive):
+        out.write(line)
+        count += 1
+    return count
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export or import the task store as NDJSON')
+    parser.add_argument('--storage-dir', default='data', help='Data directory containing the task store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write every item as NDJSON')
+    export_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    export_parser.add_argument('--archive', action='store_true', help='Include archived items')
+
+    import_parser = subparsers.add_parser('import', help='Read items from NDJSON')
+    import_parser.add_argument('input', help="NDJSON file ('-' for stdin)")
+    import_parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Items written per batch')
+
+    args = parser.parse_args(argv)
+    storage_dir = Path(args.storage_dir)
+    storage = get_storage_backend(storage_dir)
+    try:
+        if args.command == 'export':
+            archive = ArchiveStore(storage_dir / "archive") if args.archive else None
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as out:
+                    count = _write_export(storage, archive, out)
+                print(f"Exported {count} items to {args.output}", file=sys.stderr)
+            else:
+                _write_export(storage, archive, sys.stdout)
+            return 0
+
+        if args.input == '-':
+            result = import_lines(storage, sys.stdin, batch_size=args.batch_size)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                result = import_lines(storage, f, batch_size=args.batch_size)
+        for error in result["errors"]:
+            print(f"Skipped {error}", file=sys.stderr)
+        print(f"Imported {result['imported']} items into {storage_dir}", file=sys.stderr)
+        return 0
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
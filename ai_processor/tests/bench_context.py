@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark context assembly (get_active_items_for_context) against history size.
+
+Compares the previous approach - parse every task file, then strptime every
+date - with the indexed lookup. Items are written to a temporary directory.
+
+Usage:
+    python ai_processor/tests/bench_context.py --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.data_store import DataStore
+from ai_processor.storage import FileStorageBackend, SQLiteStorageBackend
+
+ACTIVE_RATIO = 0.02  # Share of the history that is still active
+
+def generate_items(count: int):
+    """Generate a history where most items are old, completed or dismissed."""
+    rng = random.Random(42)
+    now = datetime.now()
+    for i in range(count):
+        created = now - timedelta(days=365 * 2 * (count - i) / count)
+        item_type = rng.choice(["todo", "calendar", "general"])
+        status = "active" if rng.random() < ACTIVE_RATIO else rng.choice(["completed", "dismissed"])
+        item = {
+            "id": created.strftime("%Y%m%d_%H%M%S_") + f"{i:06d}",
+            "type": item_type,
+            "title": f"item {i}",
+            "description": "תיאור " * 10,
+            "created_at": created.isoformat(),
+            "status": status,
+        }
+        offset = timedelta(days=rng.randint(-30, 30))
+        if item_type == "todo":
+            item["due_date"] = (now + offset).strftime("%Y-%m-%d")
+        elif item_type == "calendar":
+            item["start_time"] = (now + offset).strftime("%Y-%m-%d %H:%M")
+        yield item
+
+def legacy_context_items(tasks_dir: Path, prompt_type: str):
+    """The pre-index implementation: full scan plus per-item strptime."""
+    today = datetime.now().date()
+    items = []
+    for file_path in sorted(tasks_dir.glob("*.json"), reverse=True):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            item = json.load(f)
+        if item.get("type") == prompt_type and item.get("status") == "active":
+            items.append(item)
+    relevant = []
+    for item in items[:100]:
+        if prompt_type == "todo" and item.get("due_date"):
+            if datetime.strptime(item["due_date"], "%Y-%m-%d").date() >= today:
+                relevant.append(item)
+        elif prompt_type == "calendar" and item.get("start_time"):
+            if datetime.strptime(item["start_time"], "%Y-%m-%d %H:%M").date() >= today:
+                relevant.append(item)
+        else:
+            relevant.append(item)
+    return relevant
+
+def timed(fn, repeat: int = 5):
+    """Best-of-N wall time in milliseconds and the last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def run(size: int, backend_name: str):
+    root = Path(tempfile.mkdtemp(prefix="bench_context_"))
+    try:
+        if backend_name == "sqlite":
+            storage = SQLiteStorageBackend(root / "tasks.db")
+        else:
+            storage = FileStorageBackend(root / "tasks")
+        storage.put_many(generate_items(size))
+        store = DataStore(storage_dir=str(root), storage=storage)
+
+        legacy_ms, legacy = (None, None)
+        if backend_name == "file":
+            legacy_ms, legacy = timed(lambda: legacy_context_items(root / "tasks", "todo"), repeat=1)
+
+        build_start = time.perf_counter()
+        asyncio.run(store.get_active_items_for_context("todo"))
+        build_ms = (time.perf_counter() - build_start) * 1000
+        indexed_ms, indexed = timed(lambda: asyncio.run(store.get_active_items_for_context("todo")), repeat=20)
+
+        print(f"{size:>8} items [{backend_name}]")
+        if legacy_ms is not None:
+            print(f"    full scan + strptime : {legacy_ms:10.2f} ms  ({len(legacy)} items)")
+        print(f"    index build (once)   : {build_ms:10.2f} ms")
+        print(f"    indexed query        : {indexed_ms:10.3f} ms  ({len(indexed)} items)")
+        storage.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark context item assembly')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='History sizes to test')
+    parser.add_argument('--backend', choices=['file', 'sqlite'], default='file', help='Storage backend')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.backend)
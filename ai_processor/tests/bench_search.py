@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-text task search (SearchIndex) against history size.
+
+Items with Hebrew titles and descriptions are written to a temporary
+directory; the index is built once and then queried repeatedly.
+
+Usage:
+    python ai_processor/tests/bench_search.py --sizes 10000 50000
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.search_index import SearchIndex
+from ai_processor.storage import FileStorageBackend, SQLiteStorageBackend
+
+WORDS = [
+    "טופס", "טיול", "שנתי", "אישור", "הורים", "תשלום", "אסיפת", "כיתה", "מורה",
+    "שיעורי", "בית", "מבחן", "חשבון", "אנגלית", "הצגה", "מסיבה", "חנוכה", "פורים",
+    "ציוד", "בגדים", "לבנים", "כובע", "מים", "כריך", "הסעה", "חוג", "כדורגל",
+    "ריקוד", "רופא", "שיניים", "חיסון", "יום", "הולדת", "מתנה", "ספר", "ספרייה",
+]
+PREFIXES = ["", "", "", "ו", "ה", "ב", "ל", "וה", "של"]
+VOCABULARY_SIZE = 5000  # Common words first, then generated rarer words
+QUERIES = ["טופס טיול", "אישור הורים לטיול", "מבחן", "בית", "שיעורי בית באנגלית", "כדורגל"]
+
+def build_vocabulary(rng: random.Random):
+    letters = "אבגדהוזחטיכלמנסעפצקרשת"
+    vocabulary = []
+    while len(vocabulary) < VOCABULARY_SIZE - len(WORDS):
+        vocabulary.append("".join(rng.choice(letters) for _ in range(rng.randint(3, 6))))
+    # The query words are mid-frequency: each appears in a few percent of items
+    for rank, word in enumerate(WORDS):
+        vocabulary.insert(100 + rank * 10, word)
+    # Zipf-like: the k-th word is used about 1/k as often as the first
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return vocabulary, weights
+
+def generate_items(count: int):
+    rng = random.Random(42)
+    vocabulary, weights = build_vocabulary(rng)
+    for i in range(count):
+        words = lambda n: " ".join(
+            rng.choice(PREFIXES) + word for word in rng.choices(vocabulary, weights, k=n)
+        )
+        yield {
+            "id": f"item{i:07d}",
+            "type": rng.choice(["todo", "calendar", "general"]),
+            "status": rng.choice(["active", "completed", "dismissed"]),
+            "title": words(4),
+            "description": words(15),
+            "source_message": words(25),
+            "created_at": f"2025-01-01T00:00:{i % 60:02d}",
+        }
+
+def run(size: int, backend_name: str):
+    root = Path(tempfile.mkdtemp(prefix="bench_search_"))
+    try:
+        if backend_name == "sqlite":
+            storage = SQLiteStorageBackend(root / "tasks.db")
+        else:
+            storage = FileStorageBackend(root / "tasks")
+        storage.bulk_load(generate_items(size))
+        index = SearchIndex(storage)
+
+        build_start = time.perf_counter()
+        index.search("טופס")
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        print(f"{size:>8} items [{backend_name}]")
+        print(f"    index build (once)   : {build_ms:10.2f} ms")
+        for query in QUERIES:
+            best = float("inf")
+            for _ in range(10):
+                start = time.perf_counter()
+                results = index.search(query, limit=20)
+                best = min(best, time.perf_counter() - start)
+            print(f"    {query:<20} : {best * 1000:10.3f} ms  ({len(results)} results)")
+        storage.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark full-text task search')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000], help='History sizes to test')
+    parser.add_argument('--backend', choices=['file', 'sqlite'], default='sqlite', help='Storage backend')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.backend)
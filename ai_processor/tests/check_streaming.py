@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare time-to-first-item of streamed and unstreamed completions against
+the local fake OpenAI server, which generates both at the same rate.
+
+Usage:
+    python ai_processor/tests/check_streaming.py --items 20 --chunk-delay 0.01
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.tests.fake_openai_server import FakeOpenAIServer
+
+server = FakeOpenAIServer().start()
+os.environ["OPENAI_BASE_URL"] = server.base_url
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+from ai_processor import async_runtime
+from ai_processor.json_stream import ItemStreamParser
+from ai_processor.message_processor import RESULT_SECTIONS
+
+def make_content(count: int) -> str:
+    return json.dumps({"todos": [
+        {
+            "title": f"להביא טופס אישור לטיול {i}",
+            "description": "יש להחתים את הטופס ולהחזיר למורה עד יום חמישי. " * 3,
+            "due_date": None,
+            "priority": "medium",
+            "assigned_to": "parent",
+            "context": "",
+            "source_message": f"הודעה {i}"
+        }
+        for i in range(count)
+    ]}, ensure_ascii=False)
+
+async def unstreamed():
+    started = time.monotonic()
+    response = await async_runtime.get_async_client().chat.completions.create(
+        model="fake", messages=[{"role": "user", "content": "ping"}]
+    )
+    items = json.loads(response.choices[0].message.content)["todos"]
+    elapsed = time.monotonic() - started
+    return elapsed, elapsed, len(items)
+
+async def streamed():
+    started = time.monotonic()
+    parser = ItemStreamParser(RESULT_SECTIONS)
+    first, count = None, 0
+    response = await async_runtime.get_async_client().chat.completions.create(
+        model="fake", messages=[{"role": "user", "content": "ping"}], stream=True
+    )
+    async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            for _ in parser.feed(chunk.choices[0].delta.content):
+                count += 1
+                if first is None:
+                    first = time.monotonic() - started
+    return first, time.monotonic() - started, count
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-item, streamed vs unstreamed")
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Seconds to generate each chunk")
+    args = parser.parse_args()
+
+    server.mode.update(content=make_content(args.items), chunk_size=args.chunk_size, chunk_delay=args.chunk_delay)
+    print(f"{args.items} todos, {len(server.mode['content'])} characters")
+    try:
+        for name, run in (("unstreamed", unstreamed), ("streamed", streamed)):
+            first, total, count = async_runtime.run_coroutine(run())
+            print(f"{name:>10}: first item {first:.2f}s, all {count} items {total:.2f}s")
+    finally:
+        async_runtime.shutdown()
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the OpenAI chat completions API, for exercising
+retries, deadlines, hedging, the circuit breaker and streamed responses
+without a real provider.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+Its behaviour can be changed while it runs by POSTing a JSON object with
+any of the mode fields to /mode; GET /stats returns request counters.
+
+Usage:
+    python ai_processor/tests/fake_openai_server.py --port 18080 --delay 0.5 --fail-rate 0.2
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+DEFAULT_MODE = {
+    "delay": 0.0,          # Seconds before every response
+    "slow_rate": 0.0,      # Share of requests delayed by slow_delay instead (tail latency)
+    "slow_delay": 5.0,
+    "fail_rate": 0.0,      # Share of requests answered with fail_status
+    "fail_status": 500,
+    "hang": False,         # Never answer (until the client gives up)
+    "chunk_size": 16,      # Characters per chunk of a streamed response
+    "chunk_delay": 0.0,    # Seconds per chunk of generated content, streamed or not
+    "content": json.dumps({"todos": []}),
+}
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for many concurrent (and hedged) connections; an overflowing
+    # backlog delays connects by a SYN retransmit and would skew latencies
+    request_queue_size = 128
+
+class FakeOpenAIServer:
+    """The fake API on a background thread; `mode` may be changed at any time."""
+
+    def __init__(self, port: int = 0, **mode: Any):
+        self.mode: Dict[str, Any] = dict(DEFAULT_MODE, **mode)
+        self.stats = {"requests": 0, "completed": 0, "failed": 0, "slow": 0}
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up, e.g. a cancelled hedged request
+
+            def _send_stream(self, request: Dict[str, Any], mode: Dict[str, Any]):
+                """The content as server-sent chat.completion.chunk events."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                content = mode["content"]
+                size = max(int(mode["chunk_size"]), 1)
+                pieces = [{"role": "assistant", "content": ""}]
+                pieces += [{"content": content[i:i + size]} for i in range(0, len(content), size)]
+                try:
+                    for index, delta in enumerate(pieces + [{}]):
+                        chunk = {
+                            "id": "chatcmpl-fake-stream",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": request.get("model", "fake"),
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}]
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if 0 < index < len(pieces):
+                            time.sleep(mode["chunk_delay"])
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._send_json(200, dict(server.stats, mode=server.mode))
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if self.path == "/mode":
+                    server.mode.update(self._read_json())
+                    self._send_json(200, server.mode)
+                    return
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                request = self._read_json()
+                mode = dict(server.mode)
+                server.count("requests")
+                if mode["hang"]:
+                    time.sleep(3600)
+                    return
+                if random.random() < mode["slow_rate"]:
+                    server.count("slow")
+                    time.sleep(mode["slow_delay"])
+                else:
+                    time.sleep(mode["delay"])
+                if random.random() < mode["fail_rate"]:
+                    server.count("failed")
+                    self._send_json(mode["fail_status"], {
+                        "error": {"message": "fake provider failure", "type": "server_error", "code": None}
+                    })
+                    return
+                server.count("completed")
+                if request.get("stream"):
+                    self._send_stream(request, mode)
+                    return
+                # An unstreamed response takes as long to generate in full
+                chunks = -(-len(mode["content"]) // max(int(mode["chunk_size"]), 1))
+                time.sleep(mode["chunk_delay"] * chunks)
+                self._send_json(200, {
+                    "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": mode["content"]},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                })
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=500)
+    parser.add_argument("--hang", action="store_true")
+    parser.add_argument("--content", default=DEFAULT_MODE["content"], help="Message content of every completion")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.port,
+        delay=args.delay,
+        slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay,
+        fail_rate=args.fail_rate,
+        fail_status=args.fail_status,
+        hang=args.hang,
+        content=args.content,
+        chunk_size=args.chunk_size,
+        chunk_delay=args.chunk_delay
+    )
+    print(f"Fake OpenAI server on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
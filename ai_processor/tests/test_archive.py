@@ -0,0 +1,78 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.archive import ArchiveStore, Archiver
+from ai_processor.storage import FileStorageBackend
+from ai_processor.task_transfer import export_lines, import_lines
+
+NOW = datetime(2024, 3, 10)
+
+def stored_item(item_id: str, status: str, created_at: str):
+    return {"id": item_id, "type": "todo", "title": item_id, "status": status, "created_at": created_at}
+
+def make_store(tmp_path: Path) -> FileStorageBackend:
+    storage = FileStorageBackend(tmp_path / "tasks")
+    storage.put_many([
+        stored_item("20230101_080000_000000", "completed", "2023-01-01T08:00:00"),
+        stored_item("20230101_090000_000000", "dismissed", "2023-01-01T09:00:00"),
+        stored_item("20230101_100000_000000", "active", "2023-01-01T10:00:00"),
+        stored_item("20240301_080000_000000", "completed", "2024-03-01T08:00:00"),
+    ])
+    return storage
+
+def stored_ids(storage):
+    return sorted(item["id"] for item in storage.iter_items())
+
+def test_archives_only_old_finished_items_in_one_batch(tmp_path):
+    storage = make_store(tmp_path)
+    archive = ArchiveStore(tmp_path / "archive")
+    batches = []
+    delete_many = storage.delete_many
+    storage.delete_many = lambda targets, **kwargs: batches.append(list(targets)) or delete_many(batches[-1], **kwargs)
+
+    moved = Archiver(storage, archive, after_days=30).run_once(now=NOW)
+
+    assert moved == 2
+    assert len(batches) == 1
+    assert sorted(item["id"] for item in archive.iter_month("2023-01")) == [
+        "20230101_080000_000000", "20230101_090000_000000"
+    ]
+    assert stored_ids(storage) == ["20230101_100000_000000", "20240301_080000_000000"]
+
+def test_item_reopened_while_archiving_stays_in_the_store(tmp_path):
+    storage = make_store(tmp_path)
+    archive = ArchiveStore(tmp_path / "archive")
+    delete_many = storage.delete_many
+
+    def reopen_then_delete(targets, **kwargs):
+        reopened = dict(storage.get("20230101_080000_000000"), status="active")
+        storage.put(reopened)
+        return delete_many(targets, **kwargs)
+
+    storage.delete_many = reopen_then_delete
+
+    moved = Archiver(storage, archive, after_days=30).run_once(now=NOW)
+
+    assert moved == 1
+    assert storage.get("20230101_080000_000000")["status"] == "active"
+    assert storage.get("20230101_090000_000000") is None
+
+def test_archive_export_import_round_trip(tmp_path):
+    storage = make_store(tmp_path)
+    before = {item["id"]: item for item in storage.iter_items()}
+    archive = ArchiveStore(tmp_path / "archive")
+    Archiver(storage, archive, after_days=30).run_once(now=NOW)
+
+    restored = FileStorageBackend(tmp_path / "restored")
+    result = import_lines(restored, export_lines(storage, archive))
+
+    assert result == {"imported": 4, "errors": []}
+    after = {item["id"]: item for item in restored.iter_items()}
+    assert sorted(after) == sorted(before)
+    for item_id, item in before.items():
+        assert after[item_id]["status"] == item["status"]
+        assert after[item_id]["title"] == item["title"]
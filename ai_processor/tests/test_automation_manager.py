@@ -0,0 +1,47 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.config import Config
+from ai_processor.data_store import DataStore
+from lib import automation_manager
+from lib.automation_manager import AutomationManager
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "API_KEY", "fake")
+    # Keep the processor's store out of the project's data directory
+    monkeypatch.setattr(automation_manager, "DataStore", lambda storage_dir: DataStore(storage_dir=str(tmp_path / "data")))
+    return AutomationManager(tmp_path / "automation", agent_host="http://127.0.0.1:9")
+
+def test_config_version_changes_only_with_the_configurations(manager):
+    initial = manager.get_config_version()
+    assert manager.get_config_version() == initial
+
+    config = manager.create_configuration("owner", "customer", "group", ["todo"], active=False)
+    created = manager.get_config_version()
+    assert created != initial
+
+    manager.load_configurations()
+    assert manager.get_config_version() == created
+
+    config_file = manager.automation_dir / f"{config.automation_id}.json"
+    data = json.loads(config_file.read_text(encoding="utf-8"))
+    config_file.write_text(json.dumps(dict(data, min_msg_count=5)), encoding="utf-8")
+    manager.load_configurations()
+    edited = manager.get_config_version()
+    assert edited != created
+
+    manager.delete_configuration(config.automation_id)
+    assert manager.get_config_version() != edited
+
+def test_config_version_does_not_read_the_directory(manager, monkeypatch):
+    manager.create_configuration("owner", "customer", "group", ["todo"], active=False)
+    monkeypatch.setattr("os.scandir", lambda *args: pytest.fail("config directory scanned"))
+
+    manager.get_config_version()
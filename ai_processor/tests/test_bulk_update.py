@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from lib.tasks_manager import TasksManager
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = TasksManager(str(tmp_path))
+    manager.storage.put_many([
+        {"id": f"20240101_08000{i}_000000", "type": "todo", "title": f"משימה {i}", "status": "active"}
+        for i in range(3)
+    ])
+    yield manager
+    manager.cleanup()
+    manager.storage.stop_watching()
+
+def test_mixed_batch_fails_only_the_bad_operations(manager, tmp_path):
+    results = manager.bulk_update([
+        {"op": "update", "id": "20240101_080000_000000", "updates": {"status": "completed"}},
+        {"op": "update", "id": "../x", "updates": {"status": "completed"}},
+        {"op": "delete", "id": "/tmp/x"},
+        {"op": "delete", "id": "20240101_080001_000000"},
+        {"op": "update", "id": "20240101_080009_000000", "updates": {"status": "completed"}},
+        {"op": "rename", "id": "20240101_080002_000000"},
+    ])
+
+    assert [result["success"] for result in results] == [True, False, False, True, False, False]
+    assert results[1]["error"] == results[2]["error"] == "Invalid id"
+    assert results[4]["error"] == "Task not found"
+    assert manager.storage.get("20240101_080000_000000")["status"] == "completed"
+    assert manager.storage.get("20240101_080001_000000") is None
+    assert manager.storage.get("20240101_080002_000000")["status"] == "active"
+    assert not (tmp_path / "x.json").exists()
+
+def test_single_task_operations_treat_paths_as_missing(manager):
+    assert manager.update_task("../x", {"status": "completed"}) is False
+    assert manager.delete_task("../x") is False
@@ -0,0 +1,85 @@
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.storage import FileStorageBackend
+from lib.tasks_manager import TasksManager
+
+def write_legacy_task(tasks_dir: Path, task_id: str):
+    """A task file from before change sequences existed (no change_seq)"""
+    task = {"id": task_id, "type": "todo", "title": f"משימה {task_id}", "status": "active"}
+    (tasks_dir / f"{task_id}.json").write_text(json.dumps(task, ensure_ascii=False), encoding="utf-8")
+
+def test_legacy_tasks_page_to_completion(tmp_path):
+    tasks_dir = tmp_path / "tasks"
+    tasks_dir.mkdir()
+    for i in range(30):
+        write_legacy_task(tasks_dir, f"20240101_0800{i:02d}_000000")
+    manager = TasksManager(str(tmp_path))
+    try:
+        seen = []
+        since, after = 0, None
+        for _ in range(10):
+            page = manager.get_changes(since, limit=10, after=after)
+            seen += [change["id"] for change in page["changes"]]
+            since, after = page["seq"], page["after"]
+            if not page["has_more"]:
+                break
+        assert not page["has_more"]
+        assert after is None
+        assert len(seen) == len(set(seen)) == 30
+    finally:
+        manager.storage.stop_watching()
+
+def test_external_edit_sequence_survives_restart(tmp_path):
+    storage = FileStorageBackend(tmp_path)
+    storage.put({"id": "20240101_080000_000000", "type": "todo", "title": "א", "status": "active"})
+    write_legacy_task(tmp_path, "20240101_090000_000000")
+    storage._apply_file_change(tmp_path / "20240101_090000_000000.json")
+    external_seq = storage.current_seq()
+
+    restarted = FileStorageBackend(tmp_path)
+
+    assert restarted.current_seq() == external_seq
+    stored = restarted.put({"id": "20240101_100000_000000", "type": "todo", "title": "ב", "status": "active"})
+    assert stored.seq > external_seq
+
+def test_deleted_task_is_reported_as_a_tombstone(tmp_path):
+    manager = TasksManager(str(tmp_path))
+    try:
+        manager.storage.put_many([
+            {"id": "20240101_080000_000000", "type": "todo", "title": "א", "status": "active"},
+            {"id": "20240101_090000_000000", "type": "todo", "title": "ב", "status": "active"},
+        ])
+        since = manager.get_change_seq()
+
+        assert manager.delete_task("20240101_080000_000000")
+        page = manager.get_changes(since)
+
+        assert [(change["op"], change["id"], change["type"]) for change in page["changes"]] == [
+            ("delete", "20240101_080000_000000", "todo")
+        ]
+        assert page["seq"] == manager.get_change_seq() > since
+        assert manager.get_changes(page["seq"])["changes"] == []
+    finally:
+        manager.storage.stop_watching()
+
+def test_cleanup_leaves_the_shared_backend_to_its_other_users(tmp_path):
+    first = TasksManager(str(tmp_path))
+    second = TasksManager(str(tmp_path))
+    storage = first.storage
+    try:
+        first.cleanup()
+        storage.put({"id": "20240101_080000_000000", "type": "todo", "title": "א", "status": "active"})
+
+        assert second.storage is storage
+        assert storage._observer is not None
+        assert first._on_storage_change not in storage._listeners
+        assert "20240101_080000_000000" in second._index
+        assert "20240101_080000_000000" not in first._index
+    finally:
+        second.cleanup()
+        storage.stop_watching()
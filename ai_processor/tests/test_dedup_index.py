@@ -0,0 +1,77 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.data_store import DataStore
+from ai_processor.storage import FileStorageBackend
+
+def make_store(tmp_path: Path) -> DataStore:
+    return DataStore(str(tmp_path), storage=FileStorageBackend(tmp_path), duplicate_policy="merge")
+
+def stored_item(item_id: str, title: str, status: str = "active", created_at: str = None, **fields):
+    return dict(
+        id=item_id,
+        type="todo",
+        title=title,
+        status=status,
+        created_at=created_at or datetime.now().isoformat(),
+        **fields
+    )
+
+def save_todo(store: DataStore, **todo):
+    return asyncio.run(store.save({"todos": [todo]}, "todo"))
+
+def test_new_item_is_not_merged_into_completed_item(tmp_path):
+    store = make_store(tmp_path)
+    store.storage.put(stored_item("20230905_080000_000000", "להביא מחברת חשבון", status="completed",
+                                  created_at="2023-09-05T08:00:00"))
+
+    saved = save_todo(store, title="להביא מחברת חשבון")
+
+    assert len(saved["items"]) == 1
+    assert saved["duplicates"] == []
+    active = asyncio.run(store.get_active_items_for_context("todo"))
+    assert [item["title"] for item in active] == ["להביא מחברת חשבון"]
+
+def test_new_item_is_not_merged_into_old_active_item(tmp_path):
+    store = make_store(tmp_path)
+    old = (datetime.now() - timedelta(days=store.duplicate_index.max_age_days + 1)).isoformat()
+    store.storage.put(stored_item("20230905_080000_000000", "להביא מחברת חשבון", created_at=old))
+
+    saved = save_todo(store, title="להביא מחברת חשבון")
+
+    assert len(saved["items"]) == 1
+
+def test_dates_must_match_or_both_be_missing(tmp_path):
+    store = make_store(tmp_path)
+    store.storage.put(stored_item("20240101_080000_000000", "להביא מחברת חשבון", due_date="2024-01-02"))
+
+    assert len(save_todo(store, title="להביא מחברת חשבון")["items"]) == 1
+    assert len(save_todo(store, title="להביא מחברת חשבון", due_date="2024-01-03")["items"]) == 1
+    same_day = save_todo(store, title="להביא מחברת חשבון", due_date="2024-01-02")
+    assert same_day["items"] == []
+    assert same_day["duplicates"] == ["20240101_080000_000000"]
+
+def test_recent_active_duplicate_is_merged(tmp_path):
+    store = make_store(tmp_path)
+    store.storage.put(stored_item("20240101_080000_000000", "להביא מחברת חשבון"))
+
+    saved = save_todo(store, title="להביא מחברת חשבון", description="עד יום שני")
+
+    assert saved["items"] == []
+    assert saved["merged"] == ["20240101_080000_000000"]
+    assert store.storage.get("20240101_080000_000000")["description"] == "עד יום שני"
+
+def test_completing_an_item_removes_it_from_the_index(tmp_path):
+    store = make_store(tmp_path)
+    item = stored_item("20240101_080000_000000", "להביא מחברת חשבון")
+    store.storage.put(item)
+    assert store.duplicate_index.find_duplicate(dict(item, id=None)) is not None
+
+    store.storage.put(dict(item, status="completed"))
+
+    assert store.duplicate_index.find_duplicate(dict(item, id=None)) is None
@@ -0,0 +1,83 @@
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.dedup_index import DuplicateIndex
+from ai_processor.item_index import ItemIndex, get_item_index
+from ai_processor.search_index import get_search_index
+from ai_processor.storage import FileStorageBackend
+from lib.tasks_manager import TasksManager
+
+def stored_item(minute: int, status: str = "active"):
+    return {
+        "id": f"20240101_08{minute:02d}00_000000",
+        "type": "todo",
+        "title": f"משימה {minute}",
+        "status": status,
+        "created_at": f"2024-01-01T08:{minute:02d}:00",
+    }
+
+def test_cursor_pages_are_stable_while_items_change(tmp_path):
+    storage = FileStorageBackend(tmp_path)
+    storage.put_many([stored_item(minute) for minute in range(20)])
+    index = ItemIndex(storage)
+
+    first, cursor = index.page(limit=5)
+    # New items sort before the cursor, and edits keep an item's position
+    storage.put_many([stored_item(minute) for minute in range(20, 25)])
+    storage.put(stored_item(12, status="completed"))
+    storage.delete_many([(stored_item(3)["id"], None)])
+
+    pages = [first]
+    while cursor:
+        items, cursor = index.page(limit=5, cursor=cursor)
+        pages.append(items)
+    seen = [item["id"] for page in pages for item in page]
+
+    assert [item["id"] for item in first] == [stored_item(minute)["id"] for minute in range(19, 14, -1)]
+    assert seen == [stored_item(minute)["id"] for minute in range(19, -1, -1) if minute != 3]
+    assert next(item for page in pages for item in page if item["id"] == stored_item(12)["id"])["status"] == "completed"
+    storage.stop_watching()
+
+def test_offset_and_cursor_pages_agree(tmp_path):
+    storage = FileStorageBackend(tmp_path)
+    storage.put_many([stored_item(minute, "completed" if minute % 3 == 0 else "active") for minute in range(20)])
+    index = ItemIndex(storage)
+
+    by_cursor, cursor = [], None
+    while True:
+        items, cursor = index.page(status="active", limit=4, cursor=cursor)
+        by_cursor += items
+        if cursor is None:
+            break
+    by_offset = [item for offset in range(0, 20, 4) for item in index.list_items(status="active", limit=4, offset=offset)]
+
+    assert by_cursor == by_offset
+    assert len(by_cursor) == 13
+    storage.stop_watching()
+
+def test_in_memory_views_share_one_scan(tmp_path):
+    manager = TasksManager(str(tmp_path))
+    storage = manager.storage
+    storage.put_many([stored_item(minute) for minute in range(5)])
+    scans = []
+    scan = storage.scan
+    storage.scan = lambda: scans.append(1) or scan()
+    storage._notify("reload", "")
+    try:
+        found = get_search_index(storage).search("משימה")
+        duplicate = DuplicateIndex(storage, max_age_days=0).find_duplicate(dict(stored_item(2), id="20240102_080000_000000"))
+        page = manager.get_tasks_page(task_type="todo", limit=5)
+
+        assert len(scans) == 1
+        indexed = {item["id"]: item for item in get_item_index(storage).list_items(limit=5)}
+        assert len(found) == 5
+        assert all(item is indexed[item["id"]] for _, item in found)
+        assert duplicate is indexed[stored_item(2)["id"]]
+        assert all(task is indexed[task["id"]] for task in page["tasks"]["todo"])
+        assert all(entry.task is indexed[task_id] for task_id, entry in manager._index.items())
+    finally:
+        manager.cleanup()
+        storage.stop_watching()
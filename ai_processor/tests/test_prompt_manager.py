@@ -0,0 +1,34 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from lib.prompt_manager import PromptManager
+from models.prompt import Prompt
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = PromptManager(tmp_path / "prompts")
+    manager.save_prompt(Prompt(name="todo", template="גרסה ראשונה {messages}"))
+    manager.save_prompt(Prompt(name="todo", template="גרסה שנייה {messages}"))
+    return manager
+
+def test_saved_versions_are_listed_and_loaded(manager):
+    versions = manager.list_versions("todo")
+
+    assert len(versions) == 2
+    templates = {manager.get_prompt_version("todo", entry["version"]).template for entry in versions}
+    assert templates == {"גרסה ראשונה {messages}", "גרסה שנייה {messages}"}
+    assert manager.list_versions("calendar") == []
+
+@pytest.mark.parametrize("name", ["..", ".", "_versions", "a.b", "todo\n"])
+def test_names_outside_the_versions_dir_are_not_found(manager, name):
+    # ".." would otherwise list the prompt files themselves as versions
+    (manager.prompts_dir / "0123abcd.json").write_text(json.dumps({"name": "x", "template": "x"}), encoding="utf-8")
+
+    assert manager.list_versions(name) is None
+    assert manager.get_prompt_version(name, "0123abcd") is None
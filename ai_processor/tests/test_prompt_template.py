@@ -0,0 +1,28 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.config import Config
+from lib.prompt_template import TemplateError, compile_template
+
+PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts"
+
+def test_metadata_keys_missing_from_metadata_file_are_rejected():
+    keywords = Config.get_template_keywords()
+
+    with pytest.raises(TemplateError, match="your_kid_names"):
+        compile_template("{metadata[your_kid_names]}", keywords)
+    compile_template("{metadata[kid_names]} {metadata[today]} {metadata[child_info]}", keywords)
+
+@pytest.mark.parametrize("name", ["todo", "calendar", "general"])
+def test_shipped_prompts_render_with_the_metadata_file(name):
+    with open(PROMPTS_DIR / f"{name}.json", encoding="utf-8") as f:
+        template = compile_template(json.load(f)["template"], Config.get_template_keywords())
+
+    metadata = dict(Config.load_metadata(), today="2024-01-01", class_info={}, child_info={}, parent_info={})
+    template.render({"metadata": metadata, "messages": "", "context_items": ""})
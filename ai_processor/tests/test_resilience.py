@@ -0,0 +1,131 @@
+"""
+LLM call retries, deadlines, the circuit breaker and hedging against the
+local fake OpenAI server.
+
+Each test uses its own ResilientCaller with short delays and its own client
+pointed at the fake server, so it does not depend on OPENAI_BASE_URL.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import openai
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientCaller, deadline_after
+)
+from ai_processor.tests.fake_openai_server import DEFAULT_MODE, FakeOpenAIServer
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server = FakeOpenAIServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def server(fake_server):
+    fake_server.mode = dict(DEFAULT_MODE)
+    return fake_server
+
+def timed_calls(server, caller: ResilientCaller, count: int, deadline_seconds=None, concurrency: int = 5):
+    """(seconds, error class or None) for `count` calls, `concurrency` at a time."""
+    async def run():
+        client = openai.AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        def request():
+            return client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "ping"}])
+
+        async def one():
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    await caller.call(request, deadline_after(deadline_seconds))
+                    return time.monotonic() - started, None
+                except Exception as e:
+                    return time.monotonic() - started, type(e)
+
+        try:
+            return await asyncio.gather(*(one() for _ in range(count)))
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+def percentile(latencies, p):
+    latencies = sorted(latencies)
+    return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)]
+
+def test_transient_failures_are_retried(server):
+    server.mode.update(delay=0.01, fail_rate=0.3)
+    caller = ResilientCaller(max_retries=10, retry_delay=0.01, breaker=CircuitBreaker(failure_threshold=1000))
+
+    results = timed_calls(server, caller, 40)
+
+    assert [error for _, error in results if error] == []
+    assert caller.counters["retries"] > 0
+
+def test_client_errors_are_not_retried(server):
+    server.mode.update(fail_rate=1.0, fail_status=400)
+    caller = ResilientCaller(max_retries=3, retry_delay=0.01)
+    before = server.stats["requests"]
+
+    results = timed_calls(server, caller, 1)
+
+    assert results[0][1] is openai.BadRequestError
+    assert server.stats["requests"] - before == 1
+    assert caller.counters["retries"] == 0
+
+def test_deadline_bounds_a_hung_call(server):
+    server.mode.update(hang=True)
+    caller = ResilientCaller(max_retries=3, retry_delay=0.01)
+
+    results = timed_calls(server, caller, 3, deadline_seconds=0.5)
+
+    for seconds, error in results:
+        assert error is DeadlineExceeded
+        assert seconds < 1.0
+
+def test_breaker_fails_fast_and_recovers(server):
+    server.mode.update(fail_rate=1.0)
+    caller = ResilientCaller(
+        max_retries=1, retry_delay=0.01, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.5)
+    )
+    before = server.stats["requests"]
+
+    results = timed_calls(server, caller, 20, concurrency=1)
+
+    # Calls after the breaker opens are rejected without a request
+    rejected = [seconds for seconds, error in results if error is CircuitOpenError and seconds < 0.01]
+    assert server.stats["requests"] - before <= 4
+    assert len(rejected) >= 16
+    assert caller.breaker.state == CircuitBreaker.OPEN
+
+    server.mode.update(fail_rate=0.0)
+    time.sleep(0.6)
+    results = timed_calls(server, caller, 3, concurrency=1)
+
+    assert [error for _, error in results] == [None, None, None]
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+def test_hedging_cuts_tail_latency(server):
+    # 3% of requests stall for a second; hedged calls send a second request
+    # once they are slower than the recent p90
+    p99 = {}
+    for hedge in (False, True):
+        server.mode.update(delay=0.05, slow_rate=0.03, slow_delay=1.0)
+        caller = ResilientCaller(max_retries=0, hedge=hedge, hedge_min_samples=20)
+        timed_calls(server, caller, 40)  # Latency history for the hedge threshold
+        results = timed_calls(server, caller, 400, concurrency=20)
+        assert [error for _, error in results if error] == []
+        p99[hedge] = percentile([seconds for seconds, _ in results], 99)
+        if hedge:
+            assert caller.counters["hedge_wins"] > 0
+
+    assert p99[False] >= 0.9
+    assert p99[True] < 0.5
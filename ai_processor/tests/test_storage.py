@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.storage import SQLiteStorageBackend, create_storage_backend
+
+def todo(item_id: str, status: str = "active"):
+    return {"id": item_id, "type": "todo", "title": item_id, "status": status, "created_at": "2024-01-01T08:00:00"}
+
+@pytest.fixture(params=["file", "sqlite"])
+def backend_name(request):
+    return request.param
+
+def test_put_get_and_delete_with_tombstones(tmp_path, backend_name):
+    storage = create_storage_backend(tmp_path, backend_name)
+    storage.put_many([todo("20240101_080000_000000"), todo("20240101_090000_000000")])
+    seq_before_delete = storage.current_seq()
+
+    assert storage.get("20240101_080000_000000")["title"] == "20240101_080000_000000"
+    assert storage.delete_many([("20240101_080000_000000", None), ("20240101_999999_000000", None)]) == [
+        "20240101_080000_000000"
+    ]
+    assert storage.get("20240101_080000_000000") is None
+    tombstones = storage.tombstones_since(seq_before_delete)
+    assert [(tombstone.id, tombstone.type) for tombstone in tombstones] == [("20240101_080000_000000", "todo")]
+    assert tombstones[0].seq == storage.current_seq() > seq_before_delete
+
+def test_items_and_sequence_survive_reopening(tmp_path, backend_name):
+    storage = create_storage_backend(tmp_path, backend_name)
+    storage.put(todo("20240101_080000_000000"))
+    storage.put(dict(todo("20240101_080000_000000"), status="completed"))
+    seq = storage.current_seq()
+    storage.close()
+
+    reopened = create_storage_backend(tmp_path, backend_name)
+
+    assert reopened.current_seq() == seq
+    assert reopened.get("20240101_080000_000000")["status"] == "completed"
+    assert reopened.put(todo("20240101_090000_000000")).seq == seq + 1
+    reopened.close()
+
+def test_sqlite_drops_unused_listing_indexes(tmp_path):
+    db_path = tmp_path / "tasks.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript(SQLiteStorageBackend.SCHEMA)
+    conn.execute("CREATE INDEX idx_items_type_status ON items (type, status, created_at, id)")
+    conn.close()
+
+    storage = SQLiteStorageBackend(db_path)
+    indexes = {row[0] for row in storage._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    storage.close()
+
+    assert "idx_items_type_status" not in indexes
+    assert "idx_items_change_seq" in indexes
+
+def test_deletes_are_synced_once_per_batch_and_survive_replay(tmp_path, monkeypatch):
+    storage = create_storage_backend(tmp_path, "file")
+    storage.put_many([todo(f"20240101_08000{i}_000000") for i in range(3)])
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+
+    storage.delete_many([(f"20240101_08000{i}_000000", None) for i in range(2)])
+
+    assert len(synced) == 1
+    # The puts are still in the journal, which a restart replays
+    assert storage.journal_path.exists()
+    reopened = create_storage_backend(tmp_path, "file")
+    assert sorted(item["id"] for item in reopened.iter_items()) == ["20240101_080002_000000"]
@@ -0,0 +1,87 @@
+"""
+Streamed processing against the local fake OpenAI server: items are saved
+while the response streams in, once each, for every built-in prompt.
+"""
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor import async_runtime
+from ai_processor.config import Config
+from ai_processor.data_store import DataStore
+from ai_processor.message_processor import PROMPT_RESULT_SECTIONS, MessageProcessor
+from ai_processor.tests.fake_openai_server import DEFAULT_MODE, FakeOpenAIServer
+from lib.prompt_manager import PromptManager
+
+PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts"
+
+TITLES = ["להביא טופס אישור לטיול", "אסיפת הורים ביום שלישי", "לקנות מחברת חשבון"]
+MESSAGES = [{"text": "הודעה", "timestamp": 1704096000}]
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server = FakeOpenAIServer().start()
+    yield server
+    server.stop()
+    async_runtime.shutdown()
+
+@pytest.fixture
+def processor(fake_server, tmp_path, monkeypatch):
+    fake_server.mode = dict(DEFAULT_MODE)
+    monkeypatch.setattr(Config, "API_KEY", "fake")
+    monkeypatch.setattr(Config, "OPENAI_BASE_URL", fake_server.base_url)
+    monkeypatch.setattr(Config, "LLM_CACHE_ENABLED", False)
+    # The shipped prompts, rather than whatever the data directory holds
+    prompts_dir = tmp_path / "prompts"
+    prompts_dir.mkdir()
+    for path in PROMPTS_DIR.glob("[!_]*.json"):
+        shutil.copy(path, prompts_dir)
+    monkeypatch.setattr(Config, "_prompt_manager", PromptManager(prompts_dir))
+    monkeypatch.setattr(Config, "_prompts_version", None)
+    processor = MessageProcessor(DataStore(storage_dir=str(tmp_path)))
+    yield processor
+    processor.data_store.storage.stop_watching()
+
+def make_content(section: str) -> str:
+    return json.dumps({section: [
+        {"title": title, "description": "יש לבדוק את הפרטים בהודעה. " * 3, "source_message": title}
+        for title in TITLES
+    ]}, ensure_ascii=False)
+
+@pytest.mark.parametrize("prompt_type", ["todo", "calendar", "general"])
+def test_streamed_items_are_saved_as_they_arrive_and_once(fake_server, processor, prompt_type):
+    section = PROMPT_RESULT_SECTIONS[prompt_type]
+    fake_server.mode.update(content=make_content(section), chunk_size=16, chunk_delay=0.02)
+    arrivals = []
+
+    result = async_runtime.run_coroutine(processor.process_messages(
+        MESSAGES,
+        prompt_type,
+        on_item=lambda _, event: arrivals.append((time.monotonic(), event["item"]["title"])),
+        stream=True
+    ))
+
+    assert "error" not in result
+    assert [title for _, title in arrivals] == TITLES
+    # Each item is saved as soon as it is complete, not once the response is
+    assert arrivals[-1][0] - arrivals[0][0] > 0.2
+    stored = list(processor.data_store.storage.iter_items())
+    assert sorted(item["title"] for item in stored) == sorted(TITLES)
+    assert {item["type"] for item in stored} == {prompt_type}
+    assert [item["title"] for item in result[section]] == TITLES
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_result_without_the_prompt_section_is_an_error(fake_server, processor, stream):
+    fake_server.mode.update(content=make_content("todos"))
+
+    result = async_runtime.run_coroutine(processor.process_messages(MESSAGES, "calendar", stream=stream))
+
+    assert "'events'" in result["error"]
+    assert list(processor.data_store.storage.iter_items()) == []
@@ -0,0 +1,36 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from ai_processor.storage import FileStorageBackend
+from ai_processor.task_transfer import import_lines
+
+def test_import_rejects_ids_that_are_not_file_names(tmp_path):
+    storage = FileStorageBackend(tmp_path / "tasks")
+    lines = [
+        json.dumps({"id": "../../escaped", "type": "todo", "title": "א"}),
+        json.dumps({"id": "/tmp/escaped", "type": "todo", "title": "ב"}),
+        json.dumps({"id": "20240101_070000_000000\n", "type": "todo", "title": "ד"}),
+        json.dumps({"id": "20240101_080000_000000", "type": "todo", "title": "ג"}),
+    ]
+
+    result = import_lines(storage, lines)
+
+    assert result["imported"] == 1
+    assert len(result["errors"]) == 3
+    assert not (tmp_path / "escaped.json").exists()
+    assert [path.name for path in (tmp_path / "tasks").glob("*.json")] == ["20240101_080000_000000.json"]
+
+def test_storage_refuses_paths_outside_tasks_dir(tmp_path):
+    storage = FileStorageBackend(tmp_path / "tasks")
+
+    with pytest.raises(ValueError):
+        storage.put({"id": "../escaped", "type": "todo", "title": "א"})
+    with pytest.raises(ValueError):
+        storage.put_many([{"id": "/tmp/escaped", "type": "todo", "title": "ב"}])
+    assert not (tmp_path / "escaped.json").exists()
@@ -0,0 +1,176 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Appended to a message cut down to the per-message limit
+TRUNCATION_MARK = " …[truncated]"
+
+_encodings: Dict[str, Any] = {}
+
+def _get_encoding(model: str):
+    """The tiktoken encoding for a model, or None if tiktoken is unavailable."""
+    if model in _encodings:
+        return _encodings[model]
+    encoding = None
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Not installed, or its vocabulary could not be downloaded; the
+        # estimate can be well off for Hebrew, so say so loudly
+        logger.warning(f"tiktoken unavailable ({e}); falling back to estimated token counts for {model}")
+    _encodings[model] = encoding
+    return encoding
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about four ASCII characters per
+    token, and two for other scripts (Hebrew tokenizes much less densely).
+    """
+    ascii_chars = sum(1 for char in text if char < "\x80")
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+@dataclass
+class BudgetResult:
+    """Messages and context kept by TokenBudgeter.fit, and what was cut."""
+    messages: List[str]
+    context: List[str]
+    report: Dict[str, Any] = field(default_factory=dict)
+
+class TokenBudgeter:
+    """
+    Fits the variable parts of a prompt into an input token budget.
+
+    The fixed part (system prompt, template and metadata) is counted first.
+    What remains is shared between the messages and the context items:
+    messages come first, but context items may use at least `context_share`
+    of it if they need to. Content is cut in order of least value: messages
+    beyond `max_messages` (oldest first), the tail of messages longer than
+    `max_message_tokens`, the oldest context items, and finally the oldest
+    messages. The newest message is always kept.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        max_messages: int,
+        max_message_tokens: int,
+        context_share: float = 0.25,
+        model: str = ""
+    ):
+        self.budget = budget
+        self.max_messages = max_messages
+        self.max_message_tokens = max_message_tokens
+        self.context_share = context_share
+        self.encoding = _get_encoding(model)
+
+    @property
+    def tokenizer(self) -> str:
+        return "tiktoken" if self.encoding is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The start of `text` within `max_tokens` tokens, marked as truncated."""
+        limit = max(max_tokens - self.count(TRUNCATION_MARK), 1)
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:limit]) + TRUNCATION_MARK
+        # Estimated counts are roughly proportional to length
+        cut = max(int(len(text) * limit / max(self.count(text), 1)), 1)
+        while cut > 1 and self.count(text[:cut]) > limit:
+            cut = int(cut * 0.9)
+        return text[:cut] + TRUNCATION_MARK
+
+    def fit(
+        self,
+        fixed_text: str,
+        messages: List[Tuple[Any, str]],
+        context: List[Tuple[Any, str]]
+    ) -> BudgetResult:
+        """
+        Choose the messages and context items that fit the budget.
+
+        Args:
+            fixed_text: Everything in the prompt that is always sent
+            messages: (key, formatted text) per message, oldest first
+            context: (key, formatted text) per context item, newest first
+        Returns:
+            The kept texts in their original order, and a report with the
+            token counts and the keys of dropped and truncated entries
+        """
+        fixed_tokens = self.count(fixed_text)
+        available = max(self.budget - fixed_tokens, 0)
+
+        over_limit = messages[:-self.max_messages] if 0 < self.max_messages < len(messages) else []
+        candidates = messages[len(over_limit):]
+
+        truncated = []
+        message_entries = []  # [key, text, tokens], oldest first
+        for key, text in candidates:
+            tokens = self.count(text)
+            if tokens > self.max_message_tokens:
+                text = self.truncate(text, self.max_message_tokens)
+                tokens = self.count(text)
+                truncated.append(key)
+            message_entries.append([key, text, tokens])
+        message_tokens = sum(entry[2] for entry in message_entries)
+
+        context_entries = [(key, text, self.count(text)) for key, text in context]
+        context_need = sum(entry[2] for entry in context_entries)
+        context_budget = max(available - message_tokens, min(context_need, int(available * self.context_share)))
+
+        kept_context = []
+        context_tokens = 0
+        for key, text, tokens in context_entries:
+            if context_tokens + tokens > context_budget:
+                break
+            kept_context.append(text)
+            context_tokens += tokens
+        dropped_context = [key for key, _, _ in context_entries[len(kept_context):]]
+
+        dropped_messages = [key for key, _ in over_limit]
+        while message_entries and message_tokens + context_tokens > available and len(message_entries) > 1:
+            key, _, tokens = message_entries.pop(0)
+            dropped_messages.append(key)
+            message_tokens -= tokens
+        if message_entries and message_tokens + context_tokens > available:
+            # Only the newest message is left; cut it to whatever room remains
+            entry = message_entries[0]
+            room = max(available - context_tokens, 1)
+            entry[1] = self.truncate(entry[1], room)
+            entry[2] = self.count(entry[1])
+            message_tokens = entry[2]
+            if entry[0] not in truncated:
+                truncated.append(entry[0])
+
+        report = {
+            "tokenizer": self.tokenizer,
+            "budget": self.budget,
+            "fixed_tokens": fixed_tokens,
+            "message_tokens": message_tokens,
+            "context_tokens": context_tokens,
+            "dropped_messages": dropped_messages,
+            "truncated_messages": truncated,
+            "dropped_context_items": dropped_context,
+        }
+        if dropped_messages or dropped_context or truncated:
+            logger.warning(
+                f"Prompt over budget: dropped {len(dropped_messages)} messages and "
+                f"{len(dropped_context)} context items, truncated {len(truncated)} messages"
+            )
+        return BudgetResult(
+            messages=[entry[1] for entry in message_entries],
+            context=kept_context,
+            report=report
+        )
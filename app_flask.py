@@ -1,11 +1,20 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 from flask_talisman import Talisman
 from flask_basicauth import BasicAuth
 import requests
 from lib.tasks_manager import TasksManager
 import json
 from ai_processor.message_processor import MessageProcessor
+from ai_processor import async_runtime
+from ai_processor.resilience import deadline_after, get_llm_caller
+from ai_processor.rate_limit import get_rate_limiter
 from ai_processor.data_store import DataStore
+from ai_processor.archive import ArchiveStore, Archiver
+from ai_processor.task_transfer import export_lines, import_lines
+from ai_processor.search_index import get_search_index
+from ai_processor.dedup_index import get_duplicate_index
+from ai_processor.storage import close_storage_backends
+import io
 from pathlib import Path
 import time
 import os
@@ -13,14 +22,17 @@ from dotenv import load_dotenv
 from lib.prompt_manager import PromptManager
 from models.prompt import Prompt
 from functools import wraps
+import hashlib
 import psutil
 import gc
 import logging
 from datetime import datetime
 import atexit
+import concurrent.futures
+import queue
 import signal
 from ai_processor.config import Config
-from lib.automation_manager import AutomationManager
+from lib.automation_manager import AutomationManager, check_max_concurrency
 
 # Load environment variables
 load_dotenv()
@@ -74,14 +86,26 @@ Talisman(app, content_security_policy=talisman_csp)
 # Initialize tasks manager
 tasks_manager = TasksManager()
 app.tasks_manager = tasks_manager  # Store reference in app for cleanup
+get_search_index(tasks_manager.storage).build_in_background()
+get_duplicate_index(tasks_manager.storage).build_in_background()
 
 # Initialize AI processor
 PROJECT_ROOT = Path(__file__).parent
 DATA_DIR = PROJECT_ROOT / "data"
 ai_processor = MessageProcessor(DataStore(storage_dir=str(DATA_DIR)))
 
+# Move finished items out of the working set in the background
+archive_store = ArchiveStore(DATA_DIR / "archive")
+archiver = Archiver(
+    ai_processor.data_store.storage,
+    archive_store,
+    after_days=Config.ARCHIVE_AFTER_DAYS,
+    interval=Config.ARCHIVE_INTERVAL
+)
+archiver.start()
+
 # Initialize prompt manager
-prompt_manager = PromptManager(Config.PROMPTS_DIR)
+prompt_manager = PromptManager(Config.PROMPTS_DIR, keywords=Config.get_template_keywords())
 
 # Initialize automation manager
 automation_manager = AutomationManager(PROJECT_ROOT / "data" / "automation", AGENT_HOST)
@@ -108,6 +132,26 @@ def log_memory_usage():
                 f"Percent: {process.memory_percent():.2f}%, "
                 f"Time: {datetime.now().isoformat()}")
 
+def conditional_json(version: str, build):
+    """
+    Respond with jsonify(build()) tagged with a strong ETag, or with 304.
+
+    The tag is derived from `version` (a token that changes whenever the
+    underlying data does) and the request URL, so a client repeating a
+    request with a matching If-None-Match gets 304 Not Modified without the
+    payload being built or encoded.
+    """
+    key = f"{request.full_path}\n{version}".encode('utf-8')
+    etag = hashlib.sha256(key).hexdigest()[:32]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Let browsers and the service worker keep the payload but always revalidate
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.before_request
 def before_request():
     """Log memory usage before each request"""
@@ -165,11 +209,149 @@ def debug():
 @app.route('/api/tasks')
 @require_auth
 def get_tasks():
-    """API endpoint to get all tasks"""
+    """
+    API endpoint to get all tasks.
+    
+    Query parameters:
+        type: Optional task type filter
+        limit: Page size (default 100)
+        cursor: Enables keyset pagination; pass an empty value for the first
+                page and the returned next_cursor for the following ones
+    """
     task_type = request.args.get('type')
-    tasks = tasks_manager.get_tasks(task_type)
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    # Read before the tasks so a change made meanwhile is re-sent, not missed
+    seq = tasks_manager.get_change_seq()
+    version = tasks_manager.get_version()
+    if 'cursor' in request.args:
+        def build_page():
+            page = tasks_manager.get_tasks_page(task_type, limit=limit, cursor=request.args.get('cursor') or None)
+            return {
+                'tasks': page['tasks'],
+                'next_cursor': page['next_cursor'],
+                'seq': seq,
+                'last_update': tasks_manager.get_last_update()
+            }
+        # The page is only read when the client's copy is stale
+        try:
+            return conditional_json(version, build_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    return conditional_json(version, lambda: {
+        'tasks': tasks_manager.get_tasks(task_type, limit=limit),
+        'seq': seq,
+        'last_update': tasks_manager.get_last_update()
+    })
+
+@app.route('/api/tasks/changes')
+@require_auth
+def get_task_changes():
+    """
+    API endpoint to get the tasks changed since a change sequence number.
+
+    Query parameters:
+        since: The 'seq' returned by the previous call (or by /api/tasks); 0 for everything
+        after: The 'after' returned by the previous call, if any
+        limit: Maximum number of changes (default 500)
+    """
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 500)), 1), 5000)
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+
+    result = tasks_manager.get_changes(since, limit=limit, after=request.args.get('after') or None)
+    result['last_update'] = tasks_manager.get_last_update()
+    return jsonify(result)
+
+@app.route('/api/tasks/search')
+@require_auth
+def search_tasks():
+    """
+    API endpoint for full-text search over tasks.
+
+    Query parameters:
+        q: Search words (Hebrew or English)
+        type: Optional task type filter
+        status: Optional status filter
+        limit: Maximum number of results (default 20)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    results = tasks_manager.search_tasks(
+        query,
+        task_type=request.args.get('type'),
+        status=request.args.get('status'),
+        limit=limit
+    )
+    return jsonify({'results': results})
+
+@app.route('/api/tasks/export')
+@require_auth
+def export_tasks():
+    """
+    API endpoint to download every task as NDJSON, streamed item by item.
+
+    Query parameters:
+        archive: Set to 1 to include archived tasks
+    """
+    archive = archive_store if request.args.get('archive') == '1' else None
+    response = Response(
+        stream_with_context(export_lines(tasks_manager.storage, archive)),
+        mimetype='application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename=tasks.ndjson'
+    return response
+
+@app.route('/api/tasks/import', methods=['POST'])
+@require_auth
+def import_tasks():
+    """API endpoint to load tasks from an NDJSON request body (as produced by the export)"""
+    try:
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8')
+        result = import_lines(tasks_manager.storage, lines)
+    except Exception as e:
+        return jsonify({'error': f'Import failed: {str(e)}'}), 500
     return jsonify({
-        'tasks': tasks,
+        'success': True,
+        'imported': result['imported'],
+        'errors': result['errors'][:100],
+        'last_update': tasks_manager.get_last_update()
+    })
+
+@app.route('/api/tasks/bulk', methods=['POST'])
+@require_auth
+def bulk_update_tasks():
+    """
+    API endpoint to update and delete many tasks at once.
+
+    Body: {"operations": [{"op": "update", "id": ..., "updates": {...}},
+                          {"op": "delete", "id": ...}]}
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    operations = (request.get_json() or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > 5000:
+        return jsonify({'error': 'At most 5000 operations per request'}), 400
+
+    results = tasks_manager.bulk_update(operations)
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'results': results,
         'last_update': tasks_manager.get_last_update()
     })
 
@@ -218,6 +400,43 @@ def delete_task(task_id):
     else:
         return jsonify({'error': 'Task not found or deletion failed'}), 404
 
+def parse_process_request(template: str):
+    """
+    Validate a /api/process request body and template.
+
+    Returns (messages, None) with each message's 'time' ("now" or a Unix
+    timestamp) moved to 'timestamp' as the AI processor expects, or
+    (None, error response) with status 400.
+    """
+    if not request.is_json:
+        return None, (jsonify({'error': 'Request must be JSON'}), 400)
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'messages' not in data:
+        return None, (jsonify({'error': 'No messages provided'}), 400)
+    
+    available_prompts = Config.list_available_prompts()
+    if template not in available_prompts:
+        return None, (jsonify({'error': f'Invalid template. Must be one of: {", ".join(available_prompts.keys())}'}), 400)
+    
+    messages = data['messages']
+    if not isinstance(messages, list) or not messages:
+        return None, (jsonify({'error': 'messages must be a non-empty list'}), 400)
+    now = int(time.time())
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict) or not isinstance(message.get('text'), str):
+            return None, (jsonify({'error': f'Message {index} must be an object with a text string'}), 400)
+        timestamp = message.get('time')
+        if timestamp == 'now':
+            timestamp = now
+        # bool is an int subclass but not a timestamp
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            return None, (jsonify({'error': f'Message {index} needs a time: a Unix timestamp or "now"'}), 400)
+    for message in messages:
+        timestamp = message.pop('time')
+        message['timestamp'] = now if timestamp == 'now' else timestamp
+    return messages, None
+
 @app.route('/api/process/<template>', methods=['POST'])
 @require_auth
 def process_messages(template):
@@ -239,30 +458,21 @@ def process_messages(template):
             ]
         }
     """
-    if not request.is_json:
-        return jsonify({'error': 'Request must be JSON'}), 400
-    
-    data = request.get_json()
-    if not data or 'messages' not in data:
-        return jsonify({'error': 'No messages provided'}), 400
-    
-    # Validate template type
-    available_prompts = Config.list_available_prompts()
-    if template not in available_prompts:
-        return jsonify({'error': f'Invalid template. Must be one of: {", ".join(available_prompts.keys())}'}), 400
+    messages, error = parse_process_request(template)
+    if error:
+        return error
     
     try:
-        # Process messages, replacing "now" with current timestamp and mapping time to timestamp
-        messages = data['messages']
-        for message in messages:
-            if message.get('time') == 'now':
-                message['time'] = int(time.time())
-            # Map 'time' to 'timestamp' for AI processor compatibility
-            message['timestamp'] = message.pop('time')
-        
-        # Process messages using AI processor
-        import asyncio
-        result = asyncio.run(ai_processor.process_messages(messages, prompt_type=template))
+        # Process messages on the shared event loop; the LLM call, retries
+        # included, must finish within the request timeout
+        result = async_runtime.run_coroutine(
+            ai_processor.process_messages(
+                messages,
+                prompt_type=template,
+                deadline=deadline_after(Config.PROCESS_REQUEST_TIMEOUT)
+            ),
+            timeout=Config.PROCESS_REQUEST_TIMEOUT + 30
+        )
         
         # Return the full processing result
         return jsonify({
@@ -270,12 +480,60 @@ def process_messages(template):
             'result': result,
             'template': template
         })
+    except concurrent.futures.TimeoutError:
+        return jsonify({'error': 'Processing did not finish within the request timeout'}), 504
     except Exception as e:
         return jsonify({
             'error': str(e),
             'type': type(e).__name__
         }), 500
 
+@app.route('/api/process/<template>/stream', methods=['POST'])
+@require_auth
+def process_messages_stream(template):
+    """
+    Process messages like /api/process/<template>, streaming the response as
+    server-sent events: an "item" event for each todo, event or item as soon
+    as it is complete and saved, then a "result" event with the full result.
+    Comment lines keep the connection alive meanwhile. Processing carries on,
+    saving its items, if the client disconnects.
+    """
+    messages, error = parse_process_request(template)
+    if error:
+        return error
+    
+    # Items are saved and queued on the shared loop's thread, and sent from here
+    events = queue.Queue()
+    future = async_runtime.submit(ai_processor.process_messages(
+        messages,
+        prompt_type=template,
+        deadline=deadline_after(Config.PROCESS_REQUEST_TIMEOUT),
+        on_item=lambda prompt_type, event: events.put(('item', event)),
+        stream=True
+    ))
+    future.add_done_callback(lambda _: events.put(None))
+    
+    def server_sent_events():
+        while True:
+            try:
+                entry = events.get(timeout=15)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if entry is None:
+                break
+            yield f"event: {entry[0]}\ndata: {json.dumps(entry[1], ensure_ascii=False)}\n\n"
+        try:
+            payload = ('result', {'success': True, 'result': future.result(), 'template': template})
+        except Exception as e:
+            payload = ('error', {'error': str(e), 'type': type(e).__name__})
+        yield f"event: {payload[0]}\ndata: {json.dumps(payload[1], ensure_ascii=False)}\n\n"
+    
+    response = Response(stream_with_context(server_sent_events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/messages/get/<groupid>', methods=['GET'])
 @require_auth
 def get_messages(groupid):
@@ -346,13 +604,59 @@ def peek_messages(groupid):
             'type': type(e).__name__
         }), 500
 
+@app.route('/api/archive')
+@require_auth
+def list_archived_tasks():
+    """
+    API endpoint to query archived tasks, newest month first.
+
+    Query parameters:
+        type: Optional task type filter
+        status: Optional status filter
+        from, to: Optional month range (YYYY-MM, inclusive)
+        limit: Page size (default 100)
+        offset: Number of items to skip
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    items = archive_store.query(
+        item_type=request.args.get('type'),
+        status=request.args.get('status'),
+        month_from=request.args.get('from'),
+        month_to=request.args.get('to'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'items': items, 'months': archive_store.months()})
+
+@app.route('/api/archive/<item_id>')
+@require_auth
+def get_archived_task(item_id):
+    """API endpoint to get one archived task"""
+    item = archive_store.get(item_id)
+    if not item:
+        return jsonify({'error': 'Task not found in archive'}), 404
+    return jsonify(item)
+
+@app.route('/api/archive/run', methods=['POST'])
+@require_auth
+def run_archiver():
+    """API endpoint to archive due tasks now instead of waiting for the next run"""
+    try:
+        return jsonify({'success': True, 'archived': archiver.run_once()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/prompts', methods=['GET'])
 @require_auth
 def list_prompts():
     """Get all available prompts"""
-    prompts = prompt_manager.get_all_prompts()
-    return jsonify({
-        'prompts': [p.to_dict() for p in prompts]
+    return conditional_json(prompt_manager.get_version(), lambda: {
+        'prompts': [dict(p.to_dict(), version=p.version) for p in prompt_manager.get_all_prompts()]
     })
 
 @app.route('/api/prompts/<name>', methods=['GET'])
@@ -362,7 +666,25 @@ def get_prompt(name):
     prompt = prompt_manager.get_prompt(name)
     if not prompt:
         return jsonify({'error': 'Prompt not found'}), 404
-    return jsonify(prompt.to_dict())
+    return jsonify(dict(prompt.to_dict(), version=prompt.version))
+
+@app.route('/api/prompts/<name>/versions', methods=['GET'])
+@require_auth
+def list_prompt_versions(name):
+    """Get the saved versions of a prompt, newest first"""
+    versions = prompt_manager.list_versions(name)
+    if versions is None:
+        return jsonify({'error': 'Prompt not found'}), 404
+    return jsonify({'versions': versions})
+
+@app.route('/api/prompts/<name>/versions/<version>', methods=['GET'])
+@require_auth
+def get_prompt_version(name, version):
+    """Get a saved version of a prompt by its content hash"""
+    prompt = prompt_manager.get_prompt_version(name, version)
+    if not prompt:
+        return jsonify({'error': 'Prompt version not found'}), 404
+    return jsonify(dict(prompt.to_dict(), version=prompt.version))
 
 @app.route('/api/prompts', methods=['POST'])
 @require_auth
@@ -375,7 +697,7 @@ def create_prompt():
     try:
         prompt = Prompt.from_dict(data)
         if prompt_manager.save_prompt(prompt):
-            return jsonify(prompt.to_dict()), 201
+            return jsonify(dict(prompt.to_dict(), version=prompt.version)), 201
         return jsonify({'error': 'Failed to save prompt'}), 500
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
@@ -395,7 +717,7 @@ def update_prompt(name):
     try:
         prompt = Prompt.from_dict(data)
         if prompt_manager.save_prompt(prompt):
-            return jsonify(prompt.to_dict())
+            return jsonify(dict(prompt.to_dict(), version=prompt.version))
         return jsonify({'error': 'Failed to update prompt'}), 500
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
@@ -437,14 +759,39 @@ def memory_debug():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/debug/llm-cache')
+@require_auth
+def llm_cache_debug():
+    """API endpoint to get LLM response cache counters"""
+    if ai_processor.response_cache is None:
+        return jsonify({'enabled': False})
+    try:
+        return jsonify(dict(ai_processor.response_cache.stats(), enabled=True))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/debug/llm-cache', methods=['DELETE'])
+@require_auth
+def clear_llm_cache():
+    """API endpoint to drop every cached LLM response"""
+    if ai_processor.response_cache is not None:
+        ai_processor.response_cache.clear()
+    return jsonify({'success': True})
+
+@app.route('/api/debug/llm-calls')
+@require_auth
+def llm_calls_debug():
+    """API endpoint to get LLM call counters, latency percentiles, circuit state and rate limits"""
+    return jsonify(dict(get_llm_caller().stats(), rate_limits=get_rate_limiter().stats()))
+
 # Automation Management API Endpoints
 @app.route('/api/automation')
 @require_auth
 def list_automations():
     """API endpoint to list all automation configurations"""
-    try:
+    def build():
         configs = automation_manager.load_configurations()
-        return jsonify({
+        return {
             'automations': {
                 automation_id: {
                     'automation_id': config.automation_id,
@@ -456,11 +803,16 @@ def list_automations():
                     'prompts': config.prompts,
                     'get_msg_minutes': config.get_msg_minutes,
                     'min_msg_count': config.min_msg_count,
-                    'process_max_time': config.process_max_time
+                    'process_max_time': config.process_max_time,
+                    'max_concurrency': config.max_concurrency,
+                    'combined_prompts': config.combined_prompts
                 }
                 for automation_id, config in configs.items()
             }
-        })
+        }
+
+    try:
+        return conditional_json(automation_manager.get_config_version(), build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -484,7 +836,9 @@ def get_automation(automation_id):
             'prompts': config.prompts,
             'get_msg_minutes': config.get_msg_minutes,
             'min_msg_count': config.min_msg_count,
-            'process_max_time': config.process_max_time
+            'process_max_time': config.process_max_time,
+            'max_concurrency': config.max_concurrency,
+            'combined_prompts': config.combined_prompts
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -512,7 +866,9 @@ def create_automation():
             agent_peek_only=data.get('agent_peek_only', False),
             get_msg_minutes=data.get('get_msg_minutes', 5),
             min_msg_count=data.get('min_msg_count', 1),
-            process_max_time=data.get('process_max_time', 30)
+            process_max_time=data.get('process_max_time', 30),
+            max_concurrency=data.get('max_concurrency', 3),
+            combined_prompts=data.get('combined_prompts', False)
         )
         
         return jsonify({
@@ -520,6 +876,8 @@ def create_automation():
             'automation_id': config.automation_id,
             'message': 'Automation created successfully'
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -536,6 +894,11 @@ def update_automation(automation_id):
         
         if automation_id not in configs:
             return jsonify({'error': 'Automation not found'}), 404
+        if 'max_concurrency' in data:
+            try:
+                check_max_concurrency(data['max_concurrency'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
         # Update the configuration
         config = configs[automation_id]
@@ -684,6 +1047,9 @@ def cleanup_resources():
     """Cleanup all resources when the application exits"""
     if hasattr(app, 'tasks_manager'):
         app.tasks_manager.cleanup()
+    archiver.stop()
+    close_storage_backends()
+    async_runtime.shutdown()
     # Force garbage collection
     gc.collect()
 
@@ -694,8 +1060,9 @@ signal.signal(signal.SIGTERM, lambda s, f: cleanup_resources())
 @app.teardown_appcontext
 def cleanup_context(exception=None):
     """Cleanup resources when the application context is torn down"""
-    if hasattr(app, 'tasks_manager'):
-        app.tasks_manager.cleanup()
+    # The tasks watcher must outlive individual requests - get_tasks serves
+    # from memory and relies on it to pick up changes. It is stopped in
+    # cleanup_resources at exit.
     # Force garbage collection after each request
     gc.collect()
 
@@ -11,9 +11,18 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 import requests
 from ai_processor.message_processor import MessageProcessor
+from ai_processor.async_runtime import run_coroutine
+from ai_processor.resilience import deadline_after
 from ai_processor.data_store import DataStore
 from ai_processor.config import Config
 
+def check_max_concurrency(value: Any) -> int:
+    """A valid max_concurrency (an integer of at least 1); raises ValueError otherwise."""
+    # bool is an int subclass, but True is not a concurrency
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"max_concurrency must be an integer of at least 1, got {value!r}")
+    return value
+
 @dataclass
 class AutomationConfig:
     """Configuration for an automation job."""
@@ -27,6 +36,13 @@ class AutomationConfig:
     get_msg_minutes: int
     min_msg_count: int
     process_max_time: int
+    # Prompts run concurrently on one batch of messages
+    max_concurrency: int = 3
+    # Send all prompts in one request instead of one request per prompt
+    combined_prompts: bool = False
+    
+    def __post_init__(self):
+        check_max_concurrency(self.max_concurrency)
 
 @dataclass
 class AutomationLog:
@@ -74,9 +90,27 @@ class AutomationManager:
         self.automation_configs: Dict[str, AutomationConfig] = {}
         self.automation_logs: Dict[str, List[AutomationLog]] = {}
         
+        # Bumped by every change to the configurations; the instance token
+        # keeps versions from before a restart from matching
+        self._config_generation = 0
+        self._config_token = uuid.uuid4().hex
+        self._config_lock = threading.Lock()
+        
         # Setup logging
         self.logger = logging.getLogger(__name__)
         
+    def _bump_config_generation(self):
+        with self._config_lock:
+            self._config_generation += 1
+    
+    def get_config_version(self) -> str:
+        """
+        Token that changes whenever a configuration is saved or deleted, or a
+        reload finds the files changed. Nothing is read from disk.
+        """
+        with self._config_lock:
+            return f"{self._config_token}:{self._config_generation}"
+
     def load_configurations(self) -> Dict[str, AutomationConfig]:
         """Load all automation configurations from JSON files."""
         configs = {}
@@ -91,6 +125,9 @@ class AutomationManager:
             except Exception as e:
                 self.logger.error(f"Failed to load config {config_file.name}: {e}")
                 
+        if configs != self.automation_configs:
+            # Edited on disk since the last load
+            self._bump_config_generation()
         self.automation_configs = configs
         return configs
     
@@ -100,6 +137,7 @@ class AutomationManager:
             config_file = self.automation_dir / f"{config.automation_id}.json"
             with open(config_file, 'w', encoding='utf-8') as f:
                 json.dump(asdict(config), f, indent=2, ensure_ascii=False)
+            self._bump_config_generation()
             return True
         except Exception as e:
             self.logger.error(f"Failed to save config {config.automation_id}: {e}")
@@ -118,7 +156,9 @@ class AutomationManager:
             prompts=prompts,
             get_msg_minutes=kwargs.get('get_msg_minutes', 5),
             min_msg_count=kwargs.get('min_msg_count', 1),
-            process_max_time=kwargs.get('process_max_time', 30)
+            process_max_time=kwargs.get('process_max_time', 30),
+            max_concurrency=kwargs.get('max_concurrency', 3),
+            combined_prompts=kwargs.get('combined_prompts', False)
         )
         
         if self.save_configuration(config):
@@ -142,6 +182,7 @@ class AutomationManager:
         if automation_id in self.automation_logs:
             del self.automation_logs[automation_id]
             
+        self._bump_config_generation()
         self.log_activity(automation_id, "deleted", "Configuration deleted")
         return True
     
@@ -173,7 +214,10 @@ class AutomationManager:
         self.logger.info(f"[AUTOMATION] [REQUEST] POST {url}")
         self.logger.info(f"[AUTOMATION] [REQUEST] Payload: {payload}")
         try:
-            response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'}, timeout=5)
+            # Blocking HTTP runs on a worker thread so the shared loop keeps going
+            response = await asyncio.to_thread(
+                requests.post, url, json=payload, headers={'Content-Type': 'application/json'}, timeout=5
+            )
             self.logger.info(f"[AUTOMATION] [RESPONSE] Status: {response.status_code}")
             self.logger.info(f"[AUTOMATION] [RESPONSE] Body: {response.text}")
             if response.status_code == 200:
@@ -202,7 +246,9 @@ class AutomationManager:
         payload = {'token': os.getenv('API_TOKEN')}
         self.logger.info(f"[AUTOMATION] [REQUEST] Payload: {payload}")
         try:
-            response = requests.post(url, json=payload, headers={'Content-Type': 'application/json'}, timeout=10)
+            response = await asyncio.to_thread(
+                requests.post, url, json=payload, headers={'Content-Type': 'application/json'}, timeout=10
+            )
             self.logger.info(f"[AUTOMATION] [RESPONSE] Status: {response.status_code}")
             self.logger.info(f"[AUTOMATION] [RESPONSE] Body: {response.text}")
             if response.status_code == 200:
@@ -237,7 +283,7 @@ class AutomationManager:
                     break
                 
                 # Check message count
-                message_count = asyncio.run(self.check_messages_count(current_config.agent_group))
+                message_count = run_coroutine(self.check_messages_count(current_config.agent_group))
                 consecutive_checks += 1
                 self.logger.info(f"[AUTOMATION] {automation_id} | Message count: {message_count} | Min required: {current_config.min_msg_count}")
                 self.log_activity(automation_id, "check", f"Found {message_count} messages", {"message_count": message_count, "min_required": current_config.min_msg_count})
@@ -251,20 +297,36 @@ class AutomationManager:
                     self.log_activity(automation_id, "timeout", f"Processing due to timeout ({consecutive_checks * current_config.get_msg_minutes} minutes)")
                 
                 if should_process:
-                    messages = asyncio.run(self.get_messages(current_config.agent_group, current_config.agent_peek_only))
+                    messages = run_coroutine(self.get_messages(current_config.agent_group, current_config.agent_peek_only))
                     self.logger.info(f"[AUTOMATION] {automation_id} | Fetched {len(messages)} messages for processing.")
                     if messages:
                         self.log_activity(automation_id, "process", f"Processing {len(messages)} messages", {"messages": messages})
-                        for prompt_type in current_config.prompts:
-                            try:
-                                self.logger.info(f"[AUTOMATION] {automation_id} | Running prompt: {prompt_type} | Messages: {len(messages)}")
-                                result = asyncio.run(self.ai_processor.process_messages(messages, prompt_type=prompt_type))
-                                todos = result.get('todos', [])
-                                self.logger.info(f"[AUTOMATION] {automation_id} | Prompt: {prompt_type} | Generated {len(todos)} items.")
-                                self.log_activity(automation_id, "processed", f"Processed with {prompt_type}", {"prompt_type": prompt_type, "result_count": len(todos), "result": result})
-                            except Exception as e:
-                                self.logger.error(f"[AUTOMATION] {automation_id} | Error running prompt {prompt_type}: {e}")
-                                self.log_activity(automation_id, "error", f"Failed to process with {prompt_type}: {str(e)}")
+                        def log_result(prompt_type: str, result: Dict[str, Any]):
+                            if 'error' in result:
+                                self.logger.error(f"[AUTOMATION] {automation_id} | Error running prompt {prompt_type}: {result['error']}")
+                                self.log_activity(automation_id, "error", f"Failed to process with {prompt_type}: {result['error']}")
+                                return
+                            todos = result.get('todos', [])
+                            self.logger.info(f"[AUTOMATION] {automation_id} | Prompt: {prompt_type} | Generated {len(todos)} items.")
+                            self.log_activity(automation_id, "processed", f"Processed with {prompt_type}", {"prompt_type": prompt_type, "result_count": len(todos), "result": result})
+                        
+                        self.logger.info(f"[AUTOMATION] {automation_id} | Running prompts: {current_config.prompts} | Messages: {len(messages)}")
+                        # LLM calls (retries included) must finish within process_max_time,
+                        # so a stuck provider cannot hold up the automation loop
+                        time_limit = current_config.process_max_time * 60
+                        try:
+                            # Prompts run concurrently; each result is saved and logged as it completes
+                            run_coroutine(self.ai_processor.process_prompts(
+                                messages,
+                                current_config.prompts,
+                                max_concurrency=current_config.max_concurrency,
+                                on_result=log_result,
+                                combined=current_config.combined_prompts,
+                                deadline=deadline_after(time_limit)
+                            ), timeout=time_limit + 60)
+                        except Exception as e:
+                            self.logger.error(f"[AUTOMATION] {automation_id} | Error running prompts: {e}")
+                            self.log_activity(automation_id, "error", f"Failed to process prompts: {str(e)}")
                         last_process_time = datetime.now().isoformat()
                         consecutive_checks = 0
                     else:
@@ -1,49 +1,168 @@
 from pathlib import Path
 import json
-from typing import Dict, List, Optional
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from models.prompt import Prompt
+from lib.prompt_template import Keywords, compile_template
+
+# Files on disk are re-checked at most this often; edits made through a
+# PromptManager are seen immediately
+PROMPT_RECHECK_INTERVAL = float(os.getenv("PROMPT_RECHECK_INTERVAL", "1.0"))
+
+# Names that can be a directory under the versions directory; anything else
+# (e.g. "..") could point elsewhere on disk
+PROMPT_NAME_PATTERN = re.compile(r"[\w-]+")
+
+class PromptRegistry:
+    """
+    Parsed prompts of one directory, shared by every PromptManager using it.
+
+    Each file is parsed once and kept with its size and mtime; a refresh only
+    stats the directory and re-reads files whose metadata changed. Lookups
+    between refreshes are dictionary reads.
+    """
 
-class PromptManager:
     def __init__(self, prompts_dir: Path):
+        self.prompts_dir = prompts_dir
+        self._lock = threading.Lock()
+        # file name -> (size, mtime_ns, prompt or None if invalid)
+        self._files: Dict[str, Tuple[int, int, Optional[Prompt]]] = {}
+        self._prompts: Dict[str, Prompt] = {}
+        self._version = ""
+        self._checked_at: Optional[float] = None
+
+    def invalidate(self):
+        """Re-check the directory on the next lookup."""
+        with self._lock:
+            self._checked_at = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        with os.scandir(self.prompts_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json') and not entry.name.startswith('_'):
+                    stat = entry.stat()
+                    found[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return found
+
+    def _parse(self, file_name: str) -> Optional[Prompt]:
+        try:
+            with open(self.prompts_dir / file_name, 'r', encoding='utf-8') as f:
+                return Prompt.from_dict(json.load(f))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Warning: Skipping invalid prompt file {file_name}: {str(e)}")
+        except OSError:
+            pass  # Removed since the scan
+        return None
+
+    def refresh(self, force: bool = False):
+        """Pick up changed prompt files if the last check is older than the recheck interval."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < PROMPT_RECHECK_INTERVAL:
+                return
+            files = {}
+            changed = False
+            for file_name, (size, mtime_ns) in self._scan().items():
+                cached = self._files.get(file_name)
+                if cached is not None and cached[0] == size and cached[1] == mtime_ns:
+                    files[file_name] = cached
+                else:
+                    files[file_name] = (size, mtime_ns, self._parse(file_name))
+                    changed = True
+            if changed or files.keys() != self._files.keys():
+                self._files = files
+                self._prompts = {
+                    file_name[:-len('.json')]: prompt
+                    for file_name, (_, _, prompt) in sorted(files.items())
+                    if prompt is not None
+                }
+                self._version = "|".join(
+                    f"{file_name}:{size}:{mtime_ns}" for file_name, (size, mtime_ns, _) in sorted(files.items())
+                )
+            self._checked_at = now
+
+    def snapshot(self) -> Tuple[str, Dict[str, Prompt]]:
+        """The current version token and valid prompts keyed by file name (without .json)."""
+        self.refresh()
+        with self._lock:
+            return self._version, self._prompts
+
+    def version(self) -> str:
+        return self.snapshot()[0]
+
+    def prompts(self) -> Dict[str, Prompt]:
+        return self.snapshot()[1]
+
+_registries: Dict[Path, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+def get_prompt_registry(prompts_dir: Path) -> PromptRegistry:
+    """The shared PromptRegistry of a prompts directory."""
+    key = Path(prompts_dir).resolve()
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = PromptRegistry(Path(prompts_dir))
+            _registries[key] = registry
+        return registry
+
+class PromptManager:
+    def __init__(self, prompts_dir: Path, keywords: Optional[Keywords] = None):
         self.prompts_dir = prompts_dir
         self.prompts_dir.mkdir(parents=True, exist_ok=True)
+        self.registry = get_prompt_registry(self.prompts_dir)
+        # Every saved version of a prompt, as _versions/<name>/<version>.json
+        self.versions_dir = self.prompts_dir / "_versions"
+        # Template keywords that saved prompts are checked against, if given
+        self.keywords = keywords
     
+    def get_version(self) -> str:
+        """
+        Token that changes whenever a prompt file is added, removed or edited.
+
+        Only file metadata is read (name, size and mtime), not the prompts.
+        """
+        return self.registry.version()
+
     def get_all_prompts(self) -> List[Prompt]:
-        prompts = []
-        for prompt_file in self.prompts_dir.glob("[!_]*.json"):
-            try:
-                with open(prompt_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    prompts.append(Prompt.from_dict(data))
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Warning: Skipping invalid prompt file {prompt_file.name}: {str(e)}")
-                continue
-        return prompts
+        return list(self.registry.prompts().values())
     
     def get_prompt(self, name: str) -> Optional[Prompt]:
         if name.startswith('_'):
             return None
-            
-        prompt_file = self.prompts_dir / f"{name}.json"
-        if not prompt_file.exists():
-            return None
-            
-        try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return Prompt.from_dict(data)
-        except (json.JSONDecodeError, ValueError) as e:
-            print(f"Warning: Invalid prompt file {prompt_file.name}: {str(e)}")
-            return None
+        return self.registry.prompts().get(name)
     
     def save_prompt(self, prompt: Prompt) -> bool:
+        """
+        Write a prompt to its file.
+
+        Raises TemplateError (a ValueError) if the template uses undeclared
+        placeholders, so bad templates are rejected here rather than when
+        messages are processed.
+        """
         if prompt.name.startswith('_'):
             return False
+        if self.keywords is not None:
+            compile_template(prompt.template, self.keywords)
             
         try:
+            # The version being replaced is kept too, even if it was never
+            # saved through here (e.g. shipped with the app or edited by hand)
+            current = self.registry.prompts().get(prompt.name)
+            if current is not None:
+                self._store_version(current)
+            self._store_version(prompt)
             prompt_file = self.prompts_dir / f"{prompt.name}.json"
-            with open(prompt_file, 'w', encoding='utf-8') as f:
+            tmp_file = self.prompts_dir / f"_{prompt.name}.json.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(prompt.to_dict(), f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, prompt_file)
+            self.registry.invalidate()
             return True
         except Exception:
             return False
@@ -55,5 +174,52 @@ class PromptManager:
         prompt_file = self.prompts_dir / f"{name}.json"
         if prompt_file.exists():
             prompt_file.unlink()
+            self.registry.invalidate()
             return True
-        return False 
\ No newline at end of file
+        return False
+    
+    def _store_version(self, prompt: Prompt):
+        version_file = self.versions_dir / prompt.name / f"{prompt.version}.json"
+        if version_file.exists():
+            return
+        version_file.parent.mkdir(parents=True, exist_ok=True)
+        data = dict(prompt.to_dict(), version=prompt.version, saved_at=datetime.now().isoformat())
+        tmp_file = version_file.with_name(f"{version_file.name}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, version_file)
+    
+    @staticmethod
+    def _has_versions_dir(name: str) -> bool:
+        """Whether a prompt name from a request can name a versions directory."""
+        return PROMPT_NAME_PATTERN.fullmatch(name) is not None and not name.startswith('_')
+    
+    def list_versions(self, name: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Saved versions of a prompt (version hash and save time), newest first.
+
+        Returns None for a name that no prompt can have.
+        """
+        if not self._has_versions_dir(name):
+            return None
+        versions = []
+        for version_file in (self.versions_dir / name).glob("*.json"):
+            try:
+                with open(version_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            versions.append({'version': version_file.stem, 'saved_at': data.get('saved_at', '')})
+        versions.sort(key=lambda entry: entry['saved_at'], reverse=True)
+        return versions
+    
+    def get_prompt_version(self, name: str, version: str) -> Optional[Prompt]:
+        """A saved version of a prompt by its content hash."""
+        if not self._has_versions_dir(name) or not version.isalnum():
+            return None
+        version_file = self.versions_dir / name / f"{version}.json"
+        try:
+            with open(version_file, 'r', encoding='utf-8') as f:
+                return Prompt.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError, ValueError):
+            return None
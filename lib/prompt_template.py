@@ -0,0 +1,97 @@
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# {keyword} or {keyword[key]}; other braces (JSON examples) are literal text
+_PLACEHOLDER = re.compile(r"\{(\w+)(?:\[(\w+)\])?\}")
+
+# keyword -> allowed keys; None for keywords used without a key
+Keywords = Dict[str, Optional[Set[str]]]
+
+class TemplateError(ValueError):
+    """A prompt template uses placeholders that are not declared."""
+
+def load_keywords(keywords_file: Path, allowed_keys: Optional[Dict[str, Iterable[str]]] = None) -> Keywords:
+    """
+    Template keywords declared in a _keywords.json file.
+
+    A keyword whose documented format has a [key] part accepts the keys listed
+    in its available_keys, or exactly those given for it in `allowed_keys`
+    (the keys its value will actually have at render time).
+    """
+    with open(keywords_file, 'r', encoding='utf-8') as f:
+        declared = json.load(f).get('keywords', {})
+    keywords: Keywords = {}
+    for name, spec in declared.items():
+        if '[' in spec.get('format', ''):
+            keywords[name] = set(spec.get('available_keys', {}))
+        else:
+            keywords[name] = None
+    for name, keys in (allowed_keys or {}).items():
+        if keywords.get(name) is not None:
+            keywords[name] = set(keys)
+    return keywords
+
+class CompiledTemplate:
+    """
+    A template split once into literal text and placeholder slots.
+
+    Rendering fills the slots and joins the parts, producing the same text as
+    the old escape-then-str.format path.
+    """
+
+    __slots__ = ("template", "version", "_parts", "_slots")
+
+    def __init__(
+        self,
+        template: str,
+        parts: List[str],
+        slots: List[Tuple[int, str, Optional[str]]],
+        version: Optional[str] = None
+    ):
+        self.template = template
+        # Content hash of the prompt the template came from, if known
+        self.version = version
+        self._parts = parts
+        self._slots = slots
+
+    @property
+    def placeholders(self) -> List[Tuple[str, Optional[str]]]:
+        return [(name, key) for _, name, key in self._slots]
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """The template with every placeholder replaced; KeyError if a value is missing."""
+        parts = list(self._parts)
+        for position, name, key in self._slots:
+            value = values[name] if key is None else values[name][key]
+            parts[position] = format(value)
+        return "".join(parts)
+
+def compile_template(template: str, keywords: Optional[Keywords] = None, version: Optional[str] = None) -> CompiledTemplate:
+    """
+    Compile a template, checking its placeholders against `keywords` if given.
+
+    Raises TemplateError naming every undeclared keyword or key.
+    """
+    parts: List[str] = []
+    slots: List[Tuple[int, str, Optional[str]]] = []
+    problems: List[str] = []
+    last = 0
+    for match in _PLACEHOLDER.finditer(template):
+        name, key = match.group(1), match.group(2)
+        if keywords is not None:
+            if name not in keywords:
+                problems.append(f"unknown placeholder {match.group(0)}")
+            elif (key is None) != (keywords[name] is None):
+                problems.append(f"{match.group(0)}: {name} " + ("takes no key" if key is not None else "needs a [key]"))
+            elif key is not None and key not in keywords[name]:
+                problems.append(f"unknown {name} key in {match.group(0)}")
+        parts.append(template[last:match.start()])
+        slots.append((len(parts), name, key))
+        parts.append("")
+        last = match.end()
+    parts.append(template[last:])
+    if problems:
+        raise TemplateError("Invalid template: " + "; ".join(dict.fromkeys(problems)))
+    return CompiledTemplate(template, parts, slots, version)
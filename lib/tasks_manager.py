@@ -1,11 +1,14 @@
+import bisect
 import os
-import json
 import time
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from dotenv import load_dotenv
+from ai_processor.storage import StoredItem, get_storage_backend, is_valid_item_id
+from ai_processor.item_index import get_item_index
+from ai_processor.search_index import get_search_index
 
 # Load environment variables from .env file if it exists
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -13,6 +16,16 @@ ENV_PATH = PROJECT_ROOT / '.env'
 if ENV_PATH.exists():
     load_dotenv(ENV_PATH)
 
+@dataclass
+class TaskIndexEntry:
+    """A loaded task together with where it lives in storage."""
+    path: Optional[Path]
+    type: Optional[str]
+    status: Optional[str]
+    mtime: float
+    task: dict
+    seq: int = 0
+
 class TasksManager:
     def __init__(self, data_dir: str = None):
         # Use STORAGE_DIR from environment if available, otherwise use default
@@ -21,93 +34,107 @@ class TasksManager:
         # Create the data directory and tasks subdirectory if they don't exist
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.tasks_dir.mkdir(parents=True, exist_ok=True)
-            
+        # Shared with any DataStore on the same directory
+        self.storage = get_storage_backend(self.data_dir)
+
         # Initialize with supported task types
         self.supported_types = ["todo", "general", "calendar"]
-        self.tasks: Dict[str, List[dict]] = {
-            task_type: [] for task_type in self.supported_types
-        }
         self.last_update = 0
-        self.observer = None
-        self._setup_file_watcher()
+        # Single in-memory collection of all tasks keyed by id, kept current
+        # by storage notifications (our writes, DataStore writes and, for the
+        # file backend, changes picked up by its watcher)
+        self._index: Dict[str, TaskIndexEntry] = {}
+        self._sorted_cache: Dict[Optional[str], List[dict]] = {}
+        # (change seq, task id) of every task, sorted, for the change feed
+        self._by_seq: List[tuple] = []
+        self._index_lock = threading.RLock()
         self.refresh()
+        self.storage.add_listener(self._on_storage_change)
+        self.storage.start_watching()
 
-    def _setup_file_watcher(self):
-        """Setup file system watcher to detect changes in data directory"""
-        if self.observer is not None:
-            self.cleanup()
-            
-        class TasksEventHandler(FileSystemEventHandler):
-            def __init__(self, manager):
-                self.manager = manager
-                self.last_refresh = 0
-                self.refresh_cooldown = 1  # Minimum seconds between refreshes
-
-            def on_any_event(self, event):
-                if not event.is_directory and event.src_path.endswith('.json'):
-                    current_time = time.time()
-                    if current_time - self.last_refresh >= self.refresh_cooldown:
-                        self.manager.refresh()
-                        self.last_refresh = current_time
-
-        self.observer = Observer()
-        self.observer.schedule(
-            TasksEventHandler(self),
-            str(self.tasks_dir),
-            recursive=False  # Only watch the tasks directory, not subdirectories
-        )
-        self.observer.start()
+    def _on_storage_change(self, event: str, task_id: str, stored: Optional[StoredItem]):
+        """Apply a change reported by the shared storage backend"""
+        if event == "put":
+            self._index_stored(stored)
+        elif event == "delete":
+            self._unindex_id(task_id)
+        elif event == "reload":
+            self.refresh()
+            return
+        self.last_update = time.time()
 
-    def _load_tasks_from_folder(self, task_type: str, limit: int = 100, offset: int = 0) -> List[dict]:
-        """Load tasks of a specific type from the tasks folder with pagination"""
-        tasks = []
-        
-        if not self.tasks_dir.exists():
-            return tasks
+    def _index_stored(self, stored: StoredItem):
+        """Record (or replace) a stored task in the in-memory collection"""
+        task = stored.item
+        task_id = task.get('id')
+        if not task_id:
+            return
+        with self._index_lock:
+            self._drop_seq(self._index.get(task_id))
+            self._index[task_id] = TaskIndexEntry(
+                path=stored.path,
+                type=task.get('type'),
+                status=task.get('status'),
+                mtime=stored.mtime,
+                task=task,
+                seq=stored.seq
+            )
+            bisect.insort(self._by_seq, (stored.seq, task_id))
+            self._sorted_cache.clear()
+
+    def _unindex_id(self, task_id: str) -> bool:
+        """Drop a task from the collection by id"""
+        with self._index_lock:
+            entry = self._index.pop(task_id, None)
+            if entry is None:
+                return False
+            self._drop_seq(entry)
+            self._sorted_cache.clear()
+            return True
+
+    def _drop_seq(self, entry: Optional[TaskIndexEntry]):
+        """Remove an entry from the change-sequence order"""
+        if entry is None:
+            return
+        key = (entry.seq, entry.task.get('id'))
+        pos = bisect.bisect_left(self._by_seq, key)
+        if pos < len(self._by_seq) and self._by_seq[pos] == key:
+            del self._by_seq[pos]
+
+    def _sync_external_changes(self):
+        """Reload if another process wrote to a backend we cannot watch"""
+        self.storage.check_external_changes()
 
-        # Get all JSON files and sort by modification time (newest first)
-        files = sorted(self.tasks_dir.glob("*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
-        
-        for file_path in files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    task = json.load(f)
-                    # Only include tasks of the specified type
-                    if task.get('type') == task_type:
-                        tasks.append(task)
-            except Exception as e:
-                print(f"Error loading task from {file_path}: {e}")
-        
-        # Apply pagination
-        start = offset
-        end = offset + limit
-        return tasks[start:end]
-
-    def _find_task_file(self, task_id: str) -> Optional[Path]:
-        """Find the file path for a given task ID in the tasks folder"""
-        if not self.tasks_dir.exists():
+    def _find_task(self, task_id: str) -> Optional[TaskIndexEntry]:
+        """Find a task by ID using the in-memory index"""
+        self._sync_external_changes()
+        with self._index_lock:
+            entry = self._index.get(task_id)
+        if entry is not None:
+            if entry.path is None or entry.path.exists():
+                return entry
+            self._unindex_id(task_id)
+
+        # Pick up items written elsewhere before we were notified about them
+        try:
+            stored = self.storage.load(task_id)
+        except ValueError:
+            return None  # Not a storable id (e.g. a path), so no such task
+        if stored is None or stored.item.get('id') != task_id:
             return None
-            
-        for file_path in self.tasks_dir.glob("*.json"):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    task = json.load(f)
-                    if task.get('id') == task_id:
-                        return file_path
-            except Exception as e:
-                print(f"Error reading task file {file_path}: {e}")
-        return None
+        self._index_stored(stored)
+        with self._index_lock:
+            return self._index.get(task_id)
 
     def update_task(self, task_id: str, updates: dict) -> bool:
-        """Update task properties in the file"""
-        file_path = self._find_task_file(task_id)
-        if not file_path:
+        """Update task properties in storage"""
+        entry = self._find_task(task_id)
+        if not entry:
             return False
 
         try:
-            # Read current task data
-            with open(file_path, 'r', encoding='utf-8') as f:
-                task = json.load(f)
+            # Start from a copy so a failed write leaves the cached task untouched
+            task = dict(entry.task)
 
             # Update task with new values
             for key, value in updates.items():
@@ -117,97 +144,261 @@ class TasksManager:
             # Add updated timestamp
             task['updated_at'] = time.time()
 
-            # Write updated task back to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(task, f, ensure_ascii=False, indent=2)
-
-            # Refresh tasks after update
-            self.refresh()
+            # Only this task is written; the storage notification updates the collection
+            self.storage.put(task, path=entry.path)
             return True
         except Exception as e:
             print(f"Error updating task {task_id}: {e}")
             return False
 
     def delete_task(self, task_id: str) -> bool:
-        """Delete a task by removing its JSON file"""
-        file_path = self._find_task_file(task_id)
-        if not file_path:
+        """Delete a task from storage"""
+        entry = self._find_task(task_id)
+        if not entry:
             return False
 
         try:
-            # Delete the task file
-            file_path.unlink()
-            # Refresh tasks after deletion
-            self.refresh()
+            if not self.storage.delete(task_id, path=entry.path):
+                self._unindex_id(task_id)
+                return False
             return True
         except Exception as e:
             print(f"Error deleting task {task_id}: {e}")
             return False
 
+    def bulk_update(self, operations: List[dict]) -> List[dict]:
+        """
+        Apply many update and delete operations in one pass.
+
+        Each operation is {'op': 'update', 'id': ..., 'updates': {...}} or
+        {'op': 'delete', 'id': ...}; later operations see the effect of earlier
+        ones. All updates are written as one storage batch and all deletes as
+        another. Returns one {'id', 'op', 'success'[, 'error']} per operation.
+        """
+        results = []
+        pending: Dict[str, dict] = {}  # id -> updated task, in first-touched order
+        deleted: Dict[str, TaskIndexEntry] = {}
+        entries: Dict[str, TaskIndexEntry] = {}
+        now = time.time()
+
+        for operation in operations:
+            op = operation.get('op') if isinstance(operation, dict) else None
+            task_id = operation.get('id') if isinstance(operation, dict) else None
+            result = {'id': task_id, 'op': op, 'success': False}
+            results.append(result)
+            if op not in ('update', 'delete'):
+                result['error'] = 'op must be "update" or "delete"'
+                continue
+            if not task_id or not isinstance(task_id, str):
+                result['error'] = 'id is required'
+                continue
+            if not is_valid_item_id(task_id):
+                result['error'] = 'Invalid id'
+                continue
+            if task_id in deleted:
+                result['error'] = 'Task not found'
+                continue
+            entry = entries.get(task_id) or self._find_task(task_id)
+            if not entry:
+                result['error'] = 'Task not found'
+                continue
+            entries[task_id] = entry
+
+            if op == 'delete':
+                pending.pop(task_id, None)
+                deleted[task_id] = entry
+            else:
+                updates = operation.get('updates')
+                if not isinstance(updates, dict) or not updates:
+                    result['error'] = 'updates must be a non-empty object'
+                    continue
+                task = pending.get(task_id) or dict(entry.task)
+                for key, value in updates.items():
+                    if key != 'id':  # Don't allow updating the ID
+                        task[key] = value
+                task['updated_at'] = now
+                pending[task_id] = task
+            result['success'] = True
+
+        try:
+            if pending:
+                self.storage.put_many(
+                    list(pending.values()),
+                    paths=[entries[task_id].path for task_id in pending]
+                )
+            if deleted:
+                removed = set(self.storage.delete_many(
+                    (task_id, entry.path) for task_id, entry in deleted.items()
+                ))
+                for task_id in deleted:
+                    if task_id not in removed:
+                        self._unindex_id(task_id)
+        except Exception as e:
+            print(f"Error applying bulk task operations: {e}")
+            for result in results:
+                if result['success']:
+                    result['success'] = False
+                    result['error'] = str(e)
+            return results
+
+        if deleted:
+            # A delete that found no file was already gone; report it per item
+            for result in results:
+                if result['success'] and result['op'] == 'delete' and result['id'] not in removed:
+                    result['success'] = False
+                    result['error'] = 'Task not found'
+        return results
+
     def refresh(self):
-        """Refresh all tasks from the data directory"""
-        for task_type in self.supported_types:
-            self.tasks[task_type] = self._load_tasks_from_folder(task_type)
+        """Rebuild the in-memory collection from the shared item index"""
+        index: Dict[str, TaskIndexEntry] = {}
+        for stored in get_item_index(self.storage).stored_items():
+            task = stored.item
+            index[task['id']] = TaskIndexEntry(
+                path=stored.path,
+                type=task.get('type'),
+                status=task.get('status'),
+                mtime=stored.mtime,
+                task=task,
+                seq=stored.seq
+            )
+        by_seq = sorted((entry.seq, task_id) for task_id, entry in index.items())
+        with self._index_lock:
+            self._index = index
+            self._by_seq = by_seq
+            self._sorted_cache.clear()
         self.last_update = time.time()
 
+    def _sorted_tasks(self, task_type: Optional[str] = None) -> List[dict]:
+        """Tasks of one type (or all types), newest modification first"""
+        self._sync_external_changes()
+        with self._index_lock:
+            tasks = self._sorted_cache.get(task_type)
+            if tasks is None:
+                entries = [
+                    entry for entry in self._index.values()
+                    if task_type is None or entry.type == task_type
+                ]
+                entries.sort(key=lambda entry: entry.mtime, reverse=True)
+                tasks = [entry.task for entry in entries]
+                self._sorted_cache[task_type] = tasks
+            return tasks
+
     def get_tasks(self, task_type: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, List[dict]]:
         """Get tasks with pagination"""
         if task_type:
             if task_type not in self.supported_types:
                 return {task_type: []}
-            return {task_type: self._load_tasks_from_folder(task_type, limit, offset)}
-        
+            return {task_type: self.get_tasks_by_type(task_type, limit, offset)}
+
         result = {}
         for t_type in self.supported_types:
-            result[t_type] = self._load_tasks_from_folder(t_type, limit, offset)
+            result[t_type] = self.get_tasks_by_type(t_type, limit, offset)
         return result
 
+    def get_tasks_page(self, task_type: Optional[str] = None, limit: int = 100,
+                       cursor: Optional[str] = None) -> Dict[str, object]:
+        """
+        Get one keyset page of tasks, newest created first.
+
+        Pass the returned next_cursor to get the following page; it is None on
+        the last page. Without a task_type the page spans all supported types.
+        Raises ValueError for a malformed cursor.
+        """
+        if task_type and task_type not in self.supported_types:
+            return {'tasks': {task_type: []}, 'next_cursor': None}
+
+        self._sync_external_changes()
+        tasks, next_cursor = get_item_index(self.storage).page(
+            item_type=task_type,
+            limit=limit,
+            cursor=cursor
+        )
+        grouped = {t_type: [] for t_type in ([task_type] if task_type else self.supported_types)}
+        for task in tasks:
+            if task.get('type') in grouped:
+                grouped[task['type']].append(task)
+        return {'tasks': grouped, 'next_cursor': next_cursor}
+
+    def get_change_seq(self) -> int:
+        """Sequence number of the latest change to any task"""
+        self._sync_external_changes()
+        return self.storage.current_seq()
+
+    def get_changes(self, since: int = 0, limit: int = 500, after: Optional[str] = None) -> Dict[str, object]:
+        """
+        Get the changes made after change sequence `since`, oldest first.
+
+        Each change is {'seq', 'op', 'id', 'type'} plus the full 'task' for
+        op 'put'; op 'delete' reports a removed task. Only the latest change of
+        a task is listed. Feed the returned 'seq' and 'after' back as `since`
+        and `after` on the next call; 'has_more' means the limit cut the list
+        short. Changes are ordered by (seq, id), and 'after' is the id of the
+        last one returned, so pages through tasks sharing a sequence number
+        (tasks stored before change sequences existed all have seq 0) make
+        progress. 'reset' is set when `since` is ahead of the store (e.g. it
+        was replaced), and the client should discard its copy and start again
+        from 0.
+        """
+        current = self.get_change_seq()
+        if since > current:
+            return {'changes': [], 'seq': current, 'after': None, 'has_more': False, 'reset': True}
+
+        with self._index_lock:
+            if after is not None:
+                start = bisect.bisect_right(self._by_seq, (since, after))
+            elif since > 0:
+                start = bisect.bisect_right(self._by_seq, (since, chr(0x10FFFF)))
+            else:
+                # Tasks stored before change sequences existed have seq 0 and
+                # are only part of a full sync
+                start = 0
+            changes = []
+            for seq, task_id in self._by_seq[start:start + limit + 1]:
+                entry = self._index[task_id]
+                changes.append({'seq': seq, 'op': 'put', 'id': task_id, 'type': entry.type, 'task': entry.task})
+        for tombstone in self.storage.tombstones_since(since)[:limit + 1]:
+            changes.append({'seq': tombstone.seq, 'op': 'delete', 'id': tombstone.id, 'type': tombstone.type})
+        changes.sort(key=lambda change: (change['seq'], change['id']))
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        if has_more:
+            seq, after = changes[-1]['seq'], changes[-1]['id']
+        else:
+            seq, after = current, None
+        return {'changes': changes, 'seq': seq, 'after': after, 'has_more': has_more, 'reset': False}
+
+    def search_tasks(self, query: str, task_type: Optional[str] = None, status: Optional[str] = None,
+                     limit: int = 20) -> List[dict]:
+        """Full-text search over title, description and source message, best match first"""
+        self._sync_external_changes()
+        results = get_search_index(self.storage).search(query, item_type=task_type, status=status, limit=limit)
+        return [{'score': round(score, 4), 'task': task} for score, task in results]
+
     def get_all_tasks(self, limit: int = 100, offset: int = 0) -> List[dict]:
         """Get all tasks regardless of type with pagination"""
-        all_tasks = []
-        
-        if not self.tasks_dir.exists():
-            return all_tasks
-
-        # Get all JSON files and sort by modification time (newest first)
-        files = sorted(self.tasks_dir.glob("*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
-        
-        # Apply pagination
-        start = offset
-        end = offset + limit
-        paginated_files = files[start:end]
-
-        for file_path in paginated_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    task = json.load(f)
-                    all_tasks.append(task)
-            except Exception as e:
-                print(f"Error loading task from {file_path}: {e}")
-        
-        return all_tasks
+        return self._sorted_tasks()[offset:offset + limit]
 
     def get_tasks_by_type(self, task_type: str, limit: int = 100, offset: int = 0) -> List[dict]:
         """Get tasks of a specific type with pagination"""
         if task_type not in self.supported_types:
             return []
-        return self._load_tasks_from_folder(task_type, limit, offset)
+        return self._sorted_tasks(task_type)[offset:offset + limit]
 
     def get_last_update(self) -> float:
         """Get timestamp of last update"""
         return self.last_update
 
+    def get_version(self) -> str:
+        """Token that changes whenever any task (or the last update time) changes"""
+        return f"{self.get_change_seq()}:{self.last_update!r}"
+
     def cleanup(self):
-        """Cleanup resources"""
-        if self.observer is not None:
-            try:
-                self.observer.stop()
-                self.observer.join(timeout=1)
-            except Exception as e:
-                print(f"Error stopping observer: {e}")
-            finally:
-                self.observer = None
+        """Stop following storage changes; the shared backend and its watcher stay up for its other users"""
+        self.storage.remove_listener(self._on_storage_change)
 
     def __del__(self):
-        """Cleanup observer when object is destroyed"""
-        self.cleanup() 
\ No newline at end of file
+        """Stop following storage changes when the object is destroyed"""
+        if hasattr(self, 'storage'):
+            self.cleanup()
\ No newline at end of file
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from dataclasses import dataclass
 from typing import Dict, Any, Optional
 
@@ -16,6 +18,12 @@ class Prompt:
             'display_name': self.display_name
         }
     
+    @property
+    def version(self) -> str:
+        """Content hash of the prompt; equal content always gives the same version."""
+        content = json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Prompt':
         # Validate required fields